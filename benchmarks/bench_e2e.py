@@ -0,0 +1,184 @@
+# benchmarks/bench_e2e.py — end-to-end throughput of build_file_graph against the local mock OpenAI server
+"""
+Generates a synthetic corpus (N files x M lines over the five docs/ locales), starts
+benchmarks.mock_openai on a free port, points openai.api_base at it and runs every file through
+one PipelineSession (= one compiled build_file_graph) with a bounded file worker pool, as main_batch does.
+Reports files/min, lines/s, GPT calls/file (logical calls and HTTP requests incl. retries) and
+per-stage p50/p95 latency from utils.metrics. No request leaves the machine.
+
+    python -m benchmarks.bench_e2e --files 40 --lines 30 --concurrency-files 4
+    python -m benchmarks.bench_e2e --latency gpt-5=lognormal:2,0.6 --rate-429 0.05 --json report.json
+    python -m benchmarks.bench_e2e --pipelined --stage-workers map_lines=2,missing_check=2,addition_check=2 --concurrency-files 8
+"""
+import os
+import json
+import time
+import asyncio
+import argparse
+import tempfile
+
+import openai
+
+from graph.session import PipelineSession
+from utils.response_cache import configure_cache
+from utils.gpt_client import set_async_limits, single_flight_stats
+from utils.metrics import batch_metrics
+from utils.rate_limiter import pool_snapshot
+from utils.error_log import flush_error_log
+from benchmarks.mock_openai import add_server_args, server_from_args
+from benchmarks.synthetic_corpus import LOCALES, write_corpus, docs_guideline
+
+
+async def _run_files(session: PipelineSession, paths: list, concurrency_files: int) -> dict:
+    queue: asyncio.Queue = asyncio.Queue()
+    for p in paths:
+        queue.put_nowait(p)
+    file_secs = []
+    failed = 0
+
+    async def _worker() -> None:
+        nonlocal failed
+        while True:
+            try:
+                path = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            started = time.perf_counter()
+            try:
+                result = await session.run(path)
+                failed += 0 if result["ok"] else 1
+            except Exception:
+                failed += 1
+            file_secs.append(time.perf_counter() - started)
+
+    try:
+        await asyncio.gather(*(_worker() for _ in range(max(1, min(concurrency_files, len(paths))))))
+    finally:
+        await session.aclose()
+    file_secs.sort()
+    return {
+        "failed": failed,
+        "file_sec_p50": round(file_secs[len(file_secs) // 2], 3) if file_secs else 0.0,
+        "file_sec_max": round(file_secs[-1], 3) if file_secs else 0.0,
+    }
+
+
+def _parse_stage_workers(spec: str) -> dict:
+    """"map_lines=2,missing_check=2" -> {"map_lines": 2, "missing_check": 2}"""
+    out = {}
+    for part in filter(None, (p.strip() for p in spec.split(","))):
+        name, _, n = part.partition("=")
+        out[name.strip()] = int(n)
+    return out
+
+
+def _session_kwargs(args) -> dict:
+    return dict(
+        timeout=args.timeout,
+        max_retries=args.max_retries,
+        concurrency=args.concurrency_lines,
+        get_guideline=docs_guideline,
+        category_batch=args.category_batch,
+        format_batch=args.format_batch,
+        combined_format_check=args.combined_format_check,
+        stream_doc_checks=args.stream_doc_checks,
+        pipelined=args.pipelined,
+        stage_workers=_parse_stage_workers(args.stage_workers),
+    )
+
+
+def run_benchmark(args) -> dict:
+    configure_cache(enabled=False)
+    server = server_from_args(args)
+    api_base, api_key = openai.api_base, openai.api_key
+    openai.api_base = server.start()
+    openai.api_key = "sk-mock"
+    set_async_limits(timeout_sec=args.timeout, max_retries=args.max_retries, concurrency=args.max_inflight)
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            paths = write_corpus(os.path.join(tmp, "input"), args.files, args.lines,
+                                 args.locales.split(","), args.seed)
+            session = PipelineSession(output_dir=os.path.join(tmp, "out"), **_session_kwargs(args))
+            started = time.perf_counter()
+            files = asyncio.run(_run_files(session, paths, args.concurrency_files))
+            wall = time.perf_counter() - started
+            pipeline = session.pipeline_stats()
+            flush_error_log()
+    finally:
+        server.stop()
+        openai.api_base, openai.api_key = api_base, api_key
+
+    metrics = batch_metrics()
+    totals = metrics.totals()
+    server_stats = server.stats()
+    return {
+        "files": args.files,
+        "lines_per_file": args.lines,
+        "wall_sec": round(wall, 3),
+        "files_per_min": round(args.files / wall * 60.0, 2),
+        "lines_per_sec": round(args.files * args.lines / wall, 2),
+        "calls_per_file": round(totals["calls"] / max(1, args.files), 2),
+        "http_requests_per_file": round(server_stats["total_requests"] / max(1, args.files), 2),
+        "files_failed": files["failed"],
+        "file_sec_p50": files["file_sec_p50"],
+        "file_sec_max": files["file_sec_max"],
+        "gpt_totals": totals,
+        "stages": {
+            stage: {"calls": s["calls"], "retries": s["retries"], "errors": s["errors"],
+                    "p50": s["latency_sec"]["p50"], "p95": s["latency_sec"]["p95"]}
+            for stage, s in metrics.summary().items()
+        },
+        "single_flight": single_flight_stats(),
+        "server": server_stats,
+        "pools": pool_snapshot(),
+        "pipeline": pipeline,
+    }
+
+
+def _print_report(r: dict) -> None:
+    print(f"files={r['files']} lines/file={r['lines_per_file']} wall={r['wall_sec']:.2f}s failed={r['files_failed']}")
+    print(f"throughput      : {r['files_per_min']:8.2f} files/min  {r['lines_per_sec']:8.2f} lines/s")
+    print(f"GPT calls/file  : {r['calls_per_file']:8.2f}  (HTTP requests/file incl. retries: {r['http_requests_per_file']:.2f})")
+    print(f"file latency    : p50={r['file_sec_p50']:.2f}s  max={r['file_sec_max']:.2f}s")
+    print(f"{'stage':<16}{'calls':>8}{'retries':>9}{'errors':>8}{'p50 s':>9}{'p95 s':>9}")
+    for stage, s in r["stages"].items():
+        print(f"{stage:<16}{s['calls']:>8}{s['retries']:>9}{s['errors']:>8}{s['p50']:>9.3f}{s['p95']:>9.3f}")
+    print(f"coalesced calls : {r['single_flight']['coalesced']}")
+    print(f"server statuses : {r['server']['statuses']}")
+    for model, snap in r["pools"].items():
+        print(f"pool {model:<10}: limit={snap['limit']}/{snap['max']} throttles={snap['throttles']}")
+    for stage, s in r["pipeline"].items():
+        print(f"stage {stage:<15}: workers={s['workers']} util={s['utilization']:.0%} "
+              f"queue max={s['max_queued']} mean={s['mean_queued']:.2f} wait={s['mean_wait_sec']:.3f}s")
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--files", type=int, default=20)
+    ap.add_argument("--lines", type=int, default=20)
+    ap.add_argument("--locales", default=",".join(LOCALES))
+    ap.add_argument("--concurrency-files", type=int, default=4)
+    ap.add_argument("--concurrency-lines", type=int, default=4)
+    ap.add_argument("--max-inflight", type=int, default=16, help="ceiling on each model pool")
+    ap.add_argument("--timeout", type=int, default=60)
+    ap.add_argument("--max-retries", type=int, default=5)
+    ap.add_argument("--category-batch", action="store_true")
+    ap.add_argument("--format-batch", action="store_true")
+    ap.add_argument("--combined-format-check", action="store_true")
+    ap.add_argument("--stream-doc-checks", action="store_true")
+    ap.add_argument("--pipelined", action="store_true", help="run stages on graph.stage_pipeline (per-stage queues)")
+    ap.add_argument("--stage-workers", default="map_lines=2",
+                    help="workers per stage with --pipelined, e.g. map_lines=4,missing_check=2 (others: 1)")
+    ap.add_argument("--json", default=None, help="also write the report as JSON to this path")
+    add_server_args(ap)
+    args = ap.parse_args()
+
+    report = run_benchmark(args)
+    _print_report(report)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
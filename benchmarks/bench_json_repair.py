@@ -0,0 +1,262 @@
+# benchmarks/bench_json_repair.py — normalize_gpt_json correctness + parse time vs. the previous pure-Python repair path
+"""
+Checks every reply in benchmarks/data/malformed_replies.jsonl (code fences, surrounding prose,
+`.join(...)` artifacts, unescaped quotes, missing/mismatched brackets, ...) against its expected
+parse, then times normalize_gpt_json against the previous implementation on the corpus plus
+synthetic long gpt-5 full-document replies. Real replies (corpus cases with a "source", plus those
+found in --error-log) must parse exactly as the previous implementation parsed them.
+Exits non-zero on a mismatch or when the new parser is slower than --max-ratio x the previous one.
+
+    python -m benchmarks.bench_json_repair --lines 2000 --repeat 20
+"""
+import os
+import re
+import sys
+import json
+import time
+import argparse
+
+from utils import helper
+from utils.helper import normalize_gpt_json
+
+CORPUS_PATH = os.path.join(os.path.dirname(__file__), "data", "malformed_replies.jsonl")
+ERROR_LOG_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)), "error.jsonl")
+
+
+# 이전 구현 (비교 기준) — utils/helper.py에서 그대로 옮김
+def _legacy_normalize_gpt_json(raw):
+    if isinstance(raw, dict):
+        return raw
+    if not isinstance(raw, str):
+        return {}
+    s = raw.strip()
+    if s.startswith("```"):
+        s = s.strip("`")
+        parts = s.split("\n", 1)
+        if parts and parts[0].lower().startswith("json"):
+            s = parts[1] if len(parts) > 1 else ""
+    if "{" in s and "}" in s:
+        s = s[s.find("{"): s.rfind("}") + 1]
+        
+    s = re.sub(r'\]\s*\.join\(\s*(?:\'|").*?(?:\'|")\s*\)', ']', s)
+
+    # --- 기존 1차 시도 ---
+    try:
+        return json.loads(s)
+
+    except Exception:
+        pass
+
+    def _fix_bracket_mismatch(text: str) -> str:
+        out = []
+        stack = [] 
+        in_string = False
+        escape = False
+
+        for ch in text:
+            if in_string:
+                out.append(ch)
+                if escape:
+                    escape = False
+                else:
+                    if ch == '\\':
+                        escape = True
+                    elif ch == '"':
+                        in_string = False
+                continue
+            if ch == '"':
+                in_string = True
+                out.append(ch)
+                continue
+
+            if ch == '{':
+                stack.append('}')
+                out.append(ch)
+                continue
+
+            if ch == '[':
+                stack.append(']')
+                out.append(ch)
+                continue
+
+            if ch == '}' or ch == ']':
+                if stack:
+                    expected = stack[-1]
+                    if ch == expected:
+                        stack.pop()
+                        out.append(ch)
+                    else:
+                        out.append(expected)
+                        stack.pop()
+                else:
+                    out.append(ch)
+                continue
+
+            out.append(ch)
+
+        while stack:
+            out.append(stack.pop())
+
+        return "".join(out)
+
+    s_fixed_brackets = _fix_bracket_mismatch(s)
+    try:
+        return json.loads(s_fixed_brackets)
+    except Exception:
+        pass
+
+    def _fix_unescaped_quotes(text: str) -> str:
+        out = []
+        in_string = False
+        escape = False
+        i, n = 0, len(text)
+
+        def next_meaningful(idx: int) -> str:
+            j = idx
+            while j < n and text[j] in (" ", "\t", "\r", "\n"):
+                j += 1
+            return text[j] if j < n else ""
+
+        while i < n:
+            ch = text[i]
+            if not in_string:
+                if ch == '"':
+                    in_string = True
+                    escape = False
+                    out.append(ch)
+                else:
+                    out.append(ch)
+                i += 1
+                continue
+
+            if escape:
+                out.append(ch)
+                escape = False
+                i += 1
+                continue
+
+            if ch == '\\':
+                out.append(ch)
+                escape = True
+                i += 1
+                continue
+
+            if ch == '"':
+                nm = next_meaningful(i + 1)
+                if nm in (",", "]", "}", ""):
+                    in_string = False
+                    out.append(ch)
+                else:
+                    out.append('\\"')
+                i += 1
+                continue
+
+            out.append(ch)
+            i += 1
+
+        return "".join(out)
+    try:
+        fixed = _fix_unescaped_quotes(s_fixed_brackets)
+        fixed = _fix_bracket_mismatch(fixed)
+        return json.loads(fixed)
+    except Exception:
+        return {}
+
+
+def _load_corpus():
+    with open(CORPUS_PATH, "r", encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def _logged_replies(path: str):
+    """
+    Raw GPT replies recoverable from an error log: the log stores no replies, but a category reply that
+    was not parsed (e.g. "```json\n[\"currency\"]\n```") ends up as the name of a guideline_missing record.
+    """
+    if not os.path.exists(path):
+        return []
+    out = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                rec = json.loads(line)
+            except ValueError:
+                continue
+            name = (rec.get("guideline") or {}).get("name") or ""
+            if rec.get("type") == "guideline_missing" and name.endswith(".txt") and not re.fullmatch(r"\w+", name[:-4]):
+                out.append(name[:-4])
+    return list(dict.fromkeys(out))
+
+
+def _synthetic_cases(n_lines: int):
+    doc = "\n".join(f"{k}번 객실은 바다 전망이며 체크인은 오후 3시, 체크아웃은 오전 11시입니다." for k in range(n_lines))
+    body = json.dumps({
+        "missing_content": True,
+        "missing_spans": ["ocean view"] * 5,
+        "revised_spans": ["바다 전망"] * 5,
+        "suggestions": [doc],
+    }, ensure_ascii=False)
+    quoted = doc.replace("바다 전망", '"바다 전망"')
+    return [
+        ("long_valid", body),
+        ("long_fenced", "```json\n" + body + "\n```"),
+        ("long_unclosed", body[:-2]),
+        ("long_unescaped_quotes",
+         '{"faithfulness_issue": true, "added_spans": ["x"], "suggestions": ["' + quoted.replace("\n", "\\n") + '"]}'),
+    ]
+
+
+def _time(fn, raw: str, repeat: int) -> float:
+    t0 = time.perf_counter()
+    for _ in range(repeat):
+        fn(raw)
+    return (time.perf_counter() - t0) / repeat
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--lines", type=int, default=2000, help="lines in the synthetic full-document suggestion")
+    ap.add_argument("--repeat", type=int, default=20)
+    ap.add_argument("--max-ratio", type=float, default=1.0, help="fail if new total time > ratio x previous")
+    ap.add_argument("--error-log", default=ERROR_LOG_PATH, help="error.jsonl to sample real replies from")
+    args = ap.parse_args()
+
+    corpus = _load_corpus()
+    failures = []
+    recovered_new = recovered_old = 0
+    for case in corpus:
+        got = normalize_gpt_json(case["raw"])
+        if json.dumps(got, sort_keys=True) != json.dumps(case["expected"], sort_keys=True):
+            failures.append(case["name"])
+        recovered_new += bool(got)
+        recovered_old += bool(_legacy_normalize_gpt_json(case["raw"]))
+    print(f"backend: {'orjson' if helper._orjson is not None else 'json'}")
+    print(f"corpus: {len(corpus)} replies, mismatches={len(failures)} {failures or ''}")
+    print(f"recovered (non-empty): new={recovered_new}  previous={recovered_old}")
+
+    # 실제 응답: 이전 구현과 결과가 같아야 함
+    real = list(dict.fromkeys([c["raw"] for c in corpus if c.get("source")] + _logged_replies(args.error_log)))
+    differ = [raw for raw in real if json.dumps(normalize_gpt_json(raw), sort_keys=True)
+              != json.dumps(_legacy_normalize_gpt_json(raw), sort_keys=True)]
+    print(f"real replies (corpus + {os.path.basename(args.error_log)}): {len(real)}, new == previous on {len(real) - len(differ)}")
+    failures += [f"real reply differs from previous: {raw[:60]!r}" for raw in differ]
+
+    cases = [(c["name"], c["raw"]) for c in corpus] + _synthetic_cases(args.lines)
+    total_new = total_old = 0.0
+    print(f"{'case':36s} {'previous':>12s} {'new':>12s} {'speedup':>8s}")
+    for name, raw in cases:
+        t_old = _time(_legacy_normalize_gpt_json, raw, args.repeat)
+        t_new = _time(normalize_gpt_json, raw, args.repeat)
+        total_old += t_old
+        total_new += t_new
+        print(f"{name:36s} {t_old * 1e6:10.1f}us {t_new * 1e6:10.1f}us {t_old / max(t_new, 1e-12):7.2f}x")
+    print(f"{'TOTAL':36s} {total_old * 1e3:10.2f}ms {total_new * 1e3:10.2f}ms {total_old / max(total_new, 1e-12):7.2f}x")
+
+    if failures:
+        sys.exit(f"correctness check failed: {failures}")
+    if total_new > total_old * args.max_ratio:
+        sys.exit(f"parse time regression: new {total_new * 1e3:.2f}ms > {args.max_ratio} x previous {total_old * 1e3:.2f}ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+# benchmarks/bench_memory.py — peak memory of one very long document through PipelineSession
+"""
+Runs a single synthetic document (default 20,000 aligned lines) through one PipelineSession with
+the OpenAI API replaced by an instant in-process fake that answers with benchmarks.mock_openai's
+canned replies, and reports the process peak RSS (ru_maxrss) and, with --tracemalloc, the peak of
+Python allocations. Run it once per tree to compare (peak RSS is per process).
+
+    python -m benchmarks.bench_memory --lines 20000
+    python -m benchmarks.bench_memory --lines 20000 --tracemalloc --json mem.json
+"""
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+import resource
+import tempfile
+import tracemalloc
+
+import openai
+
+from graph.session import PipelineSession
+from utils.response_cache import configure_cache
+from utils.gpt_client import configure_single_flight
+from benchmarks.mock_openai import classify_prompt, canned_reply
+from benchmarks.synthetic_corpus import make_document, docs_guideline
+
+_RNG = random.Random(0)
+
+
+async def _fake_acreate(**kwargs):
+    messages = kwargs.get("messages") or []
+    reply = canned_reply(classify_prompt(messages), messages, _RNG)
+    return {"choices": [{"message": {"content": reply}}], "usage": {"prompt_tokens": 0, "completion_tokens": 0}}
+
+
+def _max_rss_mb() -> float:
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux: KiB, macOS: bytes
+    return rss / (1024 * 1024) if sys.platform == "darwin" else rss / 1024
+
+
+def _current_rss_mb() -> float:
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+    except (OSError, ValueError, IndexError):
+        return _max_rss_mb()
+
+
+def run_benchmark(args) -> dict:
+    configure_cache(enabled=False)
+    configure_single_flight(False)
+    acreate = openai.ChatCompletion.acreate
+    openai.ChatCompletion.acreate = _fake_acreate
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            folder = os.path.join(tmp, "input", args.target)
+            os.makedirs(folder)
+            path = os.path.join(folder, "long.json")
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump(make_document(random.Random(args.seed), args.target, args.lines), f, ensure_ascii=False)
+            session = PipelineSession(
+                output_dir=os.path.join(tmp, "out"), timeout=60, max_retries=1,
+                concurrency=args.concurrency_lines, get_guideline=docs_guideline,
+                **({"line_window": args.line_window} if args.line_window else {}),
+            )
+            rss_before = _current_rss_mb()
+            if args.tracemalloc:
+                tracemalloc.start()
+            started = time.perf_counter()
+            result = asyncio.run(session.run(path))
+            wall = time.perf_counter() - started
+            traced_peak = tracemalloc.get_traced_memory()[1] / (1024 * 1024) if args.tracemalloc else None
+            if args.tracemalloc:
+                tracemalloc.stop()
+            session.close()
+    finally:
+        openai.ChatCompletion.acreate = acreate
+    return {
+        "lines": args.lines,
+        "ok": result["ok"],
+        "wall_sec": round(wall, 2),
+        "rss_before_mb": round(rss_before, 1),
+        "peak_rss_mb": round(_max_rss_mb(), 1),
+        "peak_rss_delta_mb": round(_max_rss_mb() - rss_before, 1),
+        "tracemalloc_peak_mb": round(traced_peak, 1) if traced_peak is not None else None,
+        "gpt_calls": result["stats"].get("gpt", {}).get("calls"),
+    }
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--lines", type=int, default=20000)
+    ap.add_argument("--target", default="en_US")
+    ap.add_argument("--concurrency-lines", type=int, default=16)
+    ap.add_argument("--line-window", type=int, default=None, help="max line subgraphs in flight (session default if omitted)")
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--tracemalloc", action="store_true", help="also report the peak of Python allocations (slower)")
+    ap.add_argument("--json", default=None, help="also write the report as JSON to this path")
+    args = ap.parse_args()
+
+    r = run_benchmark(args)
+    print(f"lines={r['lines']} ok={r['ok']} wall={r['wall_sec']:.2f}s gpt calls={r['gpt_calls']}")
+    print(f"RSS before run : {r['rss_before_mb']:8.1f} MiB")
+    print(f"peak RSS       : {r['peak_rss_mb']:8.1f} MiB  (+{r['peak_rss_delta_mb']:.1f} MiB during the run)")
+    if r["tracemalloc_peak_mb"] is not None:
+        print(f"tracemalloc    : {r['tracemalloc_peak_mb']:8.1f} MiB peak")
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(r, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
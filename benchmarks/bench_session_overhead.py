@@ -0,0 +1,107 @@
+# benchmarks/bench_session_overhead.py — per-file pipeline overhead: build_file_graph per file vs. PipelineSession
+"""
+Measures the fixed per-file cost of the pipeline (graph compilation + LangGraph
+invocation + load/save), with the OpenAI API replaced by an instant in-process
+fake so that no network time is included.
+
+    python -m benchmarks.bench_session_overhead --files 1000 --lines 5
+"""
+import os
+import json
+import time
+import asyncio
+import argparse
+import tempfile
+
+import openai
+
+from graph.file_graph import build_file_graph
+from graph.session import PipelineSession
+from utils.response_cache import configure_cache
+
+
+async def _fake_acreate(**kwargs):
+    # 문서 단위 체크(missing/addition)만 호출됨 (숫자/이모지 없는 라인 → 라인 단위 호출 없음)
+    content = json.dumps({"missing_content": False, "faithfulness_issue": False, "suggestions": []})
+    return {"choices": [{"message": {"content": content}}], "usage": {}}
+
+
+def _write_corpus(folder: str, n_files: int, n_lines: int) -> list:
+    os.makedirs(folder, exist_ok=True)
+    paths = []
+    for k in range(n_files):
+        p = os.path.join(folder, f"{k}.json")
+        with open(p, "w", encoding="utf-8") as f:
+            json.dump({
+                "source": "en_US",
+                "target": "ko_KR",
+                "text": "\n".join(f"Line {chr(65 + j % 26)} of the hotel description." for j in range(n_lines)),
+                "trans": "\n".join(f"호텔 설명의 {chr(65 + j % 26)} 줄입니다." for j in range(n_lines)),
+            }, f, ensure_ascii=False)
+        paths.append(p)
+    return paths
+
+
+def _state(path: str, output_dir: str, timeout: int, retries: int, conc: int) -> dict:
+    return {
+        "input_path": path,
+        "parent_folder": os.path.basename(os.path.dirname(path)),
+        "filename": os.path.basename(path),
+        "output_dir": output_dir,
+        "API_TIMEOUT_SEC": timeout,
+        "MAX_RETRIES": retries,
+        "CONCURRENCY_LINES": conc,
+    }
+
+
+async def _run_rebuild_per_file(paths, output_dir) -> float:
+    t0 = time.perf_counter()
+    for p in paths:
+        g = build_file_graph(API_TIMEOUT_SEC=60, MAX_RETRIES=1, CONCURRENCY_LINES=4)
+        await g.ainvoke(_state(p, output_dir, 60, 1, 4), config={"execution": {"checkpoint": False}})
+    return time.perf_counter() - t0
+
+
+async def _run_session(paths, output_dir) -> float:
+    t0 = time.perf_counter()
+    session = PipelineSession(output_dir=output_dir, timeout=60, max_retries=1, concurrency=4)
+    for p in paths:
+        await session.run(p)
+    return time.perf_counter() - t0
+
+
+def _compile_only(n: int) -> float:
+    t0 = time.perf_counter()
+    for _ in range(n):
+        build_file_graph(API_TIMEOUT_SEC=60, MAX_RETRIES=1, CONCURRENCY_LINES=4)
+    return time.perf_counter() - t0
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--files", type=int, default=1000)
+    ap.add_argument("--lines", type=int, default=5)
+    args = ap.parse_args()
+
+    openai.ChatCompletion.acreate = _fake_acreate
+    configure_cache(enabled=False)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        paths = _write_corpus(os.path.join(tmp, "input", "bench"), args.files, args.lines)
+        out_before = os.path.join(tmp, "out_before")
+        out_after = os.path.join(tmp, "out_after")
+
+        compile_s = _compile_only(min(args.files, 200))
+        before = asyncio.run(_run_rebuild_per_file(paths, out_before))
+        after = asyncio.run(_run_session(paths, out_after))
+
+    n = args.files
+    print(f"files={n} lines/file={args.lines}")
+    print(f"graph compile only     : {compile_s / min(n, 200) * 1e3:8.2f} ms/compile")
+    print(f"before (rebuild/file)  : {before:8.2f} s total  {before / n * 1e3:8.2f} ms/file")
+    print(f"after  (PipelineSession): {after:8.2f} s total  {after / n * 1e3:8.2f} ms/file")
+    print(f"per-file overhead saved: {(before - after) / n * 1e3:8.2f} ms/file  (x{before / max(after, 1e-9):.2f})")
+
+
+if __name__ == "__main__":
+    main()
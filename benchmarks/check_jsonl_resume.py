@@ -0,0 +1,79 @@
+# benchmarks/check_jsonl_resume.py — JSONL records in flight must not discard each other's checkpoints
+"""
+Loads every record of a small JSONL file through LoadFileNode with a CheckpointStore, saving line
+checkpoints for a record before the next one starts, and fails (exit 1) if a record starting
+discards a sibling record's saved lines, or if a changed record does not discard its own stale ones.
+
+    python -m benchmarks.check_jsonl_resume
+"""
+import os
+import sys
+import json
+import tempfile
+
+from graph.file_graph import LoadFileNode
+from utils.checkpoint_store import CheckpointStore
+from utils.record_stream import iter_records
+
+_RECORDS = [
+    {"id": "a", "source": "en_US", "target": "ko_KR", "text": "Hello", "trans": "안녕"},
+    {"id": "b", "source": "en_US", "target": "ko_KR", "text": "Open 24/7", "trans": "24/7 운영"},
+    {"id": "c", "source": "en_US", "target": "ko_KR", "text": "Price $100", "trans": "가격 $100"},
+]
+
+
+def _write(path: str, records) -> None:
+    with open(path, "w", encoding="utf-8") as f:
+        for r in records:
+            f.write(json.dumps(r, ensure_ascii=False) + "\n")
+
+
+def _start(node: LoadFileNode, path: str, record: dict) -> str:
+    return node({
+        "input_path": path,
+        "record_id": record["record_id"],
+        "input_record": record["data"],
+        "input_sha256": record["sha256"],
+    })["run_key"]
+
+
+def main() -> None:
+    failures = []
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "docs.jsonl")
+        _write(path, _RECORDS)
+        store = CheckpointStore(os.path.join(tmp, "ck.sqlite3"))
+        node = LoadFileNode(store)
+
+        # 레코드 a, b, c가 차례로 시작 (앞 레코드는 아직 진행 중)
+        run_keys = {}
+        for record in iter_records(path):
+            run_keys[record["record_id"]] = _start(node, path, record)
+            store.save_line(run_keys[record["record_id"]], 0, {"record": record["record_id"]})
+        for rid, key in run_keys.items():
+            lines = store.load_lines(key)
+            if lines != {0: {"record": rid}}:
+                failures.append(f"record {rid}: saved lines {lines} after its siblings started")
+
+        # 레코드 b 내용 변경 후 재실행: b의 이전 체크포인트만 폐기
+        _write(path, [_RECORDS[0], {**_RECORDS[1], "trans": "연중무휴 운영"}, _RECORDS[2]])
+        changed = next(r for r in iter_records(path) if r["record_id"] == "b")
+        new_key = _start(node, path, changed)
+        if new_key == run_keys["b"]:
+            failures.append("record b: run key unchanged after its content changed")
+        if store.load_lines(run_keys["b"]):
+            failures.append("record b: stale checkpoint of the old content survived")
+        for rid in ("a", "c"):
+            if store.load_lines(run_keys[rid]) != {0: {"record": rid}}:
+                failures.append(f"record {rid}: checkpoint discarded when record b restarted")
+        store.close()
+
+    for msg in failures:
+        print(f"FAIL: {msg}")
+    if failures:
+        sys.exit(1)
+    print(f"ok: {len(_RECORDS)} records keep their own checkpoints; a changed record drops only its own")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+# benchmarks/check_stream_early_stop.py — a streamed doc check cut short must close its HTTP response/connection
+"""
+Streams missing_check replies from benchmarks.mock_openai with a stop_when that fires on the first
+verdict (early stop), plus one stream read to the end, on an event loop in debug mode, and fails
+(exit 1) if aiohttp reports an unclosed response / connection / session or if the server did not
+see the client hang up on every early stop.
+
+    python -m benchmarks.check_stream_early_stop --streams 20
+"""
+import gc
+import sys
+import asyncio
+import argparse
+import warnings
+
+import openai
+
+from utils.response_cache import configure_cache
+from utils.gpt_client import ask_gpt5_stream_async, configure_single_flight, stream_stats
+from benchmarks.mock_openai import MockOpenAIServer
+
+_MESSAGES = [
+    {"role": "system", "content": "Detect omissions in the translation."},
+    {"role": "user", "content": "Source:\nHello\nTranslation:\n안녕하세요\nEvaluate and return the result."},
+]
+
+
+async def _run(streams: int) -> dict:
+    replies = []
+    for _ in range(streams):
+        replies.append(await ask_gpt5_stream_async(
+            _MESSAGES, timeout=10, max_retries=1,
+            verdict_fields=("missing_content",), stop_when=lambda v: "missing_content" in v,
+        ))
+    # 끝까지 읽는 stream도 같은 경로로 정리되는지
+    replies.append(await ask_gpt5_stream_async(_MESSAGES, timeout=10, max_retries=1, verdict_fields=("missing_content",)))
+    return {"errors": sum(1 for reply, _ in replies if reply == "error")}
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--streams", type=int, default=20)
+    args = ap.parse_args()
+
+    configure_cache(enabled=False)
+    configure_single_flight(False)
+    server = MockOpenAIServer(latency={"gpt-5": "fixed:0.01"})
+    api_base, api_key = openai.api_base, openai.api_key
+    openai.api_base = server.start()
+    openai.api_key = "sk-mock"
+    try:
+        with warnings.catch_warnings(record=True) as caught:
+            warnings.simplefilter("always")
+            result = asyncio.run(_run(args.streams), debug=True)
+            gc.collect()
+    finally:
+        server.stop()
+        openai.api_base, openai.api_key = api_base, api_key
+
+    unclosed = [str(w.message) for w in caught if "Unclosed" in str(w.message)]
+    statuses = server.stats()["statuses"]
+    print(f"streams={stream_stats()['streams']} early_stops={stream_stats()['early_stops']} errors={result['errors']}")
+    print(f"server statuses : {statuses}")
+    print(f"unclosed warnings: {len(unclosed)}")
+    for msg in unclosed[:5]:
+        print(f"  {msg[:120]}")
+    ok = not unclosed and not result["errors"] and statuses.get("client_closed", 0) == args.streams
+    if not ok:
+        print("FAIL: early-stopped streams leak their connection")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,335 @@
+# benchmarks/mock_openai.py — local OpenAI-compatible stub (/v1/chat/completions) for throughput benchmarks
+"""
+Answers every prompt builder of prompt_builder/build_prompt.py with a well-formed canned reply
+(categories detected from the sentence, format checks echo the translation, document checks
+report no issue unless --issue-rate says otherwise), after a per-model latency drawn from a
+configurable distribution. A fraction of requests can fail with 429 (+ Retry-After) or 500.
+Streaming requests (stream=true) are answered as server-sent events.
+
+Latency specs: fixed:SEC | uniform:LO,HI | lognormal:MEDIAN,SIGMA | exp:MEAN
+
+    python -m benchmarks.mock_openai --port 8089 --latency gpt-4o=lognormal:0.6,0.4 --rate-429 0.02
+    OPENAI_API_BASE=http://127.0.0.1:8089/v1 OPENAI_API_KEY=sk-mock python main_batch.py
+"""
+import re
+import json
+import math
+import random
+import asyncio
+import argparse
+import threading
+from collections import Counter
+from typing import Dict, Optional
+
+from aiohttp import web
+
+DEFAULT_LATENCY = {"gpt-4o": "lognormal:0.6,0.4", "gpt-5": "lognormal:3.0,0.5"}
+FALLBACK_LATENCY = "lognormal:1.0,0.5"
+STREAM_CHUNK_CHARS = 12
+STREAM_CHUNK_INTERVAL_SEC = 0.005
+
+_CURRENCY_RE = re.compile(r"[$€£¥₩₴﷼]\s?\d|\d\s?[$€£¥₩₴]|\b(?:USD|EUR|KRW|UAH|AED)\b|دولار|درهم")
+_TIME_RE = re.compile(r"\b\d{1,2}(?::\d{2}|\s?h\s?\d{2})\b|\b(?:AM|PM)\b|오전|오후|مساءً|صباحًا")
+_DATE_RE = re.compile(
+    r"\b\d{1,2}[./-]\d{1,2}[./-]\d{2,4}\b|\d{1,2}월|\b(?:January|February|March|April|May|June|July|August|"
+    r"September|October|November|December)\b|\b\d{1,2}\s+(?:janvier|février|mars|avril|mai|juin|juillet|"
+    r"août|septembre|octobre|novembre|décembre|січня|лютого|березня|квітня|травня|червня|липня|серпня|"
+    r"вересня|жовтня|листопада|грудня)|يناير|فبراير|مارس|أبريل|مايو|يونيو|يوليو|أغسطس|سبتمبر|أكتوبر|نوفمبر|ديسمبر"
+)
+
+
+class LatencyModel:
+    """Seconds per request drawn from fixed / uniform / lognormal / exp."""
+
+    def __init__(self, spec: str):
+        kind, _, params = spec.partition(":")
+        self.spec = spec
+        self.kind = kind
+        self.params = [float(p) for p in params.split(",") if p]
+        if kind not in ("fixed", "uniform", "lognormal", "exp"):
+            raise ValueError(f"unknown latency distribution: {spec}")
+
+    def sample(self, rng: random.Random) -> float:
+        p = self.params
+        if self.kind == "fixed":
+            return p[0]
+        if self.kind == "uniform":
+            return rng.uniform(p[0], p[1])
+        if self.kind == "lognormal":
+            return rng.lognormvariate(math.log(p[0]), p[1] if len(p) > 1 else 0.5)
+        return rng.expovariate(1.0 / p[0])
+
+
+def detect_categories(sentence: str) -> list:
+    cats = []
+    if _CURRENCY_RE.search(sentence):
+        cats.append("currency")
+    if _DATE_RE.search(sentence):
+        cats.append("date")
+    if _TIME_RE.search(sentence):
+        cats.append("time")
+    return cats
+
+
+def classify_prompt(messages: list) -> str:
+    """Which prompt builder produced these messages (stage name as in utils.metrics)."""
+    system = messages[0].get("content", "") if messages else ""
+    if "emoji consistency" in system:
+        return "emoji_check"
+    if "Detect omissions" in system:
+        return "missing_check"
+    if "Detect and handle additions" in system:
+        return "addition_check"
+    if "each given translated sentence" in system:
+        return "category_batch"
+    if "formatting categories" in system:
+        return "category"
+    if "EVERY locale-specific guideline" in system:
+        return "format_check_combined"
+    if "several independent items" in system:
+        return "format_check_batch"
+    if "[GUIDELINE]" in system:
+        return "format_check"
+    return "unknown"
+
+
+def _after(text: str, marker: str) -> str:
+    return text.split(marker, 1)[1] if marker in text else ""
+
+
+def canned_reply(builder: str, messages: list, rng: random.Random, issue_rate: float = 0.0) -> str:
+    system = messages[0].get("content", "")
+    user = messages[-1].get("content", "")
+    if builder == "category":
+        sentence = _after(user, "Translated sentence: ").rsplit("\n\nWhich", 1)[0]
+        return json.dumps(detect_categories(sentence))
+    if builder == "category_batch":
+        payload = json.loads(_after(user, "Translated sentences:\n").rsplit("\n\nWhich", 1)[0])
+        return json.dumps({p["id"]: detect_categories(p["sentence"]) for p in payload})
+    if builder == "format_check":
+        trans = json.loads(_after(user, "Translated sentence:\n").strip() or '""')
+        return json.dumps({"revised": trans, "source_spans": [], "trans_spans": [], "revised_spans": []},
+                          ensure_ascii=False)
+    if builder == "format_check_batch":
+        payload = json.loads(_after(user, "Items:\n").strip())
+        return json.dumps({
+            p["id"]: {"revised": p["translation"], "source_spans": [], "trans_spans": [], "revised_spans": []}
+            for p in payload
+        }, ensure_ascii=False)
+    if builder == "format_check_combined":
+        trans = json.loads(_after(user, "Translated sentence:\n").strip() or '""')
+        cats = re.findall(r'"([^"]+)"', _after(system, "must contain exactly these keys:"))
+        empty = {"source_spans": [], "trans_spans": [], "revised_spans": []}
+        return json.dumps({"revised": trans, "spans_by_category": {c: empty for c in cats}}, ensure_ascii=False)
+
+    translation = _after(user, "Translation:\n").rsplit("\nEvaluate and return the result.", 1)[0]
+    issue = rng.random() < issue_rate
+    suggestions = [translation] if issue else []
+    if builder == "emoji_check":
+        return json.dumps({"emoji_issue": issue, "suggestions": suggestions}, ensure_ascii=False)
+    if builder == "missing_check":
+        return json.dumps({"missing_content": issue, "missing_spans": [], "revised_spans": [],
+                           "suggestions": suggestions}, ensure_ascii=False)
+    if builder == "addition_check":
+        return json.dumps({"faithfulness_issue": issue, "added_spans": [], "suggestions": suggestions},
+                          ensure_ascii=False)
+    return "{}"
+
+
+def _usage(messages: list, reply: str) -> dict:
+    prompt = sum(len(m.get("content") or "") for m in messages) // 3
+    completion = len(reply) // 3
+    return {"prompt_tokens": prompt, "completion_tokens": completion, "total_tokens": prompt + completion}
+
+
+class MockOpenAIServer:
+    """
+    aiohttp stub on its own event loop thread, so the pipeline under test keeps its loop to itself.
+
+        server = MockOpenAIServer(latency={"gpt-5": "fixed:0.5"}, rate_429=0.05)
+        openai.api_base = server.start()
+        ...
+        server.stop(); print(server.stats())
+    """
+
+    def __init__(
+        self,
+        *,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        latency: Optional[Dict[str, str]] = None,
+        error_rate: float = 0.0,
+        rate_429: float = 0.0,
+        retry_after: float = 1.0,
+        issue_rate: float = 0.0,
+        seed: Optional[int] = None,
+    ):
+        self.host = host
+        self.port = port
+        specs = dict(DEFAULT_LATENCY)
+        specs.update(latency or {})
+        self.latency = {model: LatencyModel(spec) for model, spec in specs.items()}
+        self.fallback_latency = LatencyModel(FALLBACK_LATENCY)
+        self.error_rate = error_rate
+        self.rate_429 = rate_429
+        self.retry_after = retry_after
+        self.issue_rate = issue_rate
+        self.rng = random.Random(seed)
+        self.requests: Counter = Counter()
+        self.statuses: Counter = Counter()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._runner: Optional[web.AppRunner] = None
+        self._ready = threading.Event()
+
+    # ---------- app ----------
+    def make_app(self) -> web.Application:
+        app = web.Application(client_max_size=64 * 1024 * 1024)
+        app.router.add_post("/v1/chat/completions", self._handle)
+        app.router.add_post("/chat/completions", self._handle)
+        app.router.add_get("/stats", self._handle_stats)
+        return app
+
+    async def _handle_stats(self, request: web.Request) -> web.Response:
+        return web.json_response(self.stats())
+
+    def _error(self, status: int, message: str, err_type: str, headers: Optional[dict] = None) -> web.Response:
+        self.statuses[status] += 1
+        return web.json_response({"error": {"message": message, "type": err_type, "code": None}},
+                                 status=status, headers=headers)
+
+    async def _handle(self, request: web.Request) -> web.StreamResponse:
+        body = await request.json()
+        model = body.get("model", "")
+        messages = body.get("messages") or []
+        builder = classify_prompt(messages)
+        self.requests[builder] += 1
+
+        roll = self.rng.random()
+        if roll < self.rate_429:
+            await asyncio.sleep(0.01)
+            return self._error(429, "Rate limit reached (mock)", "requests",
+                               headers={"Retry-After": f"{self.retry_after:g}"})
+        if roll < self.rate_429 + self.error_rate:
+            await asyncio.sleep(0.01)
+            return self._error(500, "The server had an error (mock)", "server_error")
+
+        delay = self.latency.get(model, self.fallback_latency).sample(self.rng)
+        reply = canned_reply(builder, messages, self.rng, self.issue_rate)
+        if body.get("stream"):
+            return await self._stream(request, model, reply, delay)
+
+        await asyncio.sleep(delay)
+        self.statuses[200] += 1
+        return web.json_response({
+            "id": "chatcmpl-mock",
+            "object": "chat.completion",
+            "model": model,
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": reply}, "finish_reason": "stop"}],
+            "usage": _usage(messages, reply),
+        })
+
+    async def _stream(self, request: web.Request, model: str, reply: str, delay: float) -> web.StreamResponse:
+        resp = web.StreamResponse(headers={"Content-Type": "text/event-stream"})
+        await resp.prepare(request)
+        # 첫 chunk까지 latency의 대부분을 쓰고, 나머지는 chunk 간격으로 흘려보냄
+        await asyncio.sleep(delay)
+        try:
+            for k in range(0, len(reply), STREAM_CHUNK_CHARS):
+                chunk = {
+                    "id": "chatcmpl-mock",
+                    "object": "chat.completion.chunk",
+                    "model": model,
+                    "choices": [{"index": 0, "delta": {"content": reply[k:k + STREAM_CHUNK_CHARS]}, "finish_reason": None}],
+                }
+                await resp.write(f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n".encode("utf-8"))
+                await asyncio.sleep(STREAM_CHUNK_INTERVAL_SEC)
+            await resp.write(b"data: [DONE]\n\n")
+            self.statuses[200] += 1
+        except ConnectionResetError:
+            # 클라이언트가 early stop으로 연결을 끊음 (정상 종료로 취급)
+            self.statuses["client_closed"] += 1
+        except asyncio.CancelledError:
+            self.statuses["client_closed"] += 1
+            raise
+        return resp
+
+    # ---------- lifecycle ----------
+    def start(self) -> str:
+        """Serve on a background thread; returns the api_base (http://host:port/v1)."""
+        self._thread = threading.Thread(target=self._serve, name="mock-openai", daemon=True)
+        self._thread.start()
+        self._ready.wait()
+        return f"http://{self.host}:{self.port}/v1"
+
+    def _serve(self) -> None:
+        self._loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self._loop)
+        self._runner = web.AppRunner(self.make_app(), access_log=None)
+        self._loop.run_until_complete(self._runner.setup())
+        site = web.TCPSite(self._runner, self.host, self.port)
+        self._loop.run_until_complete(site.start())
+        self.port = self._runner.addresses[0][1]
+        self._ready.set()
+        self._loop.run_forever()
+        self._loop.run_until_complete(self._runner.cleanup())
+        self._loop.close()
+
+    def stop(self) -> None:
+        if self._loop is not None and self._thread is not None:
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join(timeout=10)
+
+    def stats(self) -> dict:
+        return {
+            "requests": dict(self.requests),
+            "total_requests": sum(self.requests.values()),
+            "statuses": {str(k): v for k, v in self.statuses.items()},
+        }
+
+
+def parse_latency_args(values) -> Dict[str, str]:
+    """["gpt-4o=lognormal:0.6,0.4", ...] → {"gpt-4o": "lognormal:0.6,0.4"}"""
+    out = {}
+    for item in values or []:
+        model, _, spec = item.partition("=")
+        LatencyModel(spec)  # validate
+        out[model] = spec
+    return out
+
+
+def add_server_args(ap: argparse.ArgumentParser) -> None:
+    ap.add_argument("--latency", action="append", default=[], metavar="MODEL=SPEC",
+                    help=f"per-model latency distribution (default: {DEFAULT_LATENCY})")
+    ap.add_argument("--rate-429", type=float, default=0.0, help="fraction of requests answered with 429")
+    ap.add_argument("--retry-after", type=float, default=1.0, help="Retry-After seconds sent with 429")
+    ap.add_argument("--error-rate", type=float, default=0.0, help="fraction of requests answered with 500")
+    ap.add_argument("--issue-rate", type=float, default=0.0, help="fraction of document/emoji checks that flag an issue")
+    ap.add_argument("--seed", type=int, default=0)
+
+
+def server_from_args(args, port: int = 0) -> MockOpenAIServer:
+    return MockOpenAIServer(
+        port=port,
+        latency=parse_latency_args(args.latency),
+        error_rate=args.error_rate,
+        rate_429=args.rate_429,
+        retry_after=args.retry_after,
+        issue_rate=args.issue_rate,
+        seed=args.seed,
+    )
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=8089)
+    add_server_args(ap)
+    args = ap.parse_args()
+    server = server_from_args(args, port=args.port)
+    server.host = args.host
+    web.run_app(server.make_app(), host=args.host, port=args.port, access_log=None)
+
+
+if __name__ == "__main__":
+    main()
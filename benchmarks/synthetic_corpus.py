@@ -0,0 +1,144 @@
+# benchmarks/synthetic_corpus.py — synthetic hotel-description corpus for the five docs/ locales
+"""
+Writes N input JSONs ({"source", "target", "text", "trans"}) of M aligned lines each, spread
+round-robin over the docs/ locales (one sub-folder per target locale). Lines mix plain text,
+numbers, time, date, currency, currency+time and emoji so that the rule-based classifier,
+the LLM category path, the format checks and the emoji check are all exercised.
+
+    python -m benchmarks.synthetic_corpus --out /tmp/nac_corpus --files 50 --lines 40
+"""
+import os
+import json
+import random
+import argparse
+from typing import Dict, List, Sequence
+
+from utils.guideline_registry import GuidelineRegistry
+
+DOCS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "docs")
+LOCALES = ("ar_AE", "en_US", "fr_FR", "ko_KR", "uk_UA")
+
+_MONTHS = {
+    "en_US": ["January", "February", "March", "April", "May", "June", "July", "August",
+              "September", "October", "November", "December"],
+    "fr_FR": ["janvier", "février", "mars", "avril", "mai", "juin", "juillet", "août",
+              "septembre", "octobre", "novembre", "décembre"],
+    "uk_UA": ["січня", "лютого", "березня", "квітня", "травня", "червня", "липня", "серпня",
+              "вересня", "жовтня", "листопада", "грудня"],
+    "ar_AE": ["يناير", "فبراير", "مارس", "أبريل", "مايو", "يونيو", "يوليو", "أغسطس",
+              "سبتمبر", "أكتوبر", "نوفمبر", "ديسمبر"],
+    "ko_KR": [f"{k}월" for k in range(1, 13)],
+}
+
+# kind → {locale: template}; placeholders: k n h h24 d d2 mon
+_TEMPLATES: Dict[str, Dict[str, str]] = {
+    "plain": {
+        "en_US": "Room {k} offers a wide view of the sea.",
+        "ko_KR": "{k}번 객실에서는 바다가 넓게 보입니다.",
+        "fr_FR": "La chambre {k} offre une large vue sur la mer.",
+        "uk_UA": "Номер {k} має широкий вид на море.",
+        "ar_AE": "توفر الغرفة {k} إطلالة واسعة على البحر.",
+    },
+    "number": {
+        "en_US": "The hotel has {n} rooms on {k} floors.",
+        "ko_KR": "호텔에는 {k}개 층에 {n}개의 객실이 있습니다.",
+        "fr_FR": "L'hôtel compte {n} chambres sur {k} étages.",
+        "uk_UA": "Готель має {n} номерів на {k} поверхах.",
+        "ar_AE": "يضم الفندق {n} غرفة في {k} طوابق.",
+    },
+    "time": {
+        "en_US": "Check-in starts at {h}:00 PM.",
+        "ko_KR": "체크인은 오후 {h}:00부터입니다.",
+        "fr_FR": "L'enregistrement commence à {h24} h 00.",
+        "uk_UA": "Заселення починається о {h24}:00.",
+        "ar_AE": "يبدأ تسجيل الوصول الساعة {h}:00 مساءً.",
+    },
+    "date": {
+        "en_US": "The pool is closed from {mon} {d} to {mon} {d2}.",
+        "ko_KR": "수영장은 {mon} {d}일부터 {mon} {d2}일까지 휴장합니다.",
+        "fr_FR": "La piscine est fermée du {d} au {d2} {mon}.",
+        "uk_UA": "Басейн зачинено з {d} по {d2} {mon}.",
+        "ar_AE": "يُغلق المسبح من {d} إلى {d2} {mon}.",
+    },
+    "currency": {
+        "en_US": "Parking costs ${n} per night.",
+        "ko_KR": "주차 요금은 1박에 ${n}입니다.",
+        "fr_FR": "Le parking coûte {n} $ par nuit.",
+        "uk_UA": "Паркування коштує {n} $ за ніч.",
+        "ar_AE": "تبلغ تكلفة موقف السيارات {n} دولار في الليلة.",
+    },
+    "currency_time": {
+        "en_US": "Breakfast is served until {h}:30 AM for ${n}.",
+        "ko_KR": "조식은 오전 {h}:30까지 ${n}에 제공됩니다.",
+        "fr_FR": "Le petit-déjeuner est servi jusqu'à {h} h 30 pour {n} $.",
+        "uk_UA": "Сніданок подається до {h}:30 за {n} $.",
+        "ar_AE": "يُقدَّم الإفطار حتى الساعة {h}:30 صباحًا مقابل {n} دولار.",
+    },
+    "emoji": {
+        "en_US": "Free Wi-Fi is available in every room 📶",
+        "ko_KR": "모든 객실에서 무료 Wi-Fi를 이용할 수 있습니다 📶",
+        "fr_FR": "Le Wi-Fi gratuit est disponible dans toutes les chambres 📶",
+        "uk_UA": "Безкоштовний Wi-Fi доступний у кожному номері 📶",
+        "ar_AE": "تتوفر خدمة Wi-Fi المجانية في كل غرفة 📶",
+    },
+}
+_KIND_WEIGHTS = {"plain": 30, "number": 10, "time": 15, "date": 15, "currency": 15, "currency_time": 10, "emoji": 5}
+
+
+def _line_pair(rng: random.Random, src_locale: str, trg_locale: str):
+    kind = rng.choices(list(_KIND_WEIGHTS), weights=list(_KIND_WEIGHTS.values()))[0]
+    h = rng.randint(1, 11)
+    d = rng.randint(1, 20)
+    mon = rng.randrange(12)
+    values = dict(k=rng.randint(2, 40), n=rng.choice((15, 20, 25, 40, 120, 250)), h=h, h24=h + 12,
+                  d=d, d2=d + rng.randint(1, 8))
+    src = _TEMPLATES[kind][src_locale].format(mon=_MONTHS[src_locale][mon], **values)
+    trn = _TEMPLATES[kind][trg_locale].format(mon=_MONTHS[trg_locale][mon], **values)
+    return src, trn
+
+
+def make_document(rng: random.Random, target: str, n_lines: int) -> dict:
+    # en_US 대상 문서는 ko_KR 원문에서 번역된 것으로 생성
+    source = "ko_KR" if target == "en_US" else "en_US"
+    pairs = [_line_pair(rng, source, target) for _ in range(n_lines)]
+    return {
+        "source": source,
+        "target": target,
+        "text": "\n".join(s for s, _ in pairs),
+        "trans": "\n".join(t for _, t in pairs),
+    }
+
+
+def write_corpus(root: str, n_files: int, n_lines: int, locales: Sequence[str] = LOCALES, seed: int = 0) -> List[str]:
+    """Write n_files documents under root/<target locale>/<k>.json; returns the input paths."""
+    rng = random.Random(seed)
+    paths = []
+    for k in range(n_files):
+        target = locales[k % len(locales)]
+        folder = os.path.join(root, target)
+        os.makedirs(folder, exist_ok=True)
+        path = os.path.join(folder, f"{k}.json")
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(make_document(rng, target, n_lines), f, ensure_ascii=False)
+        paths.append(path)
+    return paths
+
+
+# get_guideline over the repo's docs/ (the production GUIDE_BASE_DIR is machine-specific)
+docs_guideline = GuidelineRegistry(DOCS_DIR)
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--out", required=True)
+    ap.add_argument("--files", type=int, default=50)
+    ap.add_argument("--lines", type=int, default=40)
+    ap.add_argument("--locales", default=",".join(LOCALES))
+    ap.add_argument("--seed", type=int, default=0)
+    args = ap.parse_args()
+    paths = write_corpus(args.out, args.files, args.lines, args.locales.split(","), args.seed)
+    print(f"wrote {len(paths)} files x {args.lines} lines → {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,33 +1,27 @@
 # graph/file_graph.py — file-level LangGraph with JSONL error logging
 from __future__ import annotations
-from typing import TypedDict, List, Optional, Dict, Any
+from typing import TypedDict, List, Optional, Dict, Any, Tuple
 from langgraph.graph import StateGraph, END
-import os, json, time
-from threading import Lock
-
-from graph.line_subgraph import build_line_subgraph
-from utils.file_utils import get_guideline
+import os, json, time, hashlib
+import asyncio
+
+from graph.line_subgraph import build_line_subgraph, DetectCategoryNode, FormatCheckLoopNode, LineDoc
+from graph.line_batch import batch_detect_categories, detect_remaining_categories, batch_format_check
+from utils.file_utils import get_guideline, guideline_registry
+from utils.category_rules import CategoryRuleClassifier
+from utils.checkpoint_store import CheckpointStore, checkpoint_key
+from utils.stage_store import StageStore, IncrementalNode, get_stage_store, fingerprint, source_fingerprint
+from utils.error_log import append_error_jsonl
+from utils.output_sink import OutputSink, default_json_sink
+from utils.metrics import stage_scope, current_file_metrics
 from prompt_builder.build_prompt import (
+    _base_user_block,
     build_missing_check_prompt,
     build_addition_check_prompt,
 )
-from utils.gpt_client import ask_gpt5_async, ask_gpt4o_async
+from utils.gpt_client import ask_gpt5_async, ask_gpt4o_async, ask_gpt5_stream_async
 from utils.helper import b, llist, normalize_gpt_json
 
-_ERROR_LOG_LOCK = Lock()
-
-def _error_log_path(output_dir: Optional[str]) -> str:
-    base = output_dir or os.getenv("OUTPUT_DIR") or os.getcwd()
-    os.makedirs(base, exist_ok=True)
-    return os.path.join(base, "error.jsonl")
-
-def _append_error_jsonl(payload: dict, output_dir: Optional[str]) -> None:
-    path = _error_log_path(output_dir)
-    line = json.dumps(payload, ensure_ascii=False)
-    with _ERROR_LOG_LOCK:
-        with open(path, "a", encoding="utf-8") as f:
-            f.write(line + "\n")
-
 def _log_error_file(
     state_like: Dict[str, Any],
     *,
@@ -51,7 +45,7 @@ def _log_error_file(
         "error": {"type": error_type, "message": error_message},
         "guideline": None,
     }
-    _append_error_jsonl(payload, state_like.get("output_dir"))
+    append_error_jsonl(payload, state_like.get("output_dir"))
 
 async def _safe_ask(
     func,
@@ -68,7 +62,8 @@ async def _safe_ask(
     On exception: logs one JSON record and returns ("error", {})
     """
     try:
-        return await func(messages, model=model, timeout=timeout, max_retries=max_retries)
+        with stage_scope(stage):
+            return await func(messages, model=model, timeout=timeout, max_retries=max_retries)
     except Exception as e:
         if state_for_log is not None:
             _log_error_file(
@@ -83,6 +78,11 @@ async def _safe_ask(
 class FileState(TypedDict, total=False):
     """State dict for one JSON file throughout the graph"""
     input_path: str
+    input_record: Optional[dict]   # JSONL 입력: 이미 파싱된 레코드 (LoadFileNode가 읽은 뒤 비움)
+    record_id: str
+    input_sha256: str
+    run_key: str
+    output_path: Optional[str]     # sink가 기록한 위치 (per-file JSON 경로 또는 consolidated JSONL 경로)
     parent_folder: str
     filename: str
     output_dir: str
@@ -92,7 +92,6 @@ class FileState(TypedDict, total=False):
     trans: str
     src_lines: List[str]
     trn_lines: List[str]
-    format_checked_lines: List[str]
     checked_sentences: List[dict]
     emoji_line_issues: List[dict]
     format_checked_text: str
@@ -104,172 +103,578 @@ class FileState(TypedDict, total=False):
     API_TIMEOUT_SEC: int
     MAX_RETRIES: int
     CONCURRENCY_LINES: int
-    failures: List[str]
+    STREAM_DOC_CHECKS: bool
+    category_calls_avoided: int
+    category_calls_llm: int
+    category_batch_calls: int
+    format_batch_calls: int
+    format_batch_fallbacks: int
+    speculation_wasted: bool
 
 
 class LoadFileNode:
-    """Load JSON into FileState"""
-    def __call__(self, s: FileState) -> FileState:
-        st = s.copy()
-        with open(st["input_path"], "r", encoding="utf-8-sig") as f:
-            data = json.load(f)
-        st["source"] = data.get("source")
-        st["target"] = data.get("target")
-        st["text"]   = data.get("text", "") or ""
-        st["trans"]  = data.get("trans", "") or ""
-        st["src_lines"] = st["text"].splitlines()
-        st["trn_lines"] = st["trans"].splitlines()
-        N = max(len(st["src_lines"]), len(st["trn_lines"]))
-        if len(st["src_lines"]) < N: st["src_lines"] += [""] * (N - len(st["src_lines"]))
-        if len(st["trn_lines"]) < N: st["trn_lines"] += [""] * (N - len(st["trn_lines"]))
-        st["format_checked_lines"] = [""] * N
-        st["checked_sentences"] = []     
-        st["emoji_line_issues"] = []      
-        st["failures"] = []
-        os.makedirs(os.path.join(st["output_dir"], st["parent_folder"]), exist_ok=True)
-        return st
+    """Load JSON (or one pre-parsed JSONL record) into FileState"""
+    def __init__(self, checkpoint_store: Optional[CheckpointStore] = None):
+        self.checkpoint_store = checkpoint_store
+
+    def __call__(self, s: FileState) -> Dict[str, Any]:
+        out: Dict[str, Any] = {}
+        if s.get("input_record") is not None:
+            data = s["input_record"]
+            out["input_record"] = None   # 원본 레코드는 text/trans로 옮긴 뒤 state에서 제거
+            sha = s["input_sha256"]
+            run_id = f"{s['input_path']}#{s.get('record_id')}"
+        else:
+            with open(s["input_path"], "rb") as f:
+                raw = f.read()
+            data = json.loads(raw.decode("utf-8-sig"))
+            sha = out["input_sha256"] = hashlib.sha256(raw).hexdigest()
+            run_id = s["input_path"]
+        out["run_key"] = checkpoint_key(run_id, sha)
+        if self.checkpoint_store is not None:
+            # JSONL 레코드는 "{input_path}#{record_id}" 단위로 등록 (같은 파일의 다른 레코드 체크포인트를 지우지 않도록)
+            self.checkpoint_store.begin(out["run_key"], run_id, sha)
+        out["source"] = data.get("source")
+        out["target"] = data.get("target")
+        out["text"]   = data.get("text", "") or ""
+        out["trans"]  = data.get("trans", "") or ""
+        src_lines = out["text"].splitlines()
+        trn_lines = out["trans"].splitlines()
+        N = max(len(src_lines), len(trn_lines))
+        if len(src_lines) < N: src_lines += [""] * (N - len(src_lines))
+        if len(trn_lines) < N: trn_lines += [""] * (N - len(trn_lines))
+        out["src_lines"] = src_lines
+        out["trn_lines"] = trn_lines
+        return out
 
 
 class MapLinesNode:
     """Map line-level subgraph over all lines, then merge results"""
-    def __init__(self, api_timeout: int, max_retries: int, concurrency: int):
-        self.subgraph = build_line_subgraph(api_timeout, max_retries, get_guideline)
+    def __init__(
+        self,
+        api_timeout: int,
+        max_retries: int,
+        concurrency: int,
+        get_guideline=get_guideline,
+        use_rule_category: bool = True,
+        category_batch: bool = False,
+        category_batch_token_budget: int = 1500,
+        format_batch: bool = False,
+        format_batch_token_budget: int = 3000,
+        combined_format_check: bool = False,
+        checkpoint_store: Optional[CheckpointStore] = None,
+        stage_store: Optional[StageStore] = None,
+        line_window: int = 64,
+    ):
+        self.api_timeout = api_timeout
+        self.max_retries = max_retries
+        self.classifier = CategoryRuleClassifier(get_guideline) if use_rule_category else None
+        self.subgraph = build_line_subgraph(
+            api_timeout, max_retries, get_guideline, self.classifier, combined_format_check, stage_store
+        )
         self.concurrency = concurrency
+        # 동시에 진행 중인 라인 subgraph 수 (실제 API 동시성은 모델별 pool이 제한)
+        self.line_window = line_window
+        self.category_batch = category_batch
+        self.category_batch_token_budget = category_batch_token_budget
+        self.get_guideline = get_guideline
+        self.format_batch = format_batch
+        self.format_batch_token_budget = format_batch_token_budget
+        self.detect_node = DetectCategoryNode(api_timeout, max_retries, self.classifier)
+        self.checkpoint_store = checkpoint_store
+        self.stage_store = stage_store
+        if stage_store is not None:
+            # 배치 선처리 전 조회용 (저장은 line subgraph의 IncrementalNode가 담당)
+            self.detect_memo = IncrementalNode(self.detect_node, stage_store)
+            self.format_memo = IncrementalNode(
+                FormatCheckLoopNode(api_timeout, max_retries, get_guideline, combined_format_check), stage_store
+            )
 
-    async def __call__(self, s: FileState) -> FileState:
-        st = s.copy()
+    async def _reuse_detected(self, items: List[Dict[str, Any]]) -> None:
+        """Batch modes: preset categories of lines whose detect_category fingerprint is unchanged (skipped by the batch)."""
+        restored = await asyncio.gather(*(self.detect_memo.lookup(it) for it in items))
+        for it, r in zip(items, restored):
+            if r is not None:
+                it.update(r)
+
+    async def _reuse_formatted(self, items: List[Dict[str, Any]]) -> None:
+        """Format batch: lines whose format_check fingerprint is unchanged keep their stored result and leave the batch."""
+        todo = [it for it in items if it.get("detected_categories")]
+        restored = await asyncio.gather(*(self.format_memo.lookup(it) for it in todo))
+        for it, r in zip(todo, restored):
+            if r is not None:
+                it.update(r)
+                it["format_done_categories"] = list(dict.fromkeys(it["detected_categories"]))
+
+    async def _run_lines(self, items: List[Dict[str, Any]], run_key: Optional[str], fold) -> None:
+        """
+        Run the line subgraph with at most line_window lines in flight; each result is folded into the
+        document arrays (and, with a checkpoint store, persisted) as soon as it completes, then dropped.
+        """
+        pending = iter(items)
+        save = self.checkpoint_store is not None and bool(run_key)
+
+        async def _worker() -> None:
+            for it in pending:
+                r = await self.subgraph.ainvoke(it)
+                if save:
+                    await self.checkpoint_store.asave_line(run_key, r["i"], {k: v for k, v in r.items() if k != "doc"})
+                fold(r)
+
+        await asyncio.gather(*(_worker() for _ in range(max(1, min(self.line_window, len(items))))))
+
+    async def __call__(self, st: FileState) -> Dict[str, Any]:
         N = len(st["src_lines"])
-        items = []
-        for i in range(N):
-            items.append({
-                "i": i,
-                "src_line": st["src_lines"][i].strip(),
-                "trn_line": st["trn_lines"][i].strip(),
-                "target": st["target"],
-                "parent_folder": st["parent_folder"],
-                "filename": st["filename"],
-                "output_dir": st["output_dir"],
-            })
-        results = await self.subgraph.abatch(items, config={"executor": {"max_concurrency": self.concurrency}})
-        for r in results:
+        doc = LineDoc(st["target"], st["parent_folder"], st["filename"], st["output_dir"])
+        items = [
+            {"i": i, "src_line": src.strip(), "trn_line": trn.strip(), "doc": doc}
+            for i, (src, trn) in enumerate(zip(st["src_lines"], st["trn_lines"]))
+        ]
+        # 재시작: 이미 끝난 라인 결과는 체크포인트에서 복원하고 나머지만 처리
+        done: Dict[int, Dict[str, Any]] = {}
+        if self.checkpoint_store is not None and st.get("run_key"):
+            done = await self.checkpoint_store.aload_lines(st["run_key"])
+            items = [it for it in items if it["i"] not in done]
+        # 배치 모드: fingerprint가 그대로인 라인의 카테고리는 이전 결과 재사용 (배치에서 제외)
+        if self.stage_store is not None and (self.category_batch or self.format_batch):
+            await self._reuse_detected(items)
+        # 배치 모드: 카테고리 검출을 문서 단위 indexed JSON 요청 몇 개로 선처리
+        batch_calls = 0
+        if self.category_batch:
+            batch_stats = await batch_detect_categories(
+                items,
+                classifier=self.classifier,
+                timeout=self.api_timeout,
+                max_retries=self.max_retries,
+                token_budget=self.category_batch_token_budget,
+                concurrency=self.concurrency,
+            )
+            batch_calls = batch_stats["batch_calls"]
+
+        # 문서 단위 format batch: 같은 (locale, category) 라인을 가이드라인 1회로 묶어 검사
+        format_stats = {"format_batch_calls": 0, "format_batch_fallbacks": 0}
+        if self.format_batch:
+            await detect_remaining_categories(items, self.detect_node, self.concurrency)
+            if self.stage_store is not None:
+                await self._reuse_formatted(items)
+            format_stats = await batch_format_check(
+                items,
+                get_guideline=self.get_guideline,
+                timeout=self.api_timeout,
+                max_retries=self.max_retries,
+                token_budget=self.format_batch_token_budget,
+                concurrency=self.concurrency,
+            )
+
+        # 라인 결과는 완료되는 대로 문서 단위 배열에 접어 넣고 LineState는 버림
+        lines = [""] * N
+        checked: List[Tuple[int, dict]] = []
+        emoji_issues: List[Tuple[int, dict]] = []
+        sources = {"rule": 0, "llm": 0}
+
+        def _fold(r: Dict[str, Any]) -> None:
             i = r["i"]
-            st["format_checked_lines"][i] = r.get("revised_fmt", r.get("trn_line", ""))
+            lines[i] = r.get("revised_fmt", r.get("trn_line", ""))
             if r.get("checked_sentence_item"):
-                st["checked_sentences"].append(r["checked_sentence_item"])
+                checked.append((i, r["checked_sentence_item"]))
             if r.get("emoji_issue_item"):
-                st["emoji_line_issues"].append(r["emoji_issue_item"])
-        st["format_checked_text"] = "\n".join(st["format_checked_lines"])
-        return st
+                emoji_issues.append((i, r["emoji_issue_item"]))
+            if r.get("category_source") in sources:
+                sources[r["category_source"]] += 1
+
+        for r in done.values():
+            _fold(r)
+        await self._run_lines(items, st.get("run_key"), _fold)
+        checked.sort(key=lambda x: x[0])
+        emoji_issues.sort(key=lambda x: x[0])
+        return {
+            "format_batch_calls": format_stats["format_batch_calls"],
+            "format_batch_fallbacks": format_stats["format_batch_fallbacks"],
+            "category_calls_avoided": sources["rule"],
+            "category_calls_llm": sources["llm"],
+            "category_batch_calls": batch_calls,
+            "checked_sentences": [item for _, item in checked],
+            "emoji_line_issues": [item for _, item in emoji_issues],
+            "format_checked_text": "\n".join(lines),
+        }
 
 
-class MissingCheckNode:
-    async def __call__(self, s: FileState) -> FileState:
-        st = s.copy()
-        st["final_doc"] = st.get("format_checked_text", "\n".join(st.get("format_checked_lines", [])))
-
-        if st["text"] and st["final_doc"]:
-            sys2, usr2 = build_missing_check_prompt(st["text"], st["final_doc"])
-            res, _ = await _safe_ask(
-                ask_gpt5_async, [sys2, usr2],
-                model="gpt-5", timeout=st["API_TIMEOUT_SEC"], max_retries=st["MAX_RETRIES"],
-                stage="missing_check", state_for_log=st
-            )
-            js = normalize_gpt_json(res) if res != "error" else {}
-            
-            if len(js['suggestions']) > 1: 
-                temp = ''
-                for sug in js['suggestions']:
-                    if isinstance(sug, str) and sug.strip():
-                        temp += sug.strip()
-                        temp += '\n'
-                js['suggestions'] = [temp.strip()]
-                
-            st["res_missing"] = js or {"missing_content": False, "suggestions": []}
-
-            suggestion = js.get("suggestions") if js['suggestions'] else None
-            # sugs = js.get("suggestions") if js else None
-            # if isinstance(sugs, list):
-            #     for v in sugs:
-            #         if isinstance(v, str) and v.strip():
-            #             suggestion = v.strip()
-            #             break
-
-            if suggestion:
-                expected = len((st.get("format_checked_text") or "").splitlines()) or 1
-                suggested = suggestion[0].count("\n") + 1
-                if suggested == expected:
-                    st["final_doc"] = suggestion[0].rstrip("\n")
-                else:
-                    _log_error_file(
-                        st,
-                        stage="missing_check_line_count_mismatch",
-                        error_type="LineCountMismatch",
-                        error_message=f"expected={expected}, suggested={suggested}"
-                    )
-            else:
-                st["res_missing"] = {"missing_content": False, "suggestions": []}
+def _merge_suggestions(js: dict) -> dict:
+    """여러 개로 쪼개진 suggestions를 하나의 문서 문자열로 병합"""
+    sugs = llist(js.get("suggestions"))
+    if len(sugs) > 1:
+        temp = ''
+        for sug in sugs:
+            if isinstance(sug, str) and sug.strip():
+                temp += sug.strip()
+                temp += '\n'
+        js['suggestions'] = [temp.strip()]
+    return js
+
+
+def _first_suggestion(js: dict) -> Optional[str]:
+    sugs = llist(js.get("suggestions"))
+    return sugs[0] if sugs and isinstance(sugs[0], str) and sugs[0] else None
+
+
+# 문서 단위 체크의 verdict 필드: false가 먼저 도착하면 나머지 응답은 필요 없음
+_DOC_VERDICT_FIELDS = {"missing_check": "missing_content", "addition_check": "faithfulness_issue"}
+
+
+async def _ask_doc_check(st: FileState, messages: list, stage: str):
+    """
+    gpt-5 call for a document-level check. With STREAM_DOC_CHECKS the reply is streamed and cancelled
+    as soon as the verdict field arrives as false (reply is then just {verdict: False}).
+    """
+    if st.get("STREAM_DOC_CHECKS"):
+        field = _DOC_VERDICT_FIELDS[stage]
+        return await _safe_ask(
+            lambda msgs, **kw: ask_gpt5_stream_async(
+                msgs, **kw, verdict_fields=(field,), stop_when=lambda v: v.get(field) is False
+            ),
+            messages,
+            model="gpt-5", timeout=st["API_TIMEOUT_SEC"], max_retries=st["MAX_RETRIES"],
+            stage=stage, state_for_log=st
+        )
+    return await _safe_ask(
+        ask_gpt5_async, messages,
+        model="gpt-5", timeout=st["API_TIMEOUT_SEC"], max_retries=st["MAX_RETRIES"],
+        stage=stage, state_for_log=st
+    )
+
+
+async def _missing_check_whole(st: FileState, final_doc: str) -> Tuple[dict, str]:
+    """
+    Document-level omission check on format_checked_text (one request for the whole document).
+    Returns (res_missing, final_doc) — final_doc is the accepted suggestion or the unchanged input.
+    """
+    if not (st["text"] and final_doc):
+        return {"missing_content": False, "suggestions": []}, final_doc
+
+    sys2, usr2 = build_missing_check_prompt(st["text"], final_doc)
+    res, _ = await _ask_doc_check(st, [sys2, usr2], "missing_check")
+    js = normalize_gpt_json(res) if res != "error" else {}
+    if not isinstance(js, dict):
+        js = {}
+    js = _merge_suggestions(js)
+    res_missing = js or {"missing_content": False, "suggestions": []}
+
+    suggestion = _first_suggestion(js)
+    if suggestion:
+        expected = len((st.get("format_checked_text") or "").splitlines()) or 1
+        suggested = suggestion.count("\n") + 1
+        if suggested == expected:
+            final_doc = suggestion.rstrip("\n")
         else:
-            st["res_missing"] = {"missing_content": False, "suggestions": []}
-        return st
+            _log_error_file(
+                st,
+                stage="missing_check_line_count_mismatch",
+                error_type="LineCountMismatch",
+                error_message=f"expected={expected}, suggested={suggested}"
+            )
+    else:
+        res_missing = {"missing_content": False, "suggestions": []}
+    return res_missing, final_doc
+
+
+async def _addition_check_whole(st: FileState, final_doc: str) -> Tuple[dict, str]:
+    """
+    Document-level addition/faithfulness check on final_doc (one request for the whole document).
+    Returns (res_addition, final_checked_joined).
+    """
+    if not (st["text"] and final_doc):
+        res_addition = {"faithfulness_issue": False, "suggestions": []}
+        return res_addition, (final_doc or st.get("format_checked_text") or "").rstrip("\n")
+
+    sys3, usr3 = build_addition_check_prompt(st["text"], final_doc)
+    res, _ = await _ask_doc_check(st, [sys3, usr3], "addition_check")
+    js = normalize_gpt_json(res) if res != "error" else {}
+    if not isinstance(js, dict):
+        js = {}
+    js = _merge_suggestions(js)
+    res_addition = js or {"faithfulness_issue": False, "suggestions": []}
+
+    n_lines = len(st.get("text", "").splitlines()) or 1
+    suggested = _first_suggestion(js)
+    if suggested:
+        n_suggested = suggested.count("\n") + 1
+        if n_suggested == n_lines:
+            return res_addition, suggested.rstrip("\n")
+        _log_error_file(
+            st,
+            stage="addition_check_line_count_mismatch",
+            error_type="LineCountMismatch",
+            error_message=f"expected={n_lines}, suggested={n_suggested}"
+        )
+    return res_addition, final_doc.rstrip("\n")
+
+
+def _window_bounds(n: int, size: int, overlap: int) -> List[Tuple[int, int, int, int]]:
+    """(lo, hi, core_lo, core_hi): core windows of `size` lines, each widened by `overlap` lines of context."""
+    out = []
+    for core_lo in range(0, n, size):
+        core_hi = min(n, core_lo + size)
+        out.append((max(0, core_lo - overlap), min(n, core_hi + overlap), core_lo, core_hi))
+    return out
+
+
+async def _check_window(
+    st: FileState,
+    build_prompt,
+    stage: str,
+    src_win: List[str],
+    doc_win: List[str],
+    lo: int,
+) -> Tuple[dict, Optional[List[str]]]:
+    """
+    Run one document-level check on a window of aligned lines.
+    Returns (reply json, suggested window lines or None). A line-count mismatch only invalidates this window.
+    """
+    if not "".join(src_win).strip() or not "".join(doc_win).strip():
+        return {}, None
+
+    sys_w, usr_w = build_prompt("\n".join(src_win), "\n".join(doc_win))
+    res, _ = await _ask_doc_check(st, [sys_w, usr_w], stage)
+    js = normalize_gpt_json(res) if res != "error" else {}
+    if not isinstance(js, dict):
+        return {}, None
+    js = _merge_suggestions(js)
+    suggestion = _first_suggestion(js)
+    if not suggestion:
+        return js, None
+
+    # _base_user_block()이 앞뒤 공백 라인을 strip 하므로 그 구간은 제외하고 비교
+    lead = 0
+    while lead < len(doc_win) and not doc_win[lead].strip():
+        lead += 1
+    trail = 0
+    while trail < len(doc_win) - lead and not doc_win[len(doc_win) - 1 - trail].strip():
+        trail += 1
+    expected = len(doc_win) - lead - trail
+    sug_lines = suggestion.rstrip("\n").split("\n")
+    if len(sug_lines) != expected:
+        _log_error_file(
+            st,
+            stage=f"{stage}_line_count_mismatch",
+            error_type="LineCountMismatch",
+            error_message=f"window=lines {lo + 1}-{lo + len(doc_win)}, expected={expected}, suggested={len(sug_lines)}"
+        )
+        return js, None
+    return js, doc_win[:lead] + sug_lines + doc_win[len(doc_win) - trail:]
+
+
+async def _run_windows(st: FileState, build_prompt, stage: str, doc_lines: List[str], size: int, overlap: int):
+    src_lines = st["src_lines"]
+    bounds = _window_bounds(len(doc_lines), size, overlap)
+    results = await asyncio.gather(*(
+        _check_window(st, build_prompt, stage, src_lines[lo:hi], doc_lines[lo:hi], lo)
+        for lo, hi, _, _ in bounds
+    ))
+    return list(zip(bounds, results))
+
+
+def _core_spans(js: dict, key: str, core_text: str) -> List[str]:
+    """Keep only spans found in the window's core region (drops duplicates reported from the overlap)."""
+    return [x for x in llist(js.get(key)) if isinstance(x, str) and x and x in core_text]
+
+
+async def _missing_check_chunked(st: FileState, final_doc: str, size: int, overlap: int) -> Tuple[dict, str]:
+    """Windowed omission check: windows run concurrently and suggestions are stitched per core region."""
+    doc_lines = final_doc.split("\n")
+    new_lines = list(doc_lines)
+    missing, any_suggestion = False, False
+    missing_spans: List[str] = []
+    revised_spans: List[str] = []
+    for (lo, hi, core_lo, core_hi), (js, sug) in await _run_windows(
+        st, build_missing_check_prompt, "missing_check", doc_lines, size, overlap
+    ):
+        missing = missing or b(js.get("missing_content"), False)
+        missing_spans += _core_spans(js, "missing_spans", "\n".join(st["src_lines"][core_lo:core_hi]))
+        if _first_suggestion(js):
+            any_suggestion = True
+        if sug is not None:
+            core = sug[core_lo - lo: core_hi - lo]
+            new_lines[core_lo:core_hi] = core
+            revised_spans += _core_spans(js, "revised_spans", "\n".join(core))
+
+    if not any_suggestion:
+        return {"missing_content": False, "suggestions": []}, final_doc
+    new_doc = "\n".join(new_lines)
+    res_missing = {
+        "missing_content": missing,
+        "missing_spans": missing_spans,
+        "revised_spans": revised_spans,
+        "suggestions": [new_doc] if new_doc != final_doc else [],
+    }
+    return res_missing, new_doc
+
+
+async def _addition_check_chunked(st: FileState, final_doc: str, size: int, overlap: int) -> Tuple[dict, str]:
+    """Windowed addition check: windows run concurrently and suggestions are stitched per core region."""
+    doc_lines = final_doc.split("\n")
+    new_lines = list(doc_lines)
+    faith_issue = False
+    added_spans: List[str] = []
+    for (lo, hi, core_lo, core_hi), (js, sug) in await _run_windows(
+        st, build_addition_check_prompt, "addition_check", doc_lines, size, overlap
+    ):
+        faith_issue = faith_issue or b(js.get("faithfulness_issue"), False)
+        added_spans += _core_spans(js, "added_spans", "\n".join(doc_lines[core_lo:core_hi]))
+        if sug is not None:
+            new_lines[core_lo:core_hi] = sug[core_lo - lo: core_hi - lo]
+
+    new_doc = "\n".join(new_lines)
+    res_addition = {
+        "faithfulness_issue": faith_issue,
+        "added_spans": added_spans,
+        "suggestions": [new_doc] if new_doc != final_doc else [],
+    }
+    return res_addition, new_doc.rstrip("\n")
+
+
+def _use_chunks(st: FileState, final_doc: str, chunk_lines: int) -> bool:
+    # 라인 정렬(src_lines ↔ final_doc)이 유지될 때만 chunk 모드 사용
+    n = len(st.get("src_lines") or [])
+    return bool(chunk_lines) and n > chunk_lines and len(final_doc.split("\n")) == n
+
+
+async def _missing_check(st: FileState, chunk_lines: int = 0, chunk_overlap: int = 2) -> Tuple[dict, str]:
+    """Omission check on format_checked_text; chunked when chunk_lines > 0 and the document is longer."""
+    final_doc = st.get("format_checked_text", "")
+    if st["text"] and final_doc and _use_chunks(st, final_doc, chunk_lines):
+        return await _missing_check_chunked(st, final_doc, chunk_lines, chunk_overlap)
+    return await _missing_check_whole(st, final_doc)
+
+
+async def _addition_check(st: FileState, final_doc: str, chunk_lines: int = 0, chunk_overlap: int = 2) -> Tuple[dict, str]:
+    """Addition check on final_doc; chunked when chunk_lines > 0 and the document is longer."""
+    if st["text"] and final_doc and _use_chunks(st, final_doc, chunk_lines):
+        return await _addition_check_chunked(st, final_doc, chunk_lines, chunk_overlap)
+    return await _addition_check_whole(st, final_doc)
+
+
+class MissingCheckNode:
+    STAGE = "missing_check"
+    OUTPUT_KEYS = ("res_missing", "final_doc")
+
+    def __init__(self, chunk_lines: int = 0, chunk_overlap: int = 2):
+        self.chunk_lines = chunk_lines
+        self.chunk_overlap = chunk_overlap
+
+    def fingerprint(self, st: FileState) -> str:
+        # upstream: format check 결과 문서
+        return fingerprint(
+            source_fingerprint(build_missing_check_prompt, _base_user_block), "gpt-5",
+            self.chunk_lines, self.chunk_overlap, st.get("text"),
+            st.get("format_checked_text", ""),
+        )
+
+    async def __call__(self, s: FileState) -> Dict[str, Any]:
+        res_missing, final_doc = await _missing_check(s, self.chunk_lines, self.chunk_overlap)
+        return {"res_missing": res_missing, "final_doc": final_doc}
 
 
 class AdditionCheckNode:
     """Document-level addition/faithfulness check"""
-    async def __call__(self, s: FileState) -> FileState:
-        st = s.copy()
-        if st["text"] and st["final_doc"]:
-            sys3, usr3 = build_addition_check_prompt(st["text"], st["final_doc"])
-            res, _ = await _safe_ask(
-                ask_gpt5_async, [sys3, usr3],
-                model="gpt-5", timeout=st["API_TIMEOUT_SEC"], max_retries=st["MAX_RETRIES"],
-                stage="addition_check", state_for_log=st
-            )
-            
-            js = normalize_gpt_json(res) if res != "error" else {}
-            
-            
-            if len(js['suggestions']) > 1: 
-                temp = ''
-                for sug in js['suggestions']:
-                    if isinstance(sug, str) and sug.strip():
-                        temp += sug.strip()
-                        temp += '\n'
-                js['suggestions'] = [temp.strip()]
-    
-            st["res_addition"] = js or {"faithfulness_issue": False, "suggestions": []}
-            
-            
-            n_lines = len(st.get("text", "").splitlines()) or 1
-            suggested = js.get("suggestions") if js['suggestions'] else None
-
-
-            if suggested:
-                if (suggested[0].count("\n") + 1 == n_lines):
-                    st["final_checked_joined"] = suggested[0].rstrip("\n")
-                    
-                else:
-                    _log_error_file(
-                        st,
-                        stage="addition_check_line_count_mismatch",
-                        error_type="LineCountMismatch",
-                        error_message=f"expected={n_lines}, suggested={suggested[0].count("\n") + 1}"
-                    )
-                    st["final_checked_joined"] = st["final_doc"].rstrip("\n")
-            else:
-                st["final_checked_joined"] = st["final_doc"].rstrip("\n")
-                
+    STAGE = "addition_check"
+    OUTPUT_KEYS = ("res_addition", "final_checked_joined")
+
+    def __init__(self, chunk_lines: int = 0, chunk_overlap: int = 2):
+        self.chunk_lines = chunk_lines
+        self.chunk_overlap = chunk_overlap
+
+    def fingerprint(self, st: FileState) -> str:
+        # upstream: missing check 이후 문서
+        return fingerprint(
+            source_fingerprint(build_addition_check_prompt, _base_user_block), "gpt-5",
+            self.chunk_lines, self.chunk_overlap, st.get("text"), st.get("final_doc") or "",
+        )
+
+    async def __call__(self, s: FileState) -> Dict[str, Any]:
+        res_addition, final_checked_joined = await _addition_check(
+            s, s.get("final_doc") or "", self.chunk_lines, self.chunk_overlap
+        )
+        return {"res_addition": res_addition, "final_checked_joined": final_checked_joined}
+
+
+_SPECULATION_STATS = {"launched": 0, "used": 0, "wasted": 0}
+
+
+def speculation_stats() -> Dict[str, int]:
+    """How often the speculative addition_check result was used vs. thrown away (re-run)."""
+    return dict(_SPECULATION_STATS)
+
+
+class SpeculativeDocChecksNode:
+    """
+    Optional: launch missing_check and addition_check concurrently against format_checked_text.
+    If missing_check leaves final_doc unchanged, the speculative addition result is used directly;
+    only when missing_check actually changed final_doc is addition_check re-run on the new document.
+    """
+    STAGE = "doc_checks"
+    OUTPUT_KEYS = ("res_missing", "final_doc", "res_addition", "final_checked_joined", "speculation_wasted")
+
+    def __init__(self, chunk_lines: int = 0, chunk_overlap: int = 2):
+        self.chunk_lines = chunk_lines
+        self.chunk_overlap = chunk_overlap
+
+    def fingerprint(self, st: FileState) -> str:
+        return fingerprint(
+            source_fingerprint(build_missing_check_prompt, build_addition_check_prompt, _base_user_block), "gpt-5",
+            self.chunk_lines, self.chunk_overlap, st.get("text"),
+            st.get("format_checked_text", ""),
+        )
+
+    async def __call__(self, s: FileState) -> Dict[str, Any]:
+        base_doc = s.get("format_checked_text", "")
+        (res_missing, final_doc), speculative = await asyncio.gather(
+            _missing_check(s, self.chunk_lines, self.chunk_overlap),
+            _addition_check(s, base_doc, self.chunk_lines, self.chunk_overlap),
+        )
+        out: Dict[str, Any] = {"res_missing": res_missing, "final_doc": final_doc}
+        _SPECULATION_STATS["launched"] += 1
+
+        if final_doc == base_doc:
+            _SPECULATION_STATS["used"] += 1
+            out["speculation_wasted"] = False
+            out["res_addition"], out["final_checked_joined"] = speculative
         else:
-            st["res_addition"] = {"faithfulness_issue": False, "suggestions": []}
-            st["final_checked_joined"] = (st.get("final_doc") or st.get("format_checked_text") or "").rstrip("\n")
-            
-        return st
+            _SPECULATION_STATS["wasted"] += 1
+            out["speculation_wasted"] = True
+            out["res_addition"], out["final_checked_joined"] = await _addition_check(
+                s, final_doc, self.chunk_lines, self.chunk_overlap
+            )
+        return out
+
+
+class CheckpointedNode:
+    """Replay a file-graph node's finished output from the checkpoint store instead of re-running it."""
+    def __init__(self, name: str, node, checkpoint_store: CheckpointStore):
+        self.name = name
+        self.node = node
+        self.checkpoint_store = checkpoint_store
+
+    async def __call__(self, s: FileState) -> Dict[str, Any]:
+        run_key = s.get("run_key")
+        if run_key:
+            saved = await self.checkpoint_store.aload_node(run_key, self.name)
+            if saved is not None:
+                return saved
+        out = self.node(s)
+        if asyncio.iscoroutine(out):
+            out = await out
+        if run_key:
+            await self.checkpoint_store.asave_node(run_key, self.name, out)
+        return out
 
 
 class FinalizeAndSaveNode:
-    """Assemble semantic issues and save result JSON"""
-    def __call__(self, s: FileState) -> FileState:
-        st = s.copy()
+    """Assemble semantic issues and hand the result JSON to the output sink (written on its writer thread)"""
+    def __init__(self, checkpoint_store: Optional[CheckpointStore] = None, sink: Optional[OutputSink] = None):
+        self.checkpoint_store = checkpoint_store
+        self.sink = sink or default_json_sink()
 
+    async def __call__(self, st: FileState) -> Dict[str, Any]:
         # === content_check ===
         emoji_issue_flag = len(st.get("emoji_line_issues", [])) > 0
         missing_issue = b(st.get("res_missing", {}).get("missing_content"), False)
@@ -286,9 +691,7 @@ class FinalizeAndSaveNode:
         }
 
         # === 결과 JSON 저장 ===
-        out_folder = os.path.join(st["output_dir"], st["parent_folder"])
-        os.makedirs(out_folder, exist_ok=True)
-        output_path = os.path.join(out_folder, st["filename"])
+        output_path = os.path.join(st["output_dir"], st["parent_folder"], st["filename"])
 
         result_json = {
             "source": st["source"],
@@ -297,32 +700,104 @@ class FinalizeAndSaveNode:
             "original_trans": st["trans"],
             "final_llm_suggestion": st["final_checked_joined"],  
             "format_check": st.get("checked_sentences", []),       
-            "content_check": content_check                         
+            "content_check": content_check,
+            "input_sha256": st.get("input_sha256"),
         }
-
-        with open(output_path, "w", encoding="utf-8") as f:
-            json.dump(result_json, f, ensure_ascii=False, indent=2)
-        return st
-
-
-
-def build_file_graph(
+        if st.get("record_id"):
+            result_json["record_id"] = st["record_id"]
+        # 이 파일의 GPT 호출 stage별 요약 (session.run의 file_scope 안에서 실행될 때)
+        file_metrics = current_file_metrics()
+        if file_metrics is not None:
+            result_json["metrics"] = {"stages": file_metrics.summary(), "totals": file_metrics.totals()}
+
+        # 직렬화/쓰기는 sink의 writer thread에서 (이 파일만 기록 완료를 기다리고 event loop는 막지 않음)
+        try:
+            written = await asyncio.wrap_future(self.sink.submit(output_path, result_json))
+        except Exception as e:
+            _log_error_file(st, stage="finalize_save", error_type=type(e).__name__, error_message=str(e))
+            return {"output_path": None}
+        # 결과 JSON에 input_sha256이 남으므로 이 run의 체크포인트는 더 이상 필요 없음
+        if self.checkpoint_store is not None and st.get("run_key"):
+            self.checkpoint_store.clear(st["run_key"])
+        return {"output_path": written}
+
+
+
+def build_file_nodes(
     *,
     API_TIMEOUT_SEC: int,
     MAX_RETRIES: int,
     CONCURRENCY_LINES: int,
-):
-    """Build and return compiled file-level LangGraph"""
+    get_guideline=None,
+    USE_RULE_CATEGORY: bool = True,
+    CATEGORY_BATCH: bool = False,
+    CATEGORY_BATCH_TOKEN_BUDGET: int = 1500,
+    FORMAT_BATCH: bool = False,
+    FORMAT_BATCH_TOKEN_BUDGET: int = 3000,
+    COMBINED_FORMAT_CHECK: bool = False,
+    SPECULATIVE_DOC_CHECKS: bool = False,
+    DOC_CHECK_CHUNK_LINES: int = 0,
+    DOC_CHECK_CHUNK_OVERLAP: int = 2,
+    CHECKPOINT_PATH: Optional[str] = None,
+    STAGE_STORE_PATH: Optional[str] = None,
+    OUTPUT_SINK: Optional[OutputSink] = None,
+    LINE_WINDOW: int = 64,
+) -> List[Tuple[str, Any]]:
+    """
+    Build the file graph's stages in execution order as [(name, node), ...]; every node takes the
+    FileState and returns a partial update. build_file_graph chains them into a LangGraph,
+    graph.stage_pipeline.StagePipeline runs each one off its own queue.
+    get_guideline: (locale, category) -> guideline text (default: the GUIDE_BASE_DIR registry).
+    CHECKPOINT_PATH: local SQLite file for crash-safe resume (None → no checkpoints).
+    STAGE_STORE_PATH: local SQLite file of stage outputs + input fingerprints; a re-run recomputes only
+        the stages whose prompt builder / guideline / model / upstream output changed (None → off).
+    LINE_WINDOW: max line subgraphs in flight per file (bounds memory on very long documents).
+    OUTPUT_SINK: where finalize_save writes results (None → atomic per-file JSON, utils.output_sink).
+    """
+    get_guideline = get_guideline or guideline_registry()
+    store = CheckpointStore(CHECKPOINT_PATH) if CHECKPOINT_PATH else None
+    stage_store = get_stage_store(STAGE_STORE_PATH) if STAGE_STORE_PATH else None
+
+    def _node(name: str, node):
+        if stage_store is not None and hasattr(node, "fingerprint"):
+            node = IncrementalNode(node, stage_store)
+        return CheckpointedNode(name, node, store) if store is not None else node
+
+    nodes: List[Tuple[str, Any]] = [
+        ("load_file", LoadFileNode(store)),
+        ("map_lines", _node("map_lines", MapLinesNode(
+            API_TIMEOUT_SEC, MAX_RETRIES, CONCURRENCY_LINES, get_guideline,
+            use_rule_category=USE_RULE_CATEGORY,
+            category_batch=CATEGORY_BATCH,
+            category_batch_token_budget=CATEGORY_BATCH_TOKEN_BUDGET,
+            format_batch=FORMAT_BATCH,
+            format_batch_token_budget=FORMAT_BATCH_TOKEN_BUDGET,
+            combined_format_check=COMBINED_FORMAT_CHECK,
+            checkpoint_store=store,
+            stage_store=stage_store,
+            line_window=LINE_WINDOW,
+        ))),
+    ]
+    if SPECULATIVE_DOC_CHECKS:
+        nodes.append(("doc_checks", _node("doc_checks", SpeculativeDocChecksNode(DOC_CHECK_CHUNK_LINES, DOC_CHECK_CHUNK_OVERLAP))))
+    else:
+        nodes.append(("missing_check", _node("missing_check", MissingCheckNode(DOC_CHECK_CHUNK_LINES, DOC_CHECK_CHUNK_OVERLAP))))
+        nodes.append(("addition_check", _node("addition_check", AdditionCheckNode(DOC_CHECK_CHUNK_LINES, DOC_CHECK_CHUNK_OVERLAP))))
+    nodes.append(("finalize_save", FinalizeAndSaveNode(store, OUTPUT_SINK)))
+    return nodes
+
+
+def build_file_graph(**kwargs):
+    """
+    Build and return compiled file-level LangGraph: the build_file_nodes(**kwargs) stages chained
+    load_file → map_lines → missing_check → addition_check (or doc_checks) → finalize_save.
+    """
+    nodes = build_file_nodes(**kwargs)
     g = StateGraph(FileState)
-    g.add_node("load_file", LoadFileNode())
-    g.add_node("map_lines",  MapLinesNode(API_TIMEOUT_SEC, MAX_RETRIES, CONCURRENCY_LINES))
-    g.add_node("missing_check", MissingCheckNode())
-    g.add_node("addition_check", AdditionCheckNode())
-    g.add_node("finalize_save", FinalizeAndSaveNode())
-    g.set_entry_point("load_file")
-    g.add_edge("load_file", "map_lines")
-    g.add_edge("map_lines", "missing_check")
-    g.add_edge("missing_check", "addition_check")
-    g.add_edge("addition_check", "finalize_save")
-    g.add_edge("finalize_save", END)
+    for name, node in nodes:
+        g.add_node(name, node)
+    g.set_entry_point(nodes[0][0])
+    for (prev, _), (name, _) in zip(nodes, nodes[1:]):
+        g.add_edge(prev, name)
+    g.add_edge(nodes[-1][0], END)
     return g.compile()
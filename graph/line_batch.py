@@ -0,0 +1,274 @@
+# graph/line_batch.py — document-level batched line stages (run by MapLinesNode before the line subgraph)
+from __future__ import annotations
+import asyncio
+from typing import List, Dict, Any, Optional, Tuple
+
+from utils.gpt_client import ask_gpt4o_async
+from prompt_builder.build_prompt import build_category_batch_prompt, build_check_batch_prompt
+from utils.helper import llist, norm, normalize_gpt_json
+from utils.category_rules import CATEGORIES
+from graph.line_subgraph import safe_ask
+
+_VALID_CATEGORIES = frozenset(CATEGORIES)
+
+
+def _has_digit(text: Optional[str]) -> bool:
+    return any(ch.isdigit() for ch in (text or ""))
+
+
+def estimate_tokens(text: str) -> int:
+    """Cheap token estimate (~3 chars/token incl. JSON overhead); avoids a tokenizer dependency."""
+    return len(text or "") // 3 + 8
+
+
+def pack_by_token_budget(entries: List[Tuple[int, str]], token_budget: int) -> List[List[Tuple[int, str]]]:
+    """Greedily pack (id, text) entries into chunks whose estimated size stays within token_budget."""
+    chunks: List[List[Tuple[int, str]]] = []
+    cur: List[Tuple[int, str]] = []
+    used = 0
+    for entry in entries:
+        cost = estimate_tokens(entry[1])
+        if cur and used + cost > token_budget:
+            chunks.append(cur)
+            cur, used = [], 0
+        cur.append(entry)
+        used += cost
+    if cur:
+        chunks.append(cur)
+    return chunks
+
+
+def _parse_batch_categories(res, ids: List[int]) -> Dict[int, List[str]]:
+    """
+    Parse {"<id>": [categories]} → {id: [categories]}.
+    Ids that are missing or whose value is not a clean category list are left out (→ single-line fallback).
+    """
+    js = normalize_gpt_json(res) if res != "error" else {}
+    if not isinstance(js, dict):
+        return {}
+    out: Dict[int, List[str]] = {}
+    for i in ids:
+        val = js.get(str(i))
+        if not isinstance(val, list) or not all(isinstance(c, str) for c in val):
+            continue
+        cats = list(dict.fromkeys(c.strip() for c in val if c.strip()))
+        if any(c not in _VALID_CATEGORIES for c in cats):
+            continue
+        out[i] = cats
+    return out
+
+
+async def batch_detect_categories(
+    items: List[Dict[str, Any]],
+    *,
+    classifier,
+    timeout: int,
+    max_retries: int,
+    token_budget: int,
+    concurrency: int,
+) -> Dict[str, int]:
+    """
+    Pre-compute detected_categories for every line item in place:
+      - category_source already set (reused from the stage store) → left as is
+      - no digits → skipped (same rule as DetectCategoryNode)
+      - decidable by the local classifier → "rule"
+      - the rest → indexed JSON requests packed by token budget → "batch"
+    Lines whose id is missing/misparsed in the batch reply keep no preset, so DetectCategoryNode
+    falls back to its single-line call for them.
+    Returns counters for this document.
+    """
+    stats = {"rule": 0, "batch_lines": 0, "batch_calls": 0}
+    pending: List[Tuple[int, str]] = []
+    by_i = {it["i"]: it for it in items}
+
+    for it in items:
+        if it.get("category_source"):
+            continue  # 이전 실행 결과 재사용 (stage store)
+        if not _has_digit(it.get("src_line")) and not _has_digit(it.get("trn_line")):
+            continue
+        if classifier is not None:
+            local = classifier.classify(it["trn_line"], it["doc"].target)
+            if local is not None:
+                it["detected_categories"] = local
+                it["category_source"] = "rule"
+                stats["rule"] += 1
+                continue
+        pending.append((it["i"], it["trn_line"]))
+
+    if not pending:
+        return stats
+
+    sem = asyncio.Semaphore(max(1, concurrency))
+
+    async def _run_chunk(chunk: List[Tuple[int, str]]) -> None:
+        ids = [i for i, _ in chunk]
+        sys_cat, usr_cat = build_category_batch_prompt(chunk)
+        async with sem:
+            res, _ = await safe_ask(
+                ask_gpt4o_async, [sys_cat, usr_cat],
+                model="gpt-4o",
+                timeout=timeout, max_retries=max_retries,
+                stage="category_batch",
+                state_for_log=by_i[ids[0]],
+                line_no=None,
+                category=None,
+            )
+        stats["batch_calls"] += 1
+        for i, cats in _parse_batch_categories(res, ids).items():
+            by_i[i]["detected_categories"] = cats
+            by_i[i]["category_source"] = "batch"
+            stats["batch_lines"] += 1
+
+    await asyncio.gather(*(_run_chunk(c) for c in pack_by_token_budget(pending, token_budget)))
+    return stats
+
+
+async def detect_remaining_categories(items: List[Dict[str, Any]], detect_node, concurrency: int) -> None:
+    """
+    Run single-line DetectCategoryNode for every item without a preset category result,
+    so that the document-level format batch sees all categories up front.
+    """
+    pending = iter([it for it in items if not it.get("category_source")])
+
+    # 라인 수만큼 task를 만들지 않고 concurrency개 worker가 순서대로 처리
+    async def _worker() -> None:
+        for it in pending:
+            out = await detect_node(it)
+            it["detected_categories"] = out.get("detected_categories", [])
+            it["category_source"] = out.get("category_source", "llm")
+
+    await asyncio.gather(*(_worker() for _ in range(max(1, concurrency))))
+
+
+def spans_consistent(before: str, revised: str, trans_spans: list, revised_spans: list) -> bool:
+    """
+    Span-consistency rule of build_check_prompt: replacing every trans_spans[i] with revised_spans[i]
+    (left to right) in the original translation must yield exactly the revised sentence.
+    """
+    if norm(revised) == norm(before):
+        return True
+    if not trans_spans or len(trans_spans) != len(revised_spans):
+        return False
+    if not all(isinstance(x, str) for x in trans_spans + revised_spans):
+        return False
+    out, pos = before, 0
+    for t, r in zip(trans_spans, revised_spans):
+        k = out.find(t, pos)
+        if k < 0:
+            return False
+        out = out[:k] + r + out[k + len(t):]
+        pos = k + len(r)
+    return norm(out) == norm(revised)
+
+
+def _apply_check_result(it: Dict[str, Any], cat: str, js: Dict[str, Any]) -> bool:
+    """Apply one verified per-line result exactly like FormatCheckLoopNode does. False → fallback."""
+    before = it["revised_fmt"]
+    new_rev = js.get("revised", before)
+    if not isinstance(new_rev, str):
+        return False
+    new_rev = new_rev.strip()
+    src_sp = llist(js.get("source_spans"))
+    trn_sp = llist(js.get("trans_spans"))
+    rev_sp = llist(js.get("revised_spans"))
+    if not spans_consistent(before, new_rev, trn_sp, rev_sp):
+        return False
+
+    it["revised_fmt"] = new_rev
+    if norm(new_rev) != norm(before):
+        it["violated_categories"].append(cat)
+        if src_sp or trn_sp or rev_sp:
+            it["spans_by_category"][cat] = {
+                "source_spans": src_sp,
+                "trans_spans": trn_sp,
+                "revised_spans": rev_sp,
+            }
+    it["format_done_categories"].append(cat)
+    return True
+
+
+async def batch_format_check(
+    items: List[Dict[str, Any]],
+    *,
+    get_guideline,
+    timeout: int,
+    max_retries: int,
+    token_budget: int,
+    concurrency: int,
+) -> Dict[str, int]:
+    """
+    Document-level format check: lines flagged for the same (locale, category) are checked together
+    under one copy of the guideline. Categories are processed in rounds (k-th detected category of
+    each line per round) so a line's later categories still see the earlier revised sentence, exactly
+    as in the sequential per-line loop.
+    Any line whose batch result is missing or breaks the span-consistency rule leaves the batch and
+    FormatCheckLoopNode finishes its remaining categories one call at a time.
+    """
+    stats = {"format_batch_calls": 0, "format_batch_lines": 0, "format_batch_fallbacks": 0}
+    active = []
+    for it in items:
+        done = set(it.get("format_done_categories") or [])
+        cats = [c for c in dict.fromkeys(it.get("detected_categories") or []) if c not in done]
+        if not cats:
+            continue
+        it.setdefault("revised_fmt", it.get("trn_line", ""))
+        it.setdefault("violated_categories", [])
+        it.setdefault("spans_by_category", {})
+        it.setdefault("format_done_categories", [])
+        it["_fmt_cats"] = cats
+        active.append(it)
+
+    sem = asyncio.Semaphore(max(1, concurrency))
+    dropped = set()
+
+    async def _run_chunk(locale: str, cat: str, guideline: str, chunk: List[Dict[str, Any]]) -> None:
+        sys_chk, usr_chk = build_check_batch_prompt(
+            guideline, [(it["i"], it["src_line"], it["revised_fmt"]) for it in chunk]
+        )
+        async with sem:
+            res, _ = await safe_ask(
+                ask_gpt4o_async, [sys_chk, usr_chk],
+                model="gpt-4o",
+                timeout=timeout, max_retries=max_retries,
+                stage="format_check_batch",
+                state_for_log=chunk[0],
+                line_no=None,
+                category=cat,
+            )
+        stats["format_batch_calls"] += 1
+        js = normalize_gpt_json(res) if res != "error" else {}
+        if not isinstance(js, dict):
+            js = {}
+        for it in chunk:
+            item_js = js.get(str(it["i"]))
+            if isinstance(item_js, dict) and _apply_check_result(it, cat, item_js):
+                stats["format_batch_lines"] += 1
+            else:
+                dropped.add(it["i"])
+                stats["format_batch_fallbacks"] += 1
+
+    max_rounds = max((len(it["_fmt_cats"]) for it in active), default=0)
+    for k in range(max_rounds):
+        groups: Dict[Tuple[str, str], List[Dict[str, Any]]] = {}
+        for it in active:
+            if it["i"] in dropped or k >= len(it["_fmt_cats"]):
+                continue
+            cat = it["_fmt_cats"][k]
+            guideline = get_guideline(it["doc"].target, cat)
+            if not guideline:
+                # 가이드라인 없는 카테고리는 단일 라인 경로와 동일하게 건너뜀
+                it["format_done_categories"].append(cat)
+                continue
+            groups.setdefault((it["doc"].target, cat), []).append(it)
+
+        tasks = []
+        for (locale, cat), members in groups.items():
+            guideline = get_guideline(locale, cat)
+            by_i = {it["i"]: it for it in members}
+            for chunk in pack_by_token_budget([(it["i"], it["src_line"] + it["revised_fmt"]) for it in members], token_budget):
+                tasks.append(_run_chunk(locale, cat, guideline, [by_i[i] for i, _ in chunk]))
+        await asyncio.gather(*tasks)
+
+    for it in active:
+        it.pop("_fmt_cats", None)
+    return stats
@@ -2,30 +2,23 @@
 from __future__ import annotations
 from typing import TypedDict, List, Dict, Any, Optional
 from langgraph.graph import StateGraph, END
-import os, json, time
-from threading import Lock
+import time
 
 from utils.gpt_client import ask_gpt4o_async, ask_gpt5_async
+from utils.error_log import append_error_jsonl
+from utils.metrics import stage_scope
+from utils.stage_store import StageStore, IncrementalNode, fingerprint, source_fingerprint
+from utils import category_rules
 from prompt_builder.build_prompt import (
+    _base_user_block,
     build_category_prompt,
+    build_category_batch_prompt,
     build_check_prompt,
+    build_check_batch_prompt,
+    build_multi_check_prompt,
     build_emoji_check_prompt,
 )
-from utils.helper import b, llist, normalize_gpt_json, norm, has_emoji, normalize_gpt_json_cat
-
-_ERROR_LOG_LOCK = Lock()
-
-def _error_log_path(output_dir: Optional[str]) -> str:
-    base = output_dir or os.getenv("OUTPUT_DIR") or os.getcwd()
-    os.makedirs(base, exist_ok=True)
-    return os.path.join(base, "error.jsonl")
-
-def _append_error_jsonl(payload: dict, output_dir: Optional[str]) -> None:
-    path = _error_log_path(output_dir)
-    line = json.dumps(payload, ensure_ascii=False)
-    with _ERROR_LOG_LOCK:
-        with open(path, "a", encoding="utf-8") as f:
-            f.write(line + "\n")
+from utils.helper import b, llist, normalize_gpt_json, norm, has_emoji, emoji_signature, normalize_gpt_json_cat
 
 def _log_error_line(
     state_like: Dict[str, Any],
@@ -39,12 +32,13 @@ def _log_error_line(
     """
     Append a line-level error as one JSON line into error.jsonl
     """
+    doc = state_like.get("doc") or _NO_DOC
     payload = {
         "type": "gpt_call_error",
         "timestamp": time.strftime("%Y-%m-%d %H:%M:%S", time.localtime()),
         "context": {
-            "parent_folder": state_like.get("parent_folder", "unknown"),
-            "filename": state_like.get("filename", "unknown"),
+            "parent_folder": doc.parent_folder or "unknown",
+            "filename": doc.filename or "unknown",
         },
         "stage": stage,
         "line_no": line_no,
@@ -52,7 +46,7 @@ def _log_error_line(
         "error": {"type": error_type, "message": error_message},
         "guideline": None,
     }
-    _append_error_jsonl(payload, state_like.get("output_dir"))
+    append_error_jsonl(payload, doc.output_dir)
 
 async def safe_ask(
     func,
@@ -70,7 +64,8 @@ async def safe_ask(
     Wrapper for GPT calls with JSONL error logging (line-level)
     """
     try:
-        return await func(messages, model=model, timeout=timeout, max_retries=max_retries)
+        with stage_scope(stage):
+            return await func(messages, model=model, timeout=timeout, max_retries=max_retries)
     except Exception as e:
         if state_for_log is not None:
             _log_error_line(
@@ -84,17 +79,31 @@ async def safe_ask(
         return "error", {}
 
 
+class LineDoc:
+    """Document metadata shared by reference by every LineState of one file (one object per document, not per line)."""
+    __slots__ = ("target", "parent_folder", "filename", "output_dir")
+
+    def __init__(self, target: Optional[str], parent_folder: Optional[str] = None,
+                 filename: Optional[str] = None, output_dir: Optional[str] = None):
+        self.target = target
+        self.parent_folder = parent_folder
+        self.filename = filename
+        self.output_dir = output_dir
+
+
+_NO_DOC = LineDoc(None)
+
+
 class LineState(TypedDict, total=False):
+    """
+    Per-line state. Nodes return only the keys they change (LangGraph merges them),
+    and document-level fields live in the shared `doc`.
+    """
     # input
     i: int
     src_line: str
     trn_line: str
-    target: str
-
-    # optional meta for error logging
-    parent_folder: str
-    filename: str
-    output_dir: str
+    doc: LineDoc   # target locale + error-log context
 
     # work
     revised_fmt: str
@@ -102,32 +111,69 @@ class LineState(TypedDict, total=False):
     violated_categories: List[str]
     spans_by_category: Dict[str, Dict[str, List[Any]]]
     emoji_issue_item: Optional[Dict[str, Any]]
+    emoji_source: str      # "local" (시퀀스/위치 일치) | "llm"
     checked_sentence_item: Optional[Dict[str, Any]]
+    format_done_categories: List[str]
+    category_source: str   # "skip" | "rule" | "batch" | "llm"
 
-    # failure logs (in-memory markers if needed)
-    failures: List[str]
-
-
-from typing import List
 
 class DetectCategoryNode:
-    def __init__(self, api_timeout: int, max_retries: int):
+    STAGE = "detect_category"
+    OUTPUT_KEYS = ("detected_categories", "category_source")
+
+    def __init__(self, api_timeout: int, max_retries: int, classifier=None):
         self.timeout = api_timeout
         self.max_retries = max_retries
+        self.classifier = classifier  # CategoryRuleClassifier | None
+
+    def fingerprint(self, s: LineState) -> str:
+        # 규칙 분류기는 currency 가이드라인 중 기호/코드 목록에만 의존
+        target = s["doc"].target
+        rules = self.classifier.signature(target) if self.classifier is not None else None
+        return fingerprint(
+            source_fingerprint(build_category_prompt, build_category_batch_prompt, category_rules),
+            "gpt-4o", rules, target, s.get("src_line"), s.get("trn_line"),
+        )
 
-    async def __call__(self, state: LineState) -> LineState:
-        s = state.copy()
-        s.setdefault("failures", [])
-        s["revised_fmt"] = s.get("trn_line", "")
+    @staticmethod
+    def _defaults(s: LineState) -> Dict[str, Any]:
+        out: Dict[str, Any] = {}
+        if "revised_fmt" not in s:
+            out["revised_fmt"] = s.get("trn_line", "")
+        if "violated_categories" not in s:
+            out["violated_categories"] = []
+        if "spans_by_category" not in s:
+            out["spans_by_category"] = {}
+        return out
+
+    def restore(self, state: LineState, saved: Dict[str, Any]) -> Dict[str, Any]:
+        out = self._defaults(state)
+        out.update(saved)
+        return out
+
+    async def __call__(self, s: LineState) -> Dict[str, Any]:
+        # MapLinesNode 배치 단계에서 이미 결정된 라인 (format batch 결과가 있으면 그대로 유지)
+        if s.get("category_source"):
+            return self._defaults(s)
+
+        trn = s.get("trn_line", "")
+        out: Dict[str, Any] = {"revised_fmt": trn, "violated_categories": [], "spans_by_category": {}}
 
         # 숫자가 하나도 없다면 카테고리 검출 생략
-        if not any(ch.isdigit() for ch in (s.get("src_line") or "")) and not any(ch.isdigit() for ch in (s.get("trn_line") or "")):
-            s["detected_categories"] = []
-            s["violated_categories"] = []
-            s["spans_by_category"] = {}
-            return s
-
-        sys_cat, usr_cat = build_category_prompt(s["revised_fmt"])
+        if not any(ch.isdigit() for ch in (s.get("src_line") or "")) and not any(ch.isdigit() for ch in trn):
+            out["detected_categories"] = []
+            out["category_source"] = "skip"
+            return out
+
+        # 로컬 규칙으로 확정 가능한 라인은 LLM 호출 생략
+        if self.classifier is not None:
+            local = self.classifier.classify(trn, s["doc"].target)
+            if local is not None:
+                out["detected_categories"] = local
+                out["category_source"] = "rule"
+                return out
+
+        sys_cat, usr_cat = build_category_prompt(trn)
         res, _ = await safe_ask(
             ask_gpt4o_async, [sys_cat, usr_cat],
             model='gpt-4o',
@@ -156,26 +202,107 @@ class DetectCategoryNode:
                 seen.add(cc)
                 uniq.append(cc)
 
-        s["detected_categories"] = uniq
-        s["violated_categories"] = []
-        s["spans_by_category"] = {}
-        return s
+        out["detected_categories"] = uniq
+        out["category_source"] = "llm"
+        return out
 
 
 class FormatCheckLoopNode: ##### 가이드라인 가져와서 여러 개 어떻게 체크하고 수정문 잘 안 들어가는 이유 확인하기     
-    def __init__(self, api_timeout: int, max_retries: int, get_guideline):
+    STAGE = "format_check"
+    OUTPUT_KEYS = ("revised_fmt", "violated_categories", "spans_by_category")
+
+    def __init__(self, api_timeout: int, max_retries: int, get_guideline, combined: bool = False):
         self.timeout = api_timeout
         self.max_retries = max_retries
         self.get_guideline = get_guideline
+        self.combined = combined  # True: 여러 카테고리를 한 번의 호출로 검사
+
+    def fingerprint(self, s: LineState) -> str:
+        # 검출된 카테고리의 가이드라인만 포함 → currency 가이드라인 수정 시 currency 라인만 재검사
+        cats = list(dict.fromkeys(s.get("detected_categories") or []))
+        return fingerprint(
+            source_fingerprint(build_check_prompt, build_multi_check_prompt, build_check_batch_prompt),
+            "gpt-4o", self.combined, s["doc"].target, cats,
+            {cat: self.get_guideline(s["doc"].target, cat) for cat in cats},
+            s.get("src_line"), s.get("trn_line"),
+        )
 
-    async def __call__(self, state: LineState) -> LineState:
-        s = state.copy()
+    async def _check_combined(self, s: LineState, out: Dict[str, Any], cats: List[str]) -> bool:
+        """
+        One gpt-4o call with every applicable guideline, recorded into `out`. Returns False (→ sequential
+        per-category loop) when the reply cannot be parsed or a change cannot be attributed to any category.
+        """
+        guidelines = {cat: self.get_guideline(s["doc"].target, cat) for cat in cats}
+        before = out["revised_fmt"]
+        sys_chk, usr_chk = build_multi_check_prompt(before, guidelines, s["src_line"])
+        res, _ = await safe_ask(
+            ask_gpt4o_async, [sys_chk, usr_chk],
+            model='gpt-4o',
+            timeout=self.timeout, max_retries=self.max_retries,
+            stage="format_check_combined",
+            state_for_log=s,
+            line_no=(s.get("i", -1) + 1),
+            category=",".join(cats),
+        )
+        if res == "error":
+            return False
+        js = normalize_gpt_json(res)
+        if not isinstance(js, dict):
+            return False
+        new_rev = js.get("revised")
+        by_cat = js.get("spans_by_category")
+        if not isinstance(new_rev, str) or not isinstance(by_cat, dict):
+            return False
+        new_rev = new_rev.strip()
+
+        spans = {}
+        for cat in cats:
+            sp = by_cat.get(cat) if isinstance(by_cat.get(cat), dict) else {}
+            tmp_src_sp = llist(sp.get("source_spans"))
+            tmp_trn_sp = llist(sp.get("trans_spans"))
+            tmp_rev_sp = llist(sp.get("revised_spans"))
+            if tmp_src_sp or tmp_trn_sp or tmp_rev_sp:
+                spans[cat] = {
+                    "source_spans": tmp_src_sp,
+                    "trans_spans": tmp_trn_sp,
+                    "revised_spans": tmp_rev_sp
+                }
+
+        changed = norm(new_rev) != norm(before)
+        if changed and not spans:
+            return False
+
+        out["revised_fmt"] = new_rev
+        if changed:
+            for cat in cats:
+                if cat in spans:
+                    out["violated_categories"].append(cat)
+                    out["spans_by_category"][cat] = spans[cat]
+        return True
+
+    async def __call__(self, s: LineState) -> Dict[str, Any]:
         cats = list(dict.fromkeys(s.get("detected_categories") or []))  # unique & stable
+        done = set(s.get("format_done_categories") or [])  # 문서 단위 format batch에서 처리 완료
+        target = s["doc"].target
+        out: Dict[str, Any] = {
+            "revised_fmt": s["revised_fmt"],
+            "violated_categories": list(s.get("violated_categories") or []),
+            "spans_by_category": dict(s.get("spans_by_category") or {}),
+        }
+
+        # combined 모드: 적용 가능한 가이드라인이 2개 이상이면 한 번의 호출로 검사
+        pending = [c for c in cats if c not in done and self.get_guideline(target, c)]
+        if self.combined and len(pending) > 1:
+            if await self._check_combined(s, out, pending):
+                return out
+
         for cat in cats:
-            guideline = self.get_guideline(s["target"], cat)
+            if cat in done:
+                continue
+            guideline = self.get_guideline(target, cat)
             if not guideline:
                 continue
-            before = s["revised_fmt"]
+            before = out["revised_fmt"]
             sys_chk, usr_chk = build_check_prompt(before, guideline, s["src_line"])
             res, _ = await safe_ask(
                 ask_gpt4o_async, [sys_chk, usr_chk],
@@ -192,32 +319,46 @@ class FormatCheckLoopNode: ##### 가이드라인 가져와서 여러 개 어떻
                 if js:
                     new_rev = js.get("revised", before)
                     if isinstance(new_rev, str):
-                        s["revised_fmt"] = new_rev.strip()
+                        out["revised_fmt"] = new_rev.strip()
                     tmp_src_sp = llist(js.get("source_spans"))
                     tmp_trn_sp = llist(js.get("trans_spans"))
                     tmp_rev_sp = llist(js.get("revised_spans"))
 
-            if norm(s["revised_fmt"]) != norm(before):
-                s["violated_categories"].append(cat)
+            if norm(out["revised_fmt"]) != norm(before):
+                out["violated_categories"].append(cat)
                 if tmp_src_sp or tmp_trn_sp or tmp_rev_sp:
-                    s["spans_by_category"][cat] = {
+                    out["spans_by_category"][cat] = {
                         "source_spans": tmp_src_sp,
                         "trans_spans": tmp_trn_sp,
                         "revised_spans": tmp_rev_sp
                     }
-        return s
+        return out
 
 
 class EmojiCheckNode:
+    STAGE = "emoji_check"
+    OUTPUT_KEYS = ("revised_fmt", "emoji_issue_item", "emoji_source")
+
     def __init__(self, api_timeout: int, max_retries: int):
         self.timeout = api_timeout
         self.max_retries = max_retries
 
-    async def __call__(self, state: LineState) -> LineState:
-        s = state.copy()
+    def fingerprint(self, s: LineState) -> str:
+        # upstream 출력(format check 후 revised_fmt)에 의존. 라인 위치는 unit key(라인 index)가 구분
+        return fingerprint(
+            source_fingerprint(build_emoji_check_prompt, _base_user_block),
+            "gpt-5", s.get("src_line"), s.get("revised_fmt"),
+        )
+
+    async def __call__(self, s: LineState) -> Dict[str, Any]:
         src = s["src_line"]; cur = s["revised_fmt"]
         if not (has_emoji(src) or has_emoji(cur)):
-            return s
+            return {}
+
+        # 이모지 시퀀스/위치가 원문과 동일하면 로컬에서 통과 처리 (불일치 시에만 gpt-5로 escalate)
+        if emoji_signature(src) == emoji_signature(cur):
+            return {"emoji_source": "local"}
+        out: Dict[str, Any] = {"emoji_source": "llm"}
 
         sys1, usr1 = build_emoji_check_prompt(src, cur)
         res, _ = await safe_ask(
@@ -231,51 +372,64 @@ class EmojiCheckNode:
         )
         js = normalize_gpt_json(res) if res != "error" else {}
         
-        
-        if len(js['suggestions']) > 1: 
+        suggestions = llist(js.get("suggestions"))
+        if len(suggestions) > 1: 
             temp = ''
-            for sug in js['suggestions']:
+            for sug in suggestions:
                 if isinstance(sug, str) and sug.strip():
                     temp += sug.strip()
                     temp += '\n'
-            js['suggestions'] = [temp.strip()]
+            suggestions = [temp.strip()]
         
         emoji_issue = b(js.get("emoji_issue"), False)
         
         
         if emoji_issue:
-            s["emoji_issue_item"] = {
+            suggestion = (suggestions[0] if suggestions else "") or cur
+            out["emoji_issue_item"] = {
                 "line_no": s["i"] + 1,
                 "source_line": src,
                 "trans_line": cur,
-                "suggestion": js['suggestions'][0] or cur
+                "suggestion": suggestion
             }
-            s["revised_fmt"] = js['suggestions'][0] or cur
-        return s
+            out["revised_fmt"] = suggestion
+        return out
 
 
 class LineReduceNode:
-    async def __call__(self, state: LineState) -> LineState:
-        s = state.copy()
+    async def __call__(self, s: LineState) -> Dict[str, Any]:
         det = s.get("detected_categories", [])
         det = list(dict.fromkeys(det)) 
 
         if det:
-            s["checked_sentence_item"] = {
+            return {"checked_sentence_item": {
                 "detected_categories": det,
                 "violated_categories": s.get("violated_categories", []),
                 "spans_by_category": s.get("spans_by_category", {})
-            }
-        return s
+            }}
+        return {}
 
 
 
-def build_line_subgraph(api_timeout: int, max_retries: int, get_guideline):
-    """Build and return compiled line-level LangGraph"""
+def build_line_subgraph(
+    api_timeout: int,
+    max_retries: int,
+    get_guideline,
+    category_classifier=None,
+    combined_format_check: bool = False,
+    stage_store: Optional[StageStore] = None,
+):
+    """
+    Build and return compiled line-level LangGraph.
+    stage_store: reuse each line's stage outputs whose input fingerprint is unchanged since the last run.
+    """
+    def _node(node):
+        return IncrementalNode(node, stage_store) if stage_store is not None else node
+
     g = StateGraph(LineState)
-    g.add_node("detect_category", DetectCategoryNode(api_timeout, max_retries))
-    g.add_node("format_check_loop", FormatCheckLoopNode(api_timeout, max_retries, get_guideline))
-    g.add_node("emoji_check", EmojiCheckNode(api_timeout, max_retries))
+    g.add_node("detect_category", _node(DetectCategoryNode(api_timeout, max_retries, category_classifier)))
+    g.add_node("format_check_loop", _node(FormatCheckLoopNode(api_timeout, max_retries, get_guideline, combined_format_check)))
+    g.add_node("emoji_check", _node(EmojiCheckNode(api_timeout, max_retries)))
     g.add_node("line_reduce", LineReduceNode())
 
     g.set_entry_point("detect_category")
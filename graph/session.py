@@ -0,0 +1,284 @@
+# graph/session.py — reusable pipeline session (compile graphs once, run many files)
+from __future__ import annotations
+import os
+import time
+import asyncio
+from collections import OrderedDict
+from typing import Optional, Dict, Any, AsyncIterator
+
+import openai
+
+from graph.file_graph import build_file_graph, build_file_nodes
+from graph.stage_pipeline import StagePipeline
+from utils.file_utils import guideline_registry
+from utils.checkpoint_store import file_sha256, output_matches_input
+from utils.metrics import MetricsCollector, file_scope
+from utils.record_stream import iter_records, stream_name
+from utils.error_log import append_error_jsonl
+from utils.output_sink import make_output_sink
+
+
+class PipelineSession:
+    """
+    Compiles the file graph (and, through MapLinesNode, the line subgraph) exactly once
+    and owns the shared API client + guideline store for every file run through it.
+    pipelined=True runs the same nodes on a StagePipeline instead (one queue + stage_workers[stage]
+    workers per stage), so concurrent run() calls overlap line work of one file with document
+    checks of another; pipeline_stats() reports per-stage queue depth and utilisation.
+
+    Usage:
+        session = PipelineSession(output_dir=OUTPUT_DIR, timeout=60, max_retries=10, concurrency=4)
+        result = await session.run("/path/to/input.json")
+    """
+
+    def __init__(
+        self,
+        *,
+        output_dir: str,
+        timeout: int = 3600,
+        max_retries: int = 10,
+        concurrency: int = 1,
+        get_guideline=None,
+        api_key: Optional[str] = None,
+        use_rule_category: bool = True,
+        category_batch: bool = False,
+        category_batch_token_budget: int = 1500,
+        format_batch: bool = False,
+        format_batch_token_budget: int = 3000,
+        combined_format_check: bool = False,
+        speculative_doc_checks: bool = False,
+        doc_check_chunk_lines: int = 0,
+        doc_check_chunk_overlap: int = 2,
+        checkpoint_path: Optional[str] = None,
+        skip_unchanged: bool = False,
+        stream_doc_checks: bool = False,
+        stage_store_path: Optional[str] = None,
+        output_mode: str = "json",
+        output_jsonl_path: Optional[str] = None,
+        output_compress: bool = False,
+        output_fsync_interval_sec: float = 5.0,
+        line_window: int = 64,
+        pipelined: bool = False,
+        stage_workers: Optional[Dict[str, int]] = None,
+    ):
+        self.output_dir = output_dir
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.concurrency = concurrency
+        # stage store 사용 시 입력이 같아도 재실행 (가이드라인/프롬프트 변경 반영, 변경 없는 stage는 재사용)
+        # consolidated JSONL에는 파일별 결과 JSON이 없으므로 input_sha256 비교로 건너뛸 수 없음
+        self.skip_unchanged = skip_unchanged and not stage_store_path and output_mode == "json"
+        self.stream_doc_checks = stream_doc_checks
+
+        # shared API client (openai 0.x: module-level client configuration)
+        if api_key:
+            openai.api_key = api_key
+        self.client = openai
+
+        # shared guideline registry (locale, category) -> guideline text
+        self.get_guideline = get_guideline or guideline_registry()
+
+        # result writer (writer thread): atomic per-file JSON or one append-only JSONL per batch
+        self.sink = make_output_sink(
+            output_mode, output_dir,
+            jsonl_path=output_jsonl_path, compress=output_compress, fsync_interval_sec=output_fsync_interval_sec,
+        )
+
+        graph_kwargs = dict(
+            API_TIMEOUT_SEC=timeout,
+            MAX_RETRIES=max_retries,
+            CONCURRENCY_LINES=concurrency,
+            get_guideline=self.get_guideline,
+            USE_RULE_CATEGORY=use_rule_category,
+            CATEGORY_BATCH=category_batch,
+            CATEGORY_BATCH_TOKEN_BUDGET=category_batch_token_budget,
+            FORMAT_BATCH=format_batch,
+            FORMAT_BATCH_TOKEN_BUDGET=format_batch_token_budget,
+            COMBINED_FORMAT_CHECK=combined_format_check,
+            SPECULATIVE_DOC_CHECKS=speculative_doc_checks,
+            DOC_CHECK_CHUNK_LINES=doc_check_chunk_lines,
+            DOC_CHECK_CHUNK_OVERLAP=doc_check_chunk_overlap,
+            CHECKPOINT_PATH=checkpoint_path,
+            STAGE_STORE_PATH=stage_store_path,
+            OUTPUT_SINK=self.sink,
+            LINE_WINDOW=line_window,
+        )
+        self.pipeline: Optional[StagePipeline] = None
+        self.file_graph = None
+        if pipelined:
+            self.pipeline = StagePipeline(build_file_nodes(**graph_kwargs), workers=stage_workers)
+        else:
+            self.file_graph = build_file_graph(**graph_kwargs)
+        os.makedirs(output_dir, exist_ok=True)
+
+    def close(self) -> None:
+        """Flush pending results; a consolidated JSONL sink is also closed (final fsync)."""
+        if self.sink.mode == "jsonl":
+            self.sink.close()
+        else:
+            self.sink.flush()
+
+    async def aclose(self) -> None:
+        """
+        Stop the stage-pipeline workers on the running loop (a later run() restarts them), then close().
+        Await this before the event loop ends when pipelined=True.
+        """
+        if self.pipeline is not None:
+            await self.pipeline.aclose()
+        await asyncio.to_thread(self.close)
+
+    def pipeline_stats(self) -> Dict[str, Dict[str, Any]]:
+        """Per-stage queue depth / utilisation of the stage pipeline ({} when not pipelined)."""
+        return self.pipeline.stats() if self.pipeline is not None else {}
+
+    def initial_state(self, input_json_path: str) -> Dict[str, Any]:
+        """Build the FileState seed for one input JSON."""
+        return {
+            "input_path": input_json_path,
+            "parent_folder": os.path.basename(os.path.dirname(input_json_path)) or "unknown",
+            "filename": os.path.basename(input_json_path),
+            "output_dir": self.output_dir,
+            "API_TIMEOUT_SEC": self.timeout,
+            "MAX_RETRIES": self.max_retries,
+            "CONCURRENCY_LINES": self.concurrency,
+            "STREAM_DOC_CHECKS": self.stream_doc_checks,
+        }
+
+    def output_path_for(self, input_json_path: str) -> str:
+        parent_folder = os.path.basename(os.path.dirname(input_json_path)) or "unknown"
+        return os.path.join(self.output_dir, parent_folder, os.path.basename(input_json_path))
+
+    async def run(self, input_json_path: str) -> Dict[str, Any]:
+        """
+        Run the compiled file graph for one JSON input.
+        Side effects (file_graph 책임):
+          - 결과 JSON: {output_dir}/{parent_folder}/{filename} (output_mode="jsonl"이면 consolidated JSONL에 1줄 append)
+          - 에러 JSONL: {output_dir}/error.jsonl 에 append
+        skip_unchanged=True 이면 결과 JSON의 input_sha256이 입력과 같은 파일은 실행하지 않음.
+
+        Returns:
+            {"ok": bool, "output_path": str | None, "error_log": str, "stats": dict, "skipped": bool}
+        """
+        output_path = self.output_path_for(input_json_path)
+        if self.skip_unchanged and output_matches_input(output_path, file_sha256(input_json_path)):
+            return self._skipped(output_path)
+        return await self._invoke(self.initial_state(input_json_path))
+
+    def _skipped(self, output_path: str) -> Dict[str, Any]:
+        error_log = os.path.join(self.output_dir, "error.jsonl")
+        return {"ok": True, "output_path": output_path, "error_log": error_log, "stats": {}, "skipped": True}
+
+    async def _invoke(self, state: Dict[str, Any]) -> Dict[str, Any]:
+        error_log = os.path.join(self.output_dir, "error.jsonl")
+        # 실행 (체크포인트 비활성화). 이 파일의 GPT 호출은 file_scope collector로 집계
+        with file_scope(MetricsCollector()) as file_metrics:
+            if self.pipeline is not None:
+                final = await self.pipeline.run(state)
+            else:
+                final = await self.file_graph.ainvoke(state, config={"execution": {"checkpoint": False}})
+
+        output_path = final.get("output_path")
+        ok = bool(output_path)
+        stats = {
+            "category_calls_avoided": final.get("category_calls_avoided", 0),
+            "category_calls_llm": final.get("category_calls_llm", 0),
+            "category_batch_calls": final.get("category_batch_calls", 0),
+            "format_batch_calls": final.get("format_batch_calls", 0),
+            "format_batch_fallbacks": final.get("format_batch_fallbacks", 0),
+            "speculation_wasted": final.get("speculation_wasted"),
+            "gpt": file_metrics.totals(),
+        }
+        return {"ok": ok, "output_path": output_path if ok else None, "error_log": error_log, "stats": stats, "skipped": False}
+
+    # ---------- JSONL / NDJSON: many documents per input file ----------
+    def record_output_path(self, input_path: str, record_id: str) -> str:
+        return os.path.join(self.output_dir, stream_name(input_path), f"{record_id}.json")
+
+    async def run_record(self, input_path: str, record: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Run one parsed record of iter_records(input_path) through the file graph.
+        Output: {output_dir}/{input file name without extension}/{record_id}.json
+        """
+        record_id = record["record_id"]
+        output_path = self.record_output_path(input_path, record_id)
+        if self.skip_unchanged and output_matches_input(output_path, record["sha256"]):
+            return {**self._skipped(output_path), "record_id": record_id}
+        state = {
+            **self.initial_state(input_path),
+            "parent_folder": stream_name(input_path),
+            "filename": f"{record_id}.json",
+            "record_id": record_id,
+            "input_record": record["data"],
+            "input_sha256": record["sha256"],
+        }
+        result = await self._invoke(state)
+        result["record_id"] = record_id
+        return result
+
+    def _log_bad_record(self, input_path: str, record: Dict[str, Any]) -> Dict[str, Any]:
+        append_error_jsonl({
+            "type": "input_record_error",
+            "timestamp": time.strftime("%Y-%m-%d %H:%M:%S", time.localtime()),
+            "context": {"parent_folder": stream_name(input_path), "filename": os.path.basename(input_path)},
+            "stage": "load_file",
+            "line_no": record["line_no"],
+            "category": None,
+            "error": {"type": "InvalidRecord", "message": record["error"]},
+            "guideline": None,
+        }, self.output_dir)
+        return {"ok": False, "output_path": None, "error_log": os.path.join(self.output_dir, "error.jsonl"),
+                "stats": {}, "skipped": False, "record_id": record["record_id"]}
+
+    async def run_jsonl(
+        self,
+        input_path: str,
+        *,
+        max_in_flight: int = 4,
+        id_field: Optional[str] = None,
+        dedupe_window: int = 100_000,
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Stream every record of a JSONL/NDJSON file through the file graph, yielding each record's
+        run() result (plus "record_id") as it completes. At most max_in_flight records are parsed and
+        running at a time; the next line is read only when one of them finishes.
+        A duplicated record id gets a "_L<line_no>" suffix so outputs never overwrite each other; only the
+        last dedupe_window ids are remembered (memory stays bounded on huge streams), so a duplicate
+        further back than that is not renamed.
+        A record that raises yields {"ok": False, ..., "error": "<type>: <message>"} instead of stopping the stream.
+        """
+        records = iter_records(input_path, id_field)
+        seen: "OrderedDict[str, None]" = OrderedDict()   # 최근 dedupe_window개 id (FIFO)
+        running: Dict[asyncio.Future, str] = {}
+        exhausted = False
+        try:
+            while True:
+                while not exhausted and len(running) < max(1, max_in_flight):
+                    record = await asyncio.to_thread(next, records, None)
+                    if record is None:
+                        exhausted = True
+                        break
+                    if record["record_id"] in seen:
+                        record["record_id"] = f"{record['record_id']}_L{record['line_no']}"
+                    seen[record["record_id"]] = None
+                    if len(seen) > max(1, dedupe_window):
+                        seen.popitem(last=False)
+                    if "error" in record:
+                        yield self._log_bad_record(input_path, record)
+                        continue
+                    running[asyncio.ensure_future(self.run_record(input_path, record))] = record["record_id"]
+                if not running:
+                    return
+                done, _ = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    record_id = running.pop(task)
+                    exc = task.exception()
+                    if exc is not None:
+                        yield {"ok": False, "output_path": None, "error_log": os.path.join(self.output_dir, "error.jsonl"),
+                               "stats": {}, "skipped": False, "record_id": record_id,
+                               "error": f"{type(exc).__name__}: {exc}"}
+                    else:
+                        yield task.result()
+        finally:
+            for task in running:
+                task.cancel()
+            records.close()
@@ -0,0 +1,212 @@
+# graph/stage_pipeline.py — stage-pipelined file execution (each file-graph stage pulls from its own queue)
+from __future__ import annotations
+import time
+import asyncio
+import inspect
+import weakref
+from contextlib import nullcontext
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from utils.metrics import file_scope, current_file_metrics
+
+_PIPELINES: "weakref.WeakSet[StagePipeline]" = weakref.WeakSet()
+
+
+class _Stage:
+    """One stage: its queue, its workers and the counters behind stats()."""
+    __slots__ = ("name", "node", "is_async", "workers", "queue", "tasks", "processed", "failed", "busy",
+                 "busy_sec", "wait_sec", "depth", "max_depth", "_depth_area", "_changed_at")
+
+    def __init__(self, name: str, node, workers: int):
+        self.name = name
+        self.node = node
+        # 동기 node (LoadFileNode: 입력 읽기 + checkpoint SQLite)는 event loop을 막지 않도록 thread에서 실행
+        self.is_async = inspect.iscoroutinefunction(node) or inspect.iscoroutinefunction(getattr(node, "__call__", None))
+        self.workers = max(1, workers)
+        self.queue: Optional[asyncio.Queue] = None
+        self.tasks: List[asyncio.Task] = []
+        self.processed = 0
+        self.failed = 0
+        self.busy = 0
+        self.busy_sec = 0.0
+        self.wait_sec = 0.0
+        self.depth = 0
+        self.max_depth = 0
+        self._depth_area = 0.0   # ∫ queue depth dt (시간 가중 평균 depth 계산용)
+        self._changed_at = time.perf_counter()
+
+    def _set_depth(self, delta: int) -> None:
+        now = time.perf_counter()
+        self._depth_area += self.depth * (now - self._changed_at)
+        self._changed_at = now
+        self.depth += delta
+        self.max_depth = max(self.max_depth, self.depth)
+
+
+class StagePipeline:
+    """
+    Runs file states through a linear list of stages (build_file_nodes) where every stage has its own
+    queue and worker tasks, so different files sit in different stages at once: while file A is in
+    addition_check (gpt-5), files B and C are already in map_lines (gpt-4o).
+    A stage's output (partial update) is merged into the file's state before it is queued for the next
+    stage, the same way the compiled LangGraph does. Per-stage workers bound how many files a stage
+    runs concurrently; files waiting for a busy stage wait in its queue (reported by stats()).
+    Synchronous nodes run in a thread (asyncio.to_thread) so their disk I/O never blocks the loop.
+
+    Usage:
+        pipeline = StagePipeline(build_file_nodes(...), workers={"map_lines": 2})
+        final_state = await pipeline.run(initial_state)
+    """
+
+    def __init__(self, stages: Sequence[Tuple[str, Any]], *, workers: Optional[Dict[str, int]] = None, default_workers: int = 1):
+        if not stages:
+            raise ValueError("StagePipeline needs at least one stage")
+        workers = workers or {}
+        self.stages = [_Stage(name, node, workers.get(name, default_workers)) for name, node in stages]
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._started_at: Optional[float] = None   # 첫 run() 시각 (utilisation 분모)
+        self._pending: set = set()                 # 아직 끝나지 않은 파일의 future
+        _PIPELINES.add(self)
+
+    async def run(self, state: Dict[str, Any]) -> Dict[str, Any]:
+        """Queue one file at the first stage and wait for its final state (a stage's exception is raised here)."""
+        self._start()
+        fut = self._loop.create_future()
+        self._pending.add(fut)
+        fut.add_done_callback(self._pending.discard)
+        # file_scope collector는 worker task가 이 파일의 stage를 실행하는 동안 다시 설정
+        self._enqueue(0, dict(state), fut, current_file_metrics())
+        return await fut
+
+    def _start(self) -> None:
+        loop = asyncio.get_running_loop()
+        if self._loop is loop:
+            return
+        # 새 event loop (asyncio.run 재호출 등): 이전 loop의 queue/worker는 버리고 다시 생성
+        self._loop = loop
+        if self._started_at is None:
+            self._started_at = time.perf_counter()
+        for idx, stage in enumerate(self.stages):
+            stage.queue = asyncio.Queue()
+            stage.depth = 0
+            stage.tasks = [loop.create_task(self._worker(idx), name=f"stage-{stage.name}-{i}")
+                           for i in range(stage.workers)]
+
+    def _enqueue(self, idx: int, state: Dict[str, Any], fut: asyncio.Future, collector) -> None:
+        stage = self.stages[idx]
+        stage._set_depth(+1)
+        stage.queue.put_nowait((state, fut, collector, time.perf_counter()))
+
+    async def _worker(self, idx: int) -> None:
+        stage = self.stages[idx]
+        last = idx == len(self.stages) - 1
+        while True:
+            state, fut, collector, queued_at = await stage.queue.get()
+            stage._set_depth(-1)
+            if fut.done():   # 호출자가 취소한 파일
+                continue
+            started = time.perf_counter()
+            stage.wait_sec += started - queued_at
+            stage.busy += 1
+            try:
+                with file_scope(collector) if collector is not None else nullcontext():
+                    if stage.is_async:
+                        out = await stage.node(state)
+                    else:
+                        # to_thread가 contextvars(file_scope)를 복사해 thread로 넘김
+                        out = await asyncio.to_thread(stage.node, state)
+                        if asyncio.iscoroutine(out):
+                            out = await out
+            except Exception as e:
+                stage.failed += 1
+                if not fut.done():
+                    fut.set_exception(e)
+                continue
+            finally:
+                stage.busy -= 1
+                stage.busy_sec += time.perf_counter() - started
+            stage.processed += 1
+            if out:
+                state.update(out)
+            if fut.done():
+                continue
+            if last:
+                fut.set_result(state)
+            else:
+                self._enqueue(idx + 1, state, fut, collector)
+
+    async def aclose(self) -> None:
+        """
+        Cancel and await the stage workers; run() calls still waiting are cancelled.
+        The pipeline stays usable: the next run() starts new workers on its loop.
+        """
+        tasks = [t for stage in self.stages for t in stage.tasks]
+        if self._loop is asyncio.get_running_loop():
+            for t in tasks:
+                t.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            for fut in list(self._pending):
+                fut.cancel()
+        # 다른 (이미 끝난) loop의 worker는 그 loop와 함께 정리됨
+        for stage in self.stages:
+            stage.tasks = []
+            stage.queue = None
+            stage.depth = 0
+        self._pending.clear()
+        self._loop = None
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        """
+        Per stage: workers, processed/failed files, current (queued, busy) and max queue depth,
+        time-weighted mean queue depth, mean queue wait, and utilisation = busy time / (workers × elapsed).
+        """
+        now = time.perf_counter()
+        elapsed = max(1e-9, now - (self._started_at or now))
+        out: Dict[str, Dict[str, Any]] = {}
+        for stage in self.stages:
+            area = stage._depth_area + stage.depth * (now - stage._changed_at)
+            started = stage.processed + stage.failed
+            out[stage.name] = {
+                "workers": stage.workers,
+                "processed": stage.processed,
+                "failed": stage.failed,
+                "queued": stage.depth,
+                "busy": stage.busy,
+                "max_queued": stage.max_depth,
+                "mean_queued": round(area / elapsed, 3),
+                "mean_wait_sec": round(stage.wait_sec / started, 3) if started else 0.0,
+                "busy_sec": round(stage.busy_sec, 3),
+                "utilization": round(min(1.0, stage.busy_sec / (stage.workers * elapsed)), 3),
+            }
+        return out
+
+
+def stage_snapshot() -> Dict[str, Dict[str, Any]]:
+    """stats() of every live StagePipeline in the process (one per pipelined PipelineSession; later ones win on a name clash)."""
+    snap: Dict[str, Dict[str, Any]] = {}
+    for pipeline in list(_PIPELINES):
+        snap.update(pipeline.stats())
+    return snap
+
+
+def stages_to_prometheus(prefix: str = "nac_stage") -> str:
+    gauges = [
+        ("workers", "Worker tasks of the stage", "workers"),
+        ("queue_depth", "Files waiting in the stage queue", "queued"),
+        ("queue_depth_max", "Peak files waiting in the stage queue", "max_queued"),
+        ("queue_depth_mean", "Time-weighted mean files waiting in the stage queue", "mean_queued"),
+        ("utilization", "Busy time / (workers x elapsed)", "utilization"),
+        ("processed_total", "Files that finished the stage", "processed"),
+        ("failed_total", "Files whose stage raised", "failed"),
+    ]
+    snap = stage_snapshot()
+    if not snap:
+        return ""
+    lines: List[str] = []
+    for name, help_text, key in gauges:
+        kind = "counter" if name.endswith("_total") else "gauge"
+        lines.append(f"# HELP {prefix}_{name} {help_text}")
+        lines.append(f"# TYPE {prefix}_{name} {kind}")
+        for stage, s in snap.items():
+            lines.append(f'{prefix}_{name}{{stage="{stage}"}} {s[key]}')
+    return "\n".join(lines) + "\n"
@@ -1,11 +1,24 @@
 # main.py — BE 스타일로 정리된 배치 엔트리포인트 (folders → files, per-file LangGraph)
 import os
 import re
+import time
 import asyncio
 from glob import glob
-from typing import Optional, Dict
+from typing import Optional, List, Tuple
 
-from graph.file_graph import build_file_graph
+from graph.session import PipelineSession
+from graph.file_graph import speculation_stats
+from graph.stage_pipeline import stages_to_prometheus
+from utils.gpt_client import (
+    set_async_limits, configure_hedging, hedge_stats, stream_stats, configure_single_flight, single_flight_stats,
+)
+from utils.response_cache import configure_cache, cache_stats, evict_now
+from utils.error_log import flush_error_log
+from utils.metrics import batch_metrics, write_text_atomic
+from utils.rate_limiter import configure_model_pool, pool_snapshot, pools_to_prometheus
+from utils.stage_store import stage_store_stats
+from utils.file_utils import guideline_registry
+from utils.record_stream import is_record_stream
 
 # ================== Settings ==================
 INPUT_DIR = "/mnt/c/Users/Flitto/Documents/NAC/LLM검수/Advanced_async_batch/data/input2_json"
@@ -22,6 +35,11 @@ TARGET_SUBFOLDERS = [
 ]
 
 MAX_FILES_PER_FOLDER: Optional[int] = None  # None이면 제한 없음
+# *.jsonl / *.ndjson 입력(한 줄 = 문서 1개): 파일 하나당 동시에 처리하는 레코드 수 (그만큼만 메모리에 올라감)
+JSONL_RECORDS_IN_FLIGHT = 4
+JSONL_ID_FIELD: Optional[str] = None  # None이면 id / record_id / doc_id 순으로 찾고 없으면 줄 번호
+# 중복 id 검사에 기억하는 최근 id 수 (중복이면 "_L<줄 번호>" 접미사). 이보다 멀리 떨어진 중복은 감지되지 않음
+JSONL_DEDUPE_WINDOW = 100_000
 
 # Concurrency / retry (line-level은 file_graph 내부에서 사용)
 # CONCURRENCY_LINES = 1
@@ -29,96 +47,286 @@ MAX_FILES_PER_FOLDER: Optional[int] = None  # None이면 제한 없음
 # MAX_RETRIES = 10
 
 CONCURRENCY_LINES = 1
+# 파일 하나에서 동시에 진행하는 라인 subgraph 수 (긴 문서의 메모리 상한; API 동시성은 MODEL_POOLS가 제한)
+LINE_WINDOW = 64
 API_TIMEOUT_SEC = 3600           # API 레벨 타임아웃도 크게 (1시간)
 MAX_RETRIES = 10
 
-# ================== Utils ==================
-def _natural_sort_key(path: str) -> int:
-    """파일명 내 첫 숫자를 기준으로 정렬, 숫자가 없으면 매우 큰 값으로 뒤로."""
-    base = os.path.basename(path)
-    m = re.search(r"/d+", base)
-    return int(m.group()) if m else 10**12
+# File-level 동시 처리 개수 (TARGET_SUBFOLDERS 전체가 하나의 worker pool 공유)
+CONCURRENCY_FILES = 4
+# stage 파이프라인: stage마다 queue + worker를 두어 파일 A가 addition_check(gpt-5) 중일 때 B, C는 map_lines(gpt-4o) 진행
+PIPELINED_STAGES = False
+STAGE_WORKERS = {"map_lines": 2, "missing_check": 2, "addition_check": 2}  # 없는 stage는 1
+# 켜면 CONCURRENCY_FILES 대신 이 값이 파이프라인에 동시에 들어가 있는 파일 수 (stage worker 합보다 크게 두어야 stage 간 queue가 채워짐)
+PIPELINE_FILES_IN_FLIGHT = 8
+# 모델별 동시 API 요청 상한 (각 모델 pool의 adaptive limit이 이 값을 넘지 않음)
+MAX_INFLIGHT_REQUESTS = 8
+# 모델별 pool: 성공 시 동시성 증가, 429/timeout 시 절반으로 감소 (AIMD). rpm/tpm은 계정 tier 한도에 맞게
+MODEL_POOLS = {
+    "gpt-4o": {"initial_concurrency": 2, "max_concurrency": 8, "rpm": 500, "tpm": 30_000},
+    "gpt-5": {"initial_concurrency": 1, "max_concurrency": 4, "rpm": 500, "tpm": 30_000},
+}
+# gpt-4o 라인 호출의 느린 꼬리 구간에 중복 요청(hedge)을 보내 먼저 온 응답 사용 (비용 증가 ≤ HEDGE_MAX_RATIO)
+HEDGE_GPT4O = False
+HEDGE_DELAY_SEC: Optional[float] = None   # None이면 최근 latency p95 경과 후 hedge
+HEDGE_MAX_RATIO = 0.1
+# 동시에 나간 동일 프롬프트(반복되는 체크인/가격 라인 등)는 요청 1개만 보내고 결과 공유
+SINGLE_FLIGHT = True
 
+# 규칙 기반 카테고리 사전 분류 (확정 가능한 라인은 gpt-4o 호출 생략)
+USE_RULE_CATEGORY = True
+# 카테고리 검출 배치 모드 (문서 단위로 여러 라인을 indexed JSON 요청 몇 개로 묶음)
+CATEGORY_BATCH = False
+CATEGORY_BATCH_TOKEN_BUDGET = 1500
+# Format check 배치 모드 (같은 locale/category 라인을 가이드라인 1회로 묶어 검사)
+FORMAT_BATCH = False
+FORMAT_BATCH_TOKEN_BUDGET = 3000
+# 한 라인에 여러 카테고리(date+time 등)가 있으면 가이드라인을 합쳐 1회 호출로 검사
+COMBINED_FORMAT_CHECK = False
+# missing_check / addition_check 동시 실행 (missing이 문서를 바꾼 경우에만 addition 재실행)
+SPECULATIVE_DOC_CHECKS = False
+# 긴 문서의 missing/addition check를 N라인 window(+overlap)로 나눠 병렬 실행 (0이면 문서 전체 1회)
+DOC_CHECK_CHUNK_LINES = 0
+DOC_CHECK_CHUNK_OVERLAP = 2
+# missing/addition check 응답을 streaming으로 받아 verdict가 false면 즉시 중단 (timeout은 chunk 간 무응답 시간)
+STREAM_DOC_CHECKS = False
 
-async def _process_single_file(
-    input_json_path: str,
-    *,
-    output_dir: str,
-    timeout: int,
-    max_retries: int,
-    concurrency: int,
-) -> Dict[str, Optional[str]]:
-    """
-    Run the file-level graph for one JSON input.
-    Side effects (file_graph 책임):
-      - 결과 JSON: {output_dir}/{parent_folder}/{filename}
-      - 에러 JSONL: {output_dir}/error.jsonl 에 append
-
-    Returns:
-        {
-          "ok": bool,
-          "output_path": str | None,
-          "error_log": str
-        }
-    """
-    parent_folder = os.path.basename(os.path.dirname(input_json_path)) or "unknown"
-    filename = os.path.basename(input_json_path)
-
-    file_graph = build_file_graph(
-        API_TIMEOUT_SEC=timeout,
-        MAX_RETRIES=max_retries,
-        CONCURRENCY_LINES=concurrency,
-    )
+# 결과 저장 방식: "json" = 파일별 JSON (임시 파일 → rename 으로 원자적 기록)
+#               "jsonl" = 배치 전체 결과를 append-only JSONL 하나에 (OUTPUT_FSYNC_INTERVAL_SEC마다 fsync)
+# 기록은 별도 writer thread에서 수행. "jsonl"이면 SKIP_UNCHANGED는 적용되지 않음
+OUTPUT_MODE = "json"
+OUTPUT_JSONL_PATH: Optional[str] = None   # None이면 OUTPUT_DIR/results-<시각>.jsonl
+OUTPUT_JSONL_COMPRESS = False             # True면 .jsonl.gz
+OUTPUT_FSYNC_INTERVAL_SEC = 5.0
 
-    state = {
-        "input_path": input_json_path,
-        "parent_folder": parent_folder,
-        "filename": filename,
-        "output_dir": output_dir,
-        "API_TIMEOUT_SEC": timeout,
-        "MAX_RETRIES": max_retries,
-        "CONCURRENCY_LINES": concurrency,
-    }
+# GPT 응답 디스크 캐시 (동일 프롬프트 재실행 시 API 호출 생략). 기본 꺼짐 — 켜면 JSON으로 parse되는 응답만 저장되고
+# key에 프롬프트 빌더 버전 + 가이드라인 내용 hash가 들어가므로 가이드라인을 고치면 이전 응답은 쓰이지 않음
+USE_GPT_CACHE = False
+GPT_CACHE_PATH = os.path.join(OUTPUT_DIR, ".gpt_cache.sqlite3")
 
-    # 실행 (체크포인트 비활성화)
-    await file_graph.ainvoke(state, config={"execution": {"checkpoint": False}})
+# stage별 GPT 호출 지표 (Prometheus textfile + JSON). METRICS_DUMP_INTERVAL_SEC마다 + 배치 종료 시 갱신
+METRICS_PROM_PATH = os.path.join(OUTPUT_DIR, "metrics.prom")
+METRICS_JSON_PATH = os.path.join(OUTPUT_DIR, "metrics.json")
+METRICS_DUMP_INTERVAL_SEC = 10.0  # 배치 중 지표 파일 갱신 주기 (단일 task가 기록)
 
-    # 산출물 경로 구성
-    output_path = os.path.join(output_dir, parent_folder, filename)
-    error_log = os.path.join(output_dir, "error.jsonl")
-    ok = os.path.isfile(output_path)
+# 중단 후 재시작: 완료된 라인/노드 결과를 로컬 SQLite에 저장해 남은 작업만 재개 (None이면 비활성화)
+CHECKPOINT_PATH: Optional[str] = None  # 예: os.path.join(OUTPUT_DIR, ".checkpoints.sqlite3")
+# 결과 JSON의 input_sha256이 입력 파일과 같으면 파일 자체를 건너뜀
+# 주의: 입력 바이트만 비교하므로 가이드라인/프롬프트를 고친 뒤에는 끄거나 STAGE_STORE_PATH 사용
+SKIP_UNCHANGED = False
+# stage별 결과 + 입력 fingerprint(프롬프트 빌더 소스/가이드라인/모델/이전 stage 출력) 저장 (None이면 비활성화)
+# 가이드라인이나 프롬프트를 고친 뒤 재실행하면 fingerprint가 바뀐 stage/라인만 다시 호출. 설정 시 SKIP_UNCHANGED는 무시됨
+STAGE_STORE_PATH: Optional[str] = None  # 예: os.path.join(OUTPUT_DIR, ".stage_store.sqlite3")
 
-    return {"ok": ok, "output_path": output_path if ok else None, "error_log": error_log}
+# ================== Utils ==================
+def _natural_sort_key(path: str) -> int:
+    """파일명 내 첫 숫자를 기준으로 정렬, 숫자가 없으면 매우 큰 값으로 뒤로."""
+    base = os.path.basename(path)
+    m = re.search(r"/d+", base)
+    return int(m.group()) if m else 10**12
 
 
-async def _run_batch() -> None:
+def _collect_input_files() -> List[Tuple[str, str]]:
+    """TARGET_SUBFOLDERS 전체에서 (subfolder, json/jsonl path) 목록 수집."""
+    jobs: List[Tuple[str, str]] = []
     for sub in TARGET_SUBFOLDERS:
         folder = os.path.join(INPUT_DIR, sub)
         if not os.path.isdir(folder):
             print(f"⚠️  Skipped (not found): {folder}")
             continue
 
-        json_files = sorted(glob(os.path.join(folder, "*.json")), key=_natural_sort_key)
+        json_files = sorted(
+            (fp for pattern in ("*.json", "*.jsonl", "*.ndjson") for fp in glob(os.path.join(folder, pattern))),
+            key=_natural_sort_key,
+        )
         if MAX_FILES_PER_FOLDER is not None:
             json_files = json_files[:MAX_FILES_PER_FOLDER]
+        jobs.extend((sub, fp) for fp in json_files)
+    return jobs
+
+
+async def _dump_metrics() -> None:
+    """지표 텍스트는 event loop에서 만들고 (collector는 loop thread에서만 갱신됨) 파일 쓰기만 thread로."""
+    metrics = batch_metrics()
+    prom = metrics.to_prometheus() + pools_to_prometheus() + stages_to_prometheus()
+    js = metrics.to_json()
+
+    def _write() -> None:
+        write_text_atomic(METRICS_PROM_PATH, prom)
+        write_text_atomic(METRICS_JSON_PATH, js)
 
-        for fp in json_files:
-            result = await _process_single_file(
-                fp,
-                output_dir=OUTPUT_DIR,
-                timeout=API_TIMEOUT_SEC,
-                max_retries=MAX_RETRIES,
-                concurrency=CONCURRENCY_LINES,
-            )
-            
-            if result["ok"]:
-                print(f"✅ Processed: {sub}/{os.path.basename(fp)}")
+    await asyncio.to_thread(_write)
+
+
+async def _dump_metrics_safely() -> None:
+    # 지표 파일 기록 실패가 배치를 중단시키지 않도록
+    try:
+        await _dump_metrics()
+    except Exception as e:
+        print(f"⚠️  Metrics dump failed: {type(e).__name__}: {e}")
+
+
+async def _metrics_dumper(interval_sec: float = METRICS_DUMP_INTERVAL_SEC) -> None:
+    """배치 동안 지표 파일을 주기적으로 갱신하는 단일 task (파일 worker는 직접 기록하지 않음)."""
+    while True:
+        await asyncio.sleep(interval_sec)
+        await _dump_metrics_safely()
+
+
+def _report(progress: str, label: str, result: dict, elapsed: float) -> None:
+    if result.get("skipped"):
+        print(f"⏭️  {progress} Unchanged (skipped): {label}")
+    elif result["ok"]:
+        stats = result.get("stats", {})
+        print(
+            f"✅ {progress} Processed: {label} ({elapsed:.1f}s, "
+            f"category calls avoided={stats.get('category_calls_avoided', 0)}, llm={stats.get('category_calls_llm', 0)}, "
+            f"batched={stats.get('category_batch_calls', 0)}, "
+            f"format batches={stats.get('format_batch_calls', 0)}, fallbacks={stats.get('format_batch_fallbacks', 0)})"
+        )
+    else:
+        if result.get("error"):
+            print(f"💥 {result['error']}")
+        print(f"❌ {progress} Failed (no output): {label}  → see {result['error_log']}")
+
+
+async def _run_stream(session: PipelineSession, sub: str, fp: str) -> None:
+    """JSONL/NDJSON 입력: 레코드를 JSONL_RECORDS_IN_FLIGHT개씩 흘려보내며 끝나는 대로 출력."""
+    started = time.perf_counter()
+    n = 0
+    async for result in session.run_jsonl(
+        fp, max_in_flight=JSONL_RECORDS_IN_FLIGHT, id_field=JSONL_ID_FIELD, dedupe_window=JSONL_DEDUPE_WINDOW,
+    ):
+        n += 1
+        _report(f"[record {n}]", f"{sub}/{os.path.basename(fp)}#{result['record_id']}", result,
+                time.perf_counter() - started)
+
+
+async def _run_batch(concurrency_files: int = CONCURRENCY_FILES) -> None:
+    """
+    Process every input file through a bounded file-level worker pool.
+    - 최대 `concurrency_files`개 파일을 동시에 처리 (폴더 수와 무관)
+    - API 요청 동시성은 gpt_client 전역 상한(MAX_INFLIGHT_REQUESTS)이 별도로 제한
+    - 파일 하나가 끝날 때마다 즉시 결과 출력
+    """
+    jobs = _collect_input_files()
+    total = len(jobs)
+    if not total:
+        return
+
+    # 그래프 컴파일/클라이언트/가이드라인 저장소는 배치 전체에서 1회만 생성
+    session = PipelineSession(
+        output_dir=OUTPUT_DIR,
+        timeout=API_TIMEOUT_SEC,
+        max_retries=MAX_RETRIES,
+        concurrency=CONCURRENCY_LINES,
+        use_rule_category=USE_RULE_CATEGORY,
+        category_batch=CATEGORY_BATCH,
+        category_batch_token_budget=CATEGORY_BATCH_TOKEN_BUDGET,
+        format_batch=FORMAT_BATCH,
+        format_batch_token_budget=FORMAT_BATCH_TOKEN_BUDGET,
+        combined_format_check=COMBINED_FORMAT_CHECK,
+        speculative_doc_checks=SPECULATIVE_DOC_CHECKS,
+        doc_check_chunk_lines=DOC_CHECK_CHUNK_LINES,
+        doc_check_chunk_overlap=DOC_CHECK_CHUNK_OVERLAP,
+        checkpoint_path=CHECKPOINT_PATH,
+        skip_unchanged=SKIP_UNCHANGED,
+        stream_doc_checks=STREAM_DOC_CHECKS,
+        stage_store_path=STAGE_STORE_PATH,
+        output_mode=OUTPUT_MODE,
+        output_jsonl_path=OUTPUT_JSONL_PATH,
+        output_compress=OUTPUT_JSONL_COMPRESS,
+        output_fsync_interval_sec=OUTPUT_FSYNC_INTERVAL_SEC,
+        line_window=LINE_WINDOW,
+        pipelined=PIPELINED_STAGES,
+        stage_workers=STAGE_WORKERS,
+    )
+
+    queue: asyncio.Queue = asyncio.Queue()
+    for job in jobs:
+        queue.put_nowait(job)
+    done = 0
+
+    async def _worker() -> None:
+        nonlocal done
+        while True:
+            try:
+                sub, fp = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            started = time.perf_counter()
+            if is_record_stream(fp):
+                await _run_stream(session, sub, fp)
+                done += 1
+                print(f"📦 [{done}/{total}] Stream finished: {sub}/{os.path.basename(fp)} ({time.perf_counter() - started:.1f}s)")
             else:
-                print(f"❌ Failed (no output): {sub}/{os.path.basename(fp)}  → see {result['error_log']}")
+                try:
+                    result = await session.run(fp)
+                except Exception as e:
+                    result = {"ok": False, "output_path": None, "error_log": os.path.join(OUTPUT_DIR, "error.jsonl")}
+                    print(f"💥 {type(e).__name__}: {e}")
+                done += 1
+                _report(f"[{done}/{total}]", f"{sub}/{os.path.basename(fp)}", result, time.perf_counter() - started)
+
+    n_workers = max(1, min(concurrency_files, total))
+    dumper = asyncio.create_task(_metrics_dumper())
+    try:
+        await asyncio.gather(*(_worker() for _ in range(n_workers)))
+    finally:
+        dumper.cancel()
+        await asyncio.gather(dumper, return_exceptions=True)
+        # stage worker 종료 + writer thread에 남은 결과 기록 + fsync
+        await session.aclose()
+    for stage, s in session.pipeline_stats().items():
+        print(
+            f"🏭 {stage}: workers={s['workers']}, files={s['processed']} (failed {s['failed']}), "
+            f"utilisation={s['utilization']:.0%}, queue max={s['max_queued']} mean={s['mean_queued']}, "
+            f"wait={s['mean_wait_sec']}s"
+        )
+    if OUTPUT_MODE == "jsonl":
+        sink = session.sink.stats()
+        print(f"🧾 Results appended: {sink['records']} → {sink['path']}")
 
 
 async def main() -> None:
-    await _run_batch()
+    configure_cache(path=GPT_CACHE_PATH, enabled=USE_GPT_CACHE)
+    set_async_limits(timeout_sec=API_TIMEOUT_SEC, max_retries=MAX_RETRIES, concurrency=MAX_INFLIGHT_REQUESTS)
+    for model, limits in MODEL_POOLS.items():
+        configure_model_pool(model, **limits)
+    configure_hedging(("gpt-4o",), enabled=HEDGE_GPT4O, delay_sec=HEDGE_DELAY_SEC, max_ratio=HEDGE_MAX_RATIO)
+    configure_single_flight(SINGLE_FLIGHT)
+    # 가이드라인 전체를 시작 시 1회 로드 (이후 mtime 변경 시에만 다시 읽음)
+    guides = guideline_registry().stats()
+    print(f"📚 Guidelines loaded: {guides['guidelines']} files / {guides['locales']} locales")
+    await _run_batch(PIPELINE_FILES_IN_FLIGHT if PIPELINED_STAGES else CONCURRENCY_FILES)
+    if SPECULATIVE_DOC_CHECKS:
+        spec = speculation_stats()
+        print(f"🔮 Speculative addition_check: launched={spec['launched']}, used={spec['used']}, wasted={spec['wasted']}")
+    if USE_GPT_CACHE:
+        evict_now()
+        print(f"🗄️  GPT cache: {cache_stats()}")
+    await _dump_metrics_safely()
+    gpt = batch_metrics().totals()
+    print(
+        f"📊 GPT calls={gpt['calls']}, errors={gpt['errors']}, retries={gpt['retries']}, timeouts={gpt['timeouts']}, "
+        f"tokens={gpt['prompt_tokens']}+{gpt['completion_tokens']}  → {METRICS_PROM_PATH}"
+    )
+    if STREAM_DOC_CHECKS:
+        streams = stream_stats()
+        print(f"🌊 Streamed doc checks: {streams['streams']}, stopped early on a negative verdict: {streams['early_stops']}")
+    if SINGLE_FLIGHT:
+        sf = single_flight_stats()
+        print(f"🔗 Coalesced identical in-flight requests: {sf['coalesced']} (requests sent: {sf['leaders']})")
+    if STAGE_STORE_PATH:
+        for stage, c in stage_store_stats().items():
+            print(f"♻️  {stage}: reused={c['reused']}, recomputed={c['recomputed']}")
+    if HEDGE_GPT4O:
+        hedge = hedge_stats()
+        print(f"🪞 Hedged gpt-4o requests: launched={hedge['launched']}/{hedge['requests']}, won={hedge['won']}")
+    for model, snap in pool_snapshot().items():
+        print(f"🚦 {model}: limit={snap['limit']}/{snap['max']}, throttles={snap['throttles']}, budget wait={snap['budget_wait_sec']}s")
+    # 백그라운드 writer에 남은 error.jsonl 레코드 기록
+    flush_error_log()
 
 
 if __name__ == "__main__":
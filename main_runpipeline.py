@@ -1,44 +1,48 @@
 # main.py — single-file entrypoint with return contract and docstrings
 import os
 import asyncio
-from graph.file_graph import build_file_graph
+from collections import OrderedDict
+from typing import Tuple
+from graph.session import PipelineSession
+from utils.error_log import flush_error_log
 
 OUTPUT_DIR = "/mnt/c/Users/Flitto/Documents/NAC/LLM검수/LCT_check_phase1/data/output"
 os.makedirs(OUTPUT_DIR, exist_ok=True)
 
-async def _process_single_file(
-    input_json_path: str,
-    output_dir: str,
-    *,
-    timeout: int,
-    max_retries: int,
-    concurrency: int,
-) -> None:
+# 설정 조합별 session 캐시 (가장 오래 안 쓴 것부터 정리)
+MAX_CACHED_SESSIONS = 8
+_SESSIONS: "OrderedDict[Tuple[str, int, int, int, bool], PipelineSession]" = OrderedDict()
+
+def _get_session(output_dir: str, *, timeout: int, max_retries: int, concurrency: int, pipelined: bool) -> PipelineSession:
     """
-    Internal coroutine that runs the file-level graph for one JSON input.
-    Side effects:
-      - Writes result JSON under {output_dir}/{parent_folder}/{filename}
-      - Appends error records (JSONL) to {output_dir}/error.jsonl
+    Reuse one compiled PipelineSession per (output_dir, timeout, max_retries, concurrency, pipelined),
+    so repeated run_pipeline() calls do not recompile the graphs.
     """
-    parent_folder = os.path.basename(os.path.dirname(input_json_path)) or "unknown"
-    filename = os.path.basename(input_json_path)
+    key = (output_dir, timeout, max_retries, concurrency, pipelined)
+    session = _SESSIONS.get(key)
+    if session is None:
+        session = PipelineSession(
+            output_dir=output_dir,
+            timeout=timeout,
+            max_retries=max_retries,
+            concurrency=concurrency,
+            pipelined=pipelined,
+        )
+        _SESSIONS[key] = session
+    _SESSIONS.move_to_end(key)
+    return session
 
-    file_graph = build_file_graph(
-        API_TIMEOUT_SEC=timeout,
-        MAX_RETRIES=max_retries,
-        CONCURRENCY_LINES=concurrency,
-    )
 
-    state = {
-        "input_path": input_json_path,
-        "parent_folder": parent_folder,
-        "filename": filename,
-        "output_dir": output_dir,
-        "API_TIMEOUT_SEC": timeout,
-        "MAX_RETRIES": max_retries,
-        "CONCURRENCY_LINES": concurrency,
-    }
-    await file_graph.ainvoke(state, config={"execution": {"checkpoint": False}})
+async def _run_once(session: PipelineSession, input_json_path: str) -> dict:
+    try:
+        return await session.run(input_json_path)
+    finally:
+        # 이 event loop가 끝나기 전에 stage worker 종료 (다음 호출의 loop에서 다시 시작)
+        if session.pipeline is not None:
+            await session.pipeline.aclose()
+        while len(_SESSIONS) > MAX_CACHED_SESSIONS:
+            _, evicted = _SESSIONS.popitem(last=False)
+            await evicted.aclose()
 
 
 def run_pipeline(
@@ -48,6 +52,7 @@ def run_pipeline(
     timeout: int = 3600,
     max_retries: int = 10,
     concurrency: int = 1,
+    pipelined: bool = False,
 ) -> dict:
     """
     Run the LCT check pipeline for exactly one input JSON.
@@ -58,6 +63,7 @@ def run_pipeline(
         timeout (int): GPT API timeout seconds.
         max_retries (int): Retry attempts for GPT calls.
         concurrency (int): Line-level concurrency.
+        pipelined (bool): Run the file-graph stages on per-stage queues (graph.stage_pipeline).
 
     Returns:
         dict: {
@@ -74,20 +80,9 @@ def run_pipeline(
         }
 
     os.makedirs(output_dir, exist_ok=True)
-    asyncio.run(
-        _process_single_file(
-            input_json_path,
-            output_dir,
-            timeout=timeout,
-            max_retries=max_retries,
-            concurrency=concurrency,
-        )
-    )
-
-    parent_folder = os.path.basename(os.path.dirname(input_json_path)) or "unknown"
-    filename = os.path.basename(input_json_path)
-    output_path = os.path.join(output_dir, parent_folder, filename)
-    error_log = os.path.join(output_dir, "error.jsonl")
-
-    ok = os.path.isfile(output_path)
-    return {"ok": ok, "output_path": output_path if ok else None, "error_log": error_log}
+    session = _get_session(output_dir, timeout=timeout, max_retries=max_retries, concurrency=concurrency,
+                           pipelined=pipelined)
+    result = asyncio.run(_run_once(session, input_json_path))
+    # error.jsonl은 백그라운드에서 기록되므로 반환 전에 flush
+    flush_error_log()
+    return result
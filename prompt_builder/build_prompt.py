@@ -1,5 +1,8 @@
 import json
 
+# Bump whenever any prompt text below changes (part of the GPT response cache key).
+PROMPT_BUILDER_VERSION = "2025-10-27.1"
+
 def _base_user_block(source: str, translated: str) -> str:
     return (
         f"Source:\n{source.strip()}\n"
@@ -155,6 +158,31 @@ def build_category_prompt(sentence: str):
         "role": "user",
         "content": f"Translated sentence: {sentence}\n\nWhich categories apply?"
     }
+    return system_msg, user_msg
+
+def build_category_batch_prompt(sentences):
+    """
+    sentences: list of (id, translated sentence). One request classifies all of them.
+    """
+    system_msg = {
+        "role": "system",
+        "content": (
+            "You are a localization quality checker AI.\n"
+            "Your task is to identify which formatting categories are present in each given translated sentence.\n"
+            "The only valid categories are: currency, date, time.\n"
+            "Only return a category if a clear formatting pattern appears in that sentence.\n"
+            "Do NOT infer based on meaning or context. Judge every sentence independently.\n"
+            "If no formatting is detected for a sentence, its value is an empty list [].\n"
+            "Return strictly a JSON object mapping every sentence id (as a string) to a JSON list of categories.\n"
+            "Example: {\"0\": [\"currency\"], \"3\": [\"time\", \"date\"], \"7\": []}\n"
+            "- Include every id exactly once. No code fences, no prose, no extra keys."
+        )
+    }
+    payload = [{"id": str(i), "sentence": sent} for i, sent in sentences]
+    user_msg = {
+        "role": "user",
+        "content": f"Translated sentences:\n{json.dumps(payload, ensure_ascii=False)}\n\nWhich categories apply to each id?"
+    }
     return system_msg, user_msg
 
             # "- Preserve ALL escape characters (e.g., \\n, \", \\\\) exactly.\n"
@@ -256,3 +284,129 @@ def build_check_prompt(sentence: str, guideline: str, source_text: str):
     return system_msg, user_msg
 
 
+
+
+
+def build_check_batch_prompt(guideline: str, items):
+    """
+    items: list of (id, source sentence, translated sentence) that share one (locale, category) guideline.
+    The guideline is sent once; every item gets its own revised/spans result.
+    """
+    system_msg = {
+        "role": "system",
+        "content": (
+            "[GUIDELINE]\n"
+            f"{guideline}\n"
+            "[INSTRUCTIONS]\n"
+            "You are a localization format validator AI.\n"
+            "\n"
+            "Task:\n"
+            "- You receive several independent items, each with an id, a source sentence and a translated sentence.\n"
+            "- For EACH item, check if the translated sentence follows the locale-specific guideline.\n"
+            "- Revise ONLY the parts of the translation that violate the guideline.\n"
+            "- If no violation, return the translation unchanged.\n"
+            "\n"
+            "Formatting rules:\n"
+            "- Focus purely on locale formatting (currency, date, time).\n"
+            "- Revised sentence must be identical to the original except for corrected formatting.\n"
+            "- Do not modify any character outside the minimal required span.\n"
+            "- Do NOT remove or insert \", \', \\n, or brackets unless explicitly part of the violation span.\n"
+            "- Escape every ASCII double quote (\") inside string values as \\\".\n"
+            "\n"
+            "[Span Consistency & Minimal Edit]\n"
+            "- If there is no violation, 'revised' must be exactly identical to the original translation, "
+            "and all span arrays must be empty ([]).\n"
+            "- If there is a violation:\n"
+            "  1) Each element in 'trans_spans' corresponds exactly to a replaced segment in the original translation.\n"
+            "  2) Each element in 'revised_spans' corresponds to the corrected segment.\n"
+            "  3) 'revised' MUST equal the original translation after replacing every 'trans_spans[i]' "
+            "with its corresponding 'revised_spans[i]' — no other characters may be changed.\n"
+            "  4) If this consistency rule would not hold, reconstruct your answer so that it does.\n"
+            "\n"
+            "Return strictly one JSON object mapping every item id (as a string) to its result:\n"
+            "{\n"
+            "  \"<id>\": {\n"
+            "    \"revised\": \"<final revised translation>\",\n"
+            "    \"source_spans\": [\"<exact spans from source>\" ...],\n"
+            "    \"trans_spans\": [\"<exact spans from original translation>\" ...],\n"
+            "    \"revised_spans\": [\"<exact spans from revised translation>\" ...]\n"
+            "  }\n"
+            "}\n"
+            "- Include every id exactly once. No code fences, no prose, no extra keys.\n"
+        )
+    }
+
+    payload = [{"id": str(i), "source": src, "translation": trn} for i, src, trn in items]
+    user_msg = {
+        "role": "user",
+        "content": f"Items:\n{json.dumps(payload, ensure_ascii=False)}\n"
+    }
+
+    return system_msg, user_msg
+
+
+def build_multi_check_prompt(sentence: str, guidelines: dict, source_text: str):
+    """
+    guidelines: {category: guideline text}. All applicable guidelines for one line are checked in a single call,
+    returning one merged revised sentence plus per-category span arrays (spans_by_category shape).
+    """
+    src_literal = json.dumps(source_text, ensure_ascii=False)
+    trans_literal = json.dumps(sentence, ensure_ascii=False)
+    guideline_blocks = "".join(
+        f"[GUIDELINE: {cat}]\n{text}\n" for cat, text in guidelines.items()
+    )
+    cats = ", ".join(f"\"{cat}\"" for cat in guidelines)
+
+    system_msg = {
+        "role": "system",
+        "content": (
+            f"{guideline_blocks}"
+            "[INSTRUCTIONS]\n"
+            "You are a localization format validator AI.\n"
+            "\n"
+            "Task:\n"
+            "- Check if the translated sentence follows EVERY locale-specific guideline above.\n"
+            "- Revise ONLY the parts of the translation that violate a guideline; apply all corrections into one revised sentence.\n"
+            "- If no violation, return the translation unchanged.\n"
+            "\n"
+            "Formatting rules:\n"
+            "- Focus purely on locale formatting (currency, date, time).\n"
+            "- Revised sentence must be identical to the original except for corrected formatting.\n"
+            "- Do not modify any character outside the minimal required span.\n"
+            "- Do NOT remove or insert \", \', \\n, or brackets unless explicitly part of the violation span.\n"
+            "- Escape every ASCII double quote (\") inside string values as \\\".\n"
+            "\n"
+            "[Span Consistency & Minimal Edit]\n"
+            "- Attribute every corrected segment to exactly one category (the guideline it violates).\n"
+            "- For a category without violation, all of its span arrays must be empty ([]).\n"
+            "- For a category with violation:\n"
+            "  1) Each element in 'trans_spans' corresponds exactly to a replaced segment in the original translation.\n"
+            "  2) Each element in 'revised_spans' corresponds to the corrected segment.\n"
+            "- 'revised' MUST equal the original translation after replacing every 'trans_spans[i]' of every category "
+            "with its corresponding 'revised_spans[i]' — no other characters may be changed.\n"
+            "- If this consistency rule would not hold, reconstruct your answer so that it does.\n"
+            "\n"
+            "Return strictly in this format:\n"
+            "{\n"
+            "  \"revised\": \"<final revised translation>\",\n"
+            "  \"spans_by_category\": {\n"
+            "    \"<category>\": {\n"
+            "      \"source_spans\": [\"<exact spans from source>\" ...],\n"
+            "      \"trans_spans\": [\"<exact spans from original translation>\" ...],\n"
+            "      \"revised_spans\": [\"<exact spans from revised translation>\" ...]\n"
+            "    }\n"
+            "  }\n"
+            "}\n"
+            f"- spans_by_category must contain exactly these keys: {cats}.\n"
+        )
+    }
+
+    user_msg = {
+        "role": "user",
+        "content": (
+            f"Source sentence:\n{src_literal.strip()}\n"
+            f"Translated sentence:\n{trans_literal.strip()}\n"
+        )
+    }
+
+    return system_msg, user_msg
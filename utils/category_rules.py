@@ -0,0 +1,203 @@
+# utils/category_rules.py — local rule-based category pre-classifier (currency / date / time)
+from __future__ import annotations
+import re
+from typing import Callable, Dict, List, Optional, Tuple
+
+from utils.guideline_registry import parse_listed
+
+CATEGORIES = ("currency", "date", "time")
+
+# guideline(currency.txt)에서 못 읽었을 때 쓰는 기본값
+_DEFAULT_SYMBOLS = [
+    "NT$", "$", "¢", "€", "¥", "£", "₩", "₹", "₽", "₺", "฿", "₱", "₡", "₨", "₦", "₫",
+    "₭", "₲", "₵", "₿", "¤", "ƒ", "₮", "₪", "₴", "﷼", "₸", "₾",
+]
+_DEFAULT_CODES = [
+    "USD", "EUR", "KRW", "JPY", "CNY", "GBP", "INR", "RUB", "TRY", "TL", "AUD", "CAD", "CHF",
+    "MXN", "BRL", "PLN", "SEK", "NOK", "DKK", "CZK", "HUF", "ILS", "SAR", "AED", "SGD", "HKD",
+    "TWD", "THB", "MYR", "IDR", "PHP", "VND", "ZAR", "UAH", "NZD",
+]
+
+# 영어는 대문자 시작만 (may/march 같은 일반 단어 오검출 방지)
+_MONTHS_EN = [
+    "January", "February", "March", "April", "May", "June", "July", "August", "September",
+    "October", "November", "December", "Jan", "Feb", "Mar", "Apr", "Jun", "Jul", "Aug",
+    "Sep", "Sept", "Oct", "Nov", "Dec",
+]
+_MONTHS_LOCAL = {
+    "fr": ["janvier", "février", "mars", "avril", "mai", "juin", "juillet", "août",
+           "septembre", "octobre", "novembre", "décembre", "janv", "févr", "avr", "juil",
+           "sept", "oct", "nov", "déc"],
+    "uk": ["січня", "лютого", "березня", "квітня", "травня", "червня", "липня", "серпня",
+           "вересня", "жовтня", "листопада", "грудня", "січень", "лютий", "березень",
+           "квітень", "травень", "червень", "липень", "серпень", "вересень", "жовтень",
+           "листопад", "грудень"],
+    "ar": ["يناير", "فبراير", "مارس", "أبريل", "إبريل", "مايو", "يونيو", "يوليو", "أغسطس",
+           "سبتمبر", "أكتوبر", "نوفمبر", "ديسمبر"],
+}
+
+# 숫자 주변에 있으면 LLM 판단이 필요한 단어들 (통화명/시간 단위/요일 등)
+_HINTS_EN = [
+    "hour", "hours", "hr", "hrs", "minute", "minutes", "min", "mins", "o'clock", "noon",
+    "midnight", "am", "pm", "a.m", "p.m", "h", "dollar", "dollars", "euro", "euros", "cent",
+    "cents", "pound", "pounds", "yen", "won", "rupee", "rupees", "dirham", "dirhams", "riyal",
+    "riyals", "baht", "hryvnia", "hryvnias", "yuan", "franc", "francs", "monday", "tuesday",
+    "wednesday", "thursday", "friday", "saturday", "sunday", "mon", "tue", "wed", "thu",
+    "fri", "sat", "sun",
+]
+_HINTS_LOCAL = {
+    "fr": ["heure", "heures", "minute", "minutes", "euro", "euros", "dollar", "dollars",
+           "centime", "centimes", "midi", "minuit", "lundi", "mardi", "mercredi", "jeudi",
+           "vendredi", "samedi", "dimanche"],
+    "uk": ["год", "годин", "година", "хв", "хвилин", "грн", "гривень", "гривні", "гривня",
+           "долар", "доларів", "євро", "рік", "року", "р", "понеділок", "вівторок", "середа",
+           "четвер", "пʼятниця", "п'ятниця", "субота", "неділя"],
+    "ar": ["ساعة", "ساعات", "دقيقة", "دقائق", "درهم", "دراهم", "دولار", "ريال", "يورو",
+           "جنيه", "صباحًا", "صباحا", "مساءً", "مساء", "ص", "م"],
+}
+# 숫자 뒤에 붙으면 통화명 표기(Currency Name Format)로 확정
+_CURRENCY_NAMES = {
+    "en": ["dollars", "dollar", "euros", "euro", "won", "yen"],
+    "fr": ["euros", "euro", "dollars", "dollar"],
+    "uk": ["грн", "гривень", "гривні", "гривня", "доларів", "долари", "долар", "євро"],
+    "ar": ["درهم", "دراهم", "دولار", "ريال", "يورو"],
+    "ko": ["원", "달러", "유로", "엔", "위안", "파운드"],
+}
+# 한국어는 띄어쓰기 없이 붙으므로 경계 없이 매칭
+_HINTS_KO = ["원", "달러", "유로", "엔", "위안", "파운드", "년", "월", "일", "시", "분", "오전", "오후", "요일"]
+
+_NUM = r"\d+(?:[.,\u00a0\u202f]\d+|\s\d{3}(?!\d))*"
+_WINDOW = 12
+
+
+def _alt(words: List[str]) -> str:
+    return "|".join(re.escape(w) for w in sorted(set(words), key=len, reverse=True))
+
+
+class _LocaleRules:
+    """Compiled patterns for one target locale."""
+
+    def __init__(self, locale: str, symbols: List[str], codes: List[str]):
+        lang = (locale or "").split("_")[0].lower()
+        self.symbols = symbols
+        self.codes = codes
+        sym = _alt(symbols)
+        code = _alt(codes)
+        months = _alt(_MONTHS_EN)
+        local_months = _MONTHS_LOCAL.get(lang, [])
+
+        currency = [
+            rf"(?:{sym})\s?{_NUM}",
+            rf"{_NUM}\s?(?:{sym})",
+            rf"(?<![A-Za-z])(?:{code})\s?{_NUM}",
+            rf"{_NUM}\s?(?:{code})(?![A-Za-z])",
+        ]
+        names = _CURRENCY_NAMES.get(lang, []) + _CURRENCY_NAMES["en"]
+        if lang == "ko":
+            currency.append(rf"{_NUM}\s?(?:{_alt(names)})")
+        else:
+            currency.append(rf"{_NUM}\s?(?:{_alt(names)})(?!\w)")
+        time = [
+            r"(?:(?:오전|오후|[AaPp][Mm])\s?)?(?<!\d)(?:[01]?\d|2[0-3]):[0-5]\d(?::[0-5]\d)?(?:\s?(?:[AaPp]\.?[Mm]\.?))?(?!\d)",
+            r"(?<!\d)(?:1[0-2]|0?[1-9])\s?(?:[AaPp]\.[Mm]\.|[AaPp][Mm])(?![A-Za-z])",
+        ]
+        date = [
+            r"(?<!\d)\d{4}[-./](?:0?[1-9]|1[0-2])[-./](?:0?[1-9]|[12]\d|3[01])(?!\d)",
+            r"(?<!\d)(?:0?[1-9]|[12]\d|3[01])[-./](?:0?[1-9]|[12]\d|3[01])[-./](?:\d{4}|\d{2})(?!\d)",
+            rf"(?<![A-Za-z])(?:{months})\.?\s+\d{{1,2}}(?:st|nd|rd|th)?(?:,?\s*\d{{4}})?(?!\d)",
+            rf"(?<!\d)\d{{1,2}}(?:st|nd|rd|th)?\s+(?:of\s+)?(?:{months})(?![A-Za-z])\.?(?:,?\s*\d{{4}})?(?!\d)",
+        ]
+        if local_months:
+            lm = _alt(local_months)
+            date.append(rf"(?<!\d)\d{{1,2}}(?:er)?\s+(?:{lm})(?!\w)\.?(?:\s+\d{{4}})?(?:\s?(?:р\.|року))?")
+            date.append(rf"(?<!\w)(?:{lm})\s+\d{{4}}(?!\d)")
+        if lang == "fr":
+            time.append(r"(?<!\d)(?:[01]?\d|2[0-3])\s?h\s?[0-5]\d(?!\d)")
+        if lang == "ko":
+            date.append(r"\d{4}\s?년(?:\s?\d{1,2}\s?월)?(?:\s?\d{1,2}\s?일)?")
+            date.append(r"(?<!\d)\d{1,2}\s?월\s?\d{1,2}\s?일")
+            time.append(r"(?:오전|오후)\s?\d{1,2}\s?시(?!간)(?:\s?\d{1,2}\s?분)?")
+
+        self.patterns: List[Tuple[str, re.Pattern]] = (
+            [("currency", re.compile(p)) for p in currency]
+            + [("date", re.compile(p)) for p in date]
+            + [("time", re.compile(p)) for p in time]
+        )
+
+        hint_words = _HINTS_EN + _HINTS_LOCAL.get(lang, [])
+        hint_parts = [rf"(?<!\w){_alt(hint_words)}(?!\w)"]
+        if lang == "ko":
+            hint_parts.append(_alt(_HINTS_KO))
+        self.hint_re = re.compile("|".join(hint_parts), re.IGNORECASE)
+
+        # 확정 패턴에 덮이지 않고 남은 신호 → 애매(LLM으로)
+        residual = [
+            rf"(?:{sym})",
+            rf"(?<![A-Za-z])(?:{code})(?![A-Za-z])",
+            rf"(?<![A-Za-z])(?:{months})(?![A-Za-z])",
+            r"\d\s?[:/\-]\s?\d",
+        ]
+        if local_months:
+            residual.append(rf"(?<!\w)(?:{_alt(local_months)})(?!\w)")
+        self.residual_re = re.compile("|".join(residual))
+        self.num_re = re.compile(_NUM)
+
+    def classify(self, line: str) -> Optional[List[str]]:
+        found = set()
+        chars = list(line)
+        for cat, pat in self.patterns:
+            for m in pat.finditer(line):
+                found.add(cat)
+                for k in range(m.start(), m.end()):
+                    chars[k] = " "
+        rest = "".join(chars)
+
+        if self.residual_re.search(rest):
+            return None
+        for m in self.num_re.finditer(rest):
+            window = rest[max(0, m.start() - _WINDOW): m.end() + _WINDOW]
+            if self.hint_re.search(window):
+                return None
+        return [c for c in CATEGORIES if c in found]
+
+
+class CategoryRuleClassifier:
+    """
+    Per-locale compiled pattern classifier in front of the category LLM call.
+    classify(line, locale) returns:
+      - list of categories (possibly []) when the line is confidently decidable locally
+      - None when the line is ambiguous and must go to the LLM
+    Currency symbols/codes come from docs/<locale>/currency.txt: read from the registry's
+    pre-extracted sets when get_guideline is a GuidelineRegistry (rules rebuilt when it reloads),
+    otherwise parsed from the guideline text.
+    """
+
+    def __init__(self, get_guideline: Optional[Callable[[str, str], str]] = None):
+        self.get_guideline = get_guideline
+        self._rules: Dict[str, Tuple[int, _LocaleRules]] = {}
+
+    def _currency_lists(self, locale: str) -> Tuple[List[str], List[str]]:
+        registry = self.get_guideline
+        if hasattr(registry, "currency_symbols"):
+            return list(registry.currency_symbols(locale)), list(registry.currency_codes(locale))
+        text = registry(locale, "currency") if registry else ""
+        return parse_listed(text, "symbols"), parse_listed(text, "codes")
+
+    def _rules_for(self, locale: str) -> _LocaleRules:
+        version = getattr(self.get_guideline, "version", 0)
+        cached = self._rules.get(locale)
+        if cached is None or cached[0] != version:
+            symbols, codes = self._currency_lists(locale)
+            rules = _LocaleRules(locale, symbols or _DEFAULT_SYMBOLS, codes or _DEFAULT_CODES)
+            cached = self._rules[locale] = (version, rules)
+        return cached[1]
+
+    def signature(self, locale: str) -> List[List[str]]:
+        """Guideline-derived inputs of the rules for `locale` (currency symbols, codes) — for stage fingerprints."""
+        rules = self._rules_for(locale or "")
+        return [sorted(rules.symbols), sorted(rules.codes)]
+
+    def classify(self, line: str, locale: str) -> Optional[List[str]]:
+        if not any(ch.isdigit() for ch in line or ""):
+            return []
+        return self._rules_for(locale or "").classify(line)
@@ -0,0 +1,176 @@
+# utils/checkpoint_store.py — crash-safe resume store (SQLite, keyed by input path + content hash)
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import asyncio
+from threading import Lock
+from typing import Any, Dict, Optional
+
+
+def file_sha256(path: str) -> str:
+    """sha256 of the raw input file bytes (content hash used for resume / skip)."""
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def checkpoint_key(input_path: str, content_sha256: str) -> str:
+    """Run key: the same file path with the same content resumes; an edited file starts over."""
+    return hashlib.sha256(f"{os.path.abspath(input_path)}\0{content_sha256}".encode("utf-8")).hexdigest()
+
+
+class CheckpointStore:
+    """
+    Local persistent checkpoints for the file graph:
+      - line_results : completed LineState result per (run_key, line index)
+      - node_results : FileState after each finished file-graph node (map_lines, missing_check, ...)
+    Rows of a run are dropped once its output JSON is written (finalize_save).
+    Checkpoint I/O failures never break a run; they only lose resume points.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            parent = os.path.dirname(self.path)
+            if parent:
+                os.makedirs(parent, exist_ok=True)
+            conn = sqlite3.connect(self.path, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS line_results ("
+                " run_key TEXT NOT NULL,"
+                " i INTEGER NOT NULL,"
+                " result TEXT NOT NULL,"
+                " PRIMARY KEY (run_key, i))"
+            )
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS node_results ("
+                " run_key TEXT NOT NULL,"
+                " node TEXT NOT NULL,"
+                " state TEXT NOT NULL,"
+                " updated_at REAL NOT NULL,"
+                " PRIMARY KEY (run_key, node))"
+            )
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS runs ("
+                " run_key TEXT PRIMARY KEY,"
+                " input_path TEXT NOT NULL,"
+                " content_sha256 TEXT NOT NULL,"
+                " started_at REAL NOT NULL)"
+            )
+            conn.commit()
+            self._conn = conn
+        return self._conn
+
+    # ---------- sync ----------
+    def begin(self, run_key: str, input_path: str, content_sha256: str) -> None:
+        """
+        Register a run; checkpoints of older contents of the same input path are discarded.
+        input_path identifies one document: the input file, or "{path}#{record_id}" for a JSONL record.
+        """
+        abspath = os.path.abspath(input_path)
+        with self._lock:
+            conn = self._connect()
+            stale = [r[0] for r in conn.execute(
+                "SELECT run_key FROM runs WHERE input_path = ? AND run_key != ?", (abspath, run_key)
+            )]
+            for key in stale:
+                self._clear_locked(conn, key)
+            conn.execute(
+                "INSERT OR IGNORE INTO runs(run_key, input_path, content_sha256, started_at) VALUES (?, ?, ?, ?)",
+                (run_key, abspath, content_sha256, time.time()),
+            )
+            conn.commit()
+
+    def load_lines(self, run_key: str) -> Dict[int, Dict[str, Any]]:
+        with self._lock:
+            rows = self._connect().execute(
+                "SELECT i, result FROM line_results WHERE run_key = ?", (run_key,)
+            ).fetchall()
+        return {i: json.loads(result) for i, result in rows}
+
+    def save_line(self, run_key: str, i: int, result: Dict[str, Any]) -> None:
+        value = json.dumps(result, ensure_ascii=False)
+        with self._lock:
+            conn = self._connect()
+            conn.execute(
+                "INSERT OR REPLACE INTO line_results(run_key, i, result) VALUES (?, ?, ?)", (run_key, i, value)
+            )
+            conn.commit()
+
+    def load_node(self, run_key: str, node: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._connect().execute(
+                "SELECT state FROM node_results WHERE run_key = ? AND node = ?", (run_key, node)
+            ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def save_node(self, run_key: str, node: str, state: Dict[str, Any]) -> None:
+        value = json.dumps(state, ensure_ascii=False)
+        with self._lock:
+            conn = self._connect()
+            conn.execute(
+                "INSERT OR REPLACE INTO node_results(run_key, node, state, updated_at) VALUES (?, ?, ?, ?)",
+                (run_key, node, value, time.time()),
+            )
+            conn.commit()
+
+    def _clear_locked(self, conn: sqlite3.Connection, run_key: str) -> None:
+        conn.execute("DELETE FROM line_results WHERE run_key = ?", (run_key,))
+        conn.execute("DELETE FROM node_results WHERE run_key = ?", (run_key,))
+        conn.execute("DELETE FROM runs WHERE run_key = ?", (run_key,))
+
+    def clear(self, run_key: str) -> None:
+        with self._lock:
+            conn = self._connect()
+            self._clear_locked(conn, run_key)
+            conn.commit()
+
+    def close(self) -> None:
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    # ---------- async (sqlite I/O off the event loop) ----------
+    async def aload_lines(self, run_key: str) -> Dict[int, Dict[str, Any]]:
+        try:
+            return await asyncio.to_thread(self.load_lines, run_key)
+        except Exception:
+            return {}
+
+    async def asave_line(self, run_key: str, i: int, result: Dict[str, Any]) -> None:
+        try:
+            await asyncio.to_thread(self.save_line, run_key, i, result)
+        except Exception:
+            pass
+
+    async def aload_node(self, run_key: str, node: str) -> Optional[Dict[str, Any]]:
+        try:
+            return await asyncio.to_thread(self.load_node, run_key, node)
+        except Exception:
+            return None
+
+    async def asave_node(self, run_key: str, node: str, state: Dict[str, Any]) -> None:
+        try:
+            await asyncio.to_thread(self.save_node, run_key, node, state)
+        except Exception:
+            pass
+
+
+def output_matches_input(output_path: str, content_sha256: str) -> bool:
+    """True if an existing output JSON was produced from exactly this input content."""
+    try:
+        with open(output_path, "r", encoding="utf-8") as f:
+            return json.load(f).get("input_sha256") == content_sha256
+    except (OSError, ValueError, AttributeError):
+        return False
@@ -0,0 +1,172 @@
+# utils/error_log.py — shared non-blocking error.jsonl sink (background writer, batched flush, size rotation)
+import os
+import json
+import queue
+import atexit
+import threading
+import time
+from typing import Dict, List, Optional
+
+# ====== writer knobs ======
+FLUSH_INTERVAL_SEC = 1.0             # 레코드는 최대 이 간격 안에 디스크에 기록됨
+MAX_BATCH_RECORDS = 500              # 한 번에 모아 쓰는 최대 레코드 수
+MAX_BYTES = 50 * 1024 * 1024         # error.jsonl 크기 상한 (초과 시 error.jsonl.1 ... 로 rotate)
+BACKUP_COUNT = 5
+
+_QUEUE: "queue.Queue" = queue.Queue()
+_THREAD: Optional[threading.Thread] = None
+_START_LOCK = threading.Lock()
+_STOP = object()
+
+
+class _FlushMarker:
+    def __init__(self):
+        self.done = threading.Event()
+
+
+def configure_error_log(
+    *,
+    flush_interval_sec: Optional[float] = None,
+    max_batch_records: Optional[int] = None,
+    max_bytes: Optional[int] = None,
+    backup_count: Optional[int] = None,
+) -> None:
+    """Adjust flush interval / batch size / rotation limits."""
+    global FLUSH_INTERVAL_SEC, MAX_BATCH_RECORDS, MAX_BYTES, BACKUP_COUNT
+    if flush_interval_sec is not None:
+        FLUSH_INTERVAL_SEC = flush_interval_sec
+    if max_batch_records is not None:
+        MAX_BATCH_RECORDS = max_batch_records
+    if max_bytes is not None:
+        MAX_BYTES = max_bytes
+    if backup_count is not None:
+        BACKUP_COUNT = backup_count
+
+
+def error_log_path(output_dir: Optional[str] = None) -> str:
+    base = output_dir or os.getenv("OUTPUT_DIR") or os.getcwd()
+    return os.path.join(base, "error.jsonl")
+
+
+def append_error_jsonl(payload: dict, output_dir: Optional[str] = None) -> None:
+    """
+    Enqueue one error record for {output_dir}/error.jsonl.
+    Never touches the disk on the caller's thread, so it is safe to call from inside the event loop.
+    """
+    _ensure_writer()
+    _QUEUE.put_nowait((error_log_path(output_dir), payload))
+
+
+def flush_error_log(timeout: Optional[float] = None) -> bool:
+    """Block until every record enqueued so far is on disk. Returns False on timeout."""
+    if _THREAD is None or not _THREAD.is_alive():
+        return True
+    marker = _FlushMarker()
+    _QUEUE.put_nowait(marker)
+    return marker.done.wait(timeout)
+
+
+def shutdown_error_log(timeout: Optional[float] = 10.0) -> None:
+    """Flush pending records and stop the writer thread (also registered with atexit)."""
+    global _THREAD
+    with _START_LOCK:
+        thread = _THREAD
+        if thread is None or not thread.is_alive():
+            return
+        _QUEUE.put_nowait(_STOP)
+        thread.join(timeout)
+        _THREAD = None
+
+
+def _ensure_writer() -> None:
+    global _THREAD
+    if _THREAD is not None and _THREAD.is_alive():
+        return
+    with _START_LOCK:
+        if _THREAD is None or not _THREAD.is_alive():
+            _THREAD = threading.Thread(target=_writer_loop, name="error-log-writer", daemon=True)
+            _THREAD.start()
+
+
+def _rotate(path: str) -> None:
+    if BACKUP_COUNT <= 0:
+        os.remove(path)
+        return
+    for k in range(BACKUP_COUNT - 1, 0, -1):
+        src = f"{path}.{k}"
+        if os.path.exists(src):
+            os.replace(src, f"{path}.{k + 1}")
+    os.replace(path, f"{path}.1")
+
+
+def _write_batch(batch: List[tuple]) -> None:
+    by_path: Dict[str, List[str]] = {}
+    for path, payload in batch:
+        try:
+            line = json.dumps(payload, ensure_ascii=False)
+        except (TypeError, ValueError):
+            line = json.dumps({"type": "unserializable_error_record", "repr": repr(payload)}, ensure_ascii=False)
+        by_path.setdefault(path, []).append(line + "\n")
+
+    for path, lines in by_path.items():
+        try:
+            parent = os.path.dirname(path)
+            if parent:
+                os.makedirs(parent, exist_ok=True)
+            data = "".join(lines)
+            size = os.path.getsize(path) if os.path.exists(path) else 0
+            if size and size + len(data.encode("utf-8")) > MAX_BYTES:
+                _rotate(path)
+            with open(path, "a", encoding="utf-8") as f:
+                f.write(data)
+        except OSError:
+            # 로그 기록 실패가 파이프라인을 멈추지 않도록 무시
+            pass
+
+
+def _writer_loop() -> None:
+    while True:
+        item = _QUEUE.get()
+        batch: List[tuple] = []
+        markers: List[_FlushMarker] = []
+        stop = False
+        deadline = time.monotonic() + FLUSH_INTERVAL_SEC
+        while True:
+            if item is _STOP:
+                stop = True
+            elif isinstance(item, _FlushMarker):
+                markers.append(item)
+            else:
+                batch.append(item)
+            # flush/stop 요청이 오면 대기 없이 지금까지 모인 것을 바로 기록
+            if stop or markers or len(batch) >= MAX_BATCH_RECORDS:
+                break
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                item = _QUEUE.get(timeout=remaining)
+            except queue.Empty:
+                break
+        if stop or markers:
+            # 이미 큐에 들어온 레코드까지 함께 기록
+            while True:
+                try:
+                    extra = _QUEUE.get_nowait()
+                except queue.Empty:
+                    break
+                if extra is _STOP:
+                    stop = True
+                elif isinstance(extra, _FlushMarker):
+                    markers.append(extra)
+                else:
+                    batch.append(extra)
+        if batch:
+            _write_batch(batch)
+        for m in markers:
+            m.done.set()
+        if stop:
+            return
+
+
+atexit.register(shutdown_error_log)
@@ -1,23 +1,13 @@
-# utils/file_utils.py — guideline cache + JSONL error logging when missing
-import os, time, json
-from threading import Lock
+# utils/file_utils.py — guideline registry access + JSONL error logging when missing
+import os, time
+from typing import Optional
 
-GUIDE_BASE_DIR = "/mnt/c/Users/Flitto/Documents/NAC/LLM검수/LCT_check_phase1/docs"
-GUIDE_CACHE = {}  # key: (locale, category) -> str
-
-_ERROR_LOG_LOCK = Lock()
+from utils.error_log import append_error_jsonl
+from utils.category_rules import CATEGORIES
+from utils.guideline_registry import GuidelineRegistry
 
-def _error_log_path() -> str:
-    base = os.getenv("OUTPUT_DIR") or os.getcwd()
-    os.makedirs(base, exist_ok=True)
-    return os.path.join(base, "error.jsonl")
-
-def _append_error_jsonl(payload: dict) -> None:
-    path = _error_log_path()
-    line = json.dumps(payload, ensure_ascii=False)
-    with _ERROR_LOG_LOCK:
-        with open(path, "a", encoding="utf-8") as f:
-            f.write(line + "\n")
+GUIDE_BASE_DIR = "/mnt/c/Users/Flitto/Documents/NAC/LLM검수/LCT_check_phase1/docs"
+_REGISTRY: Optional[GuidelineRegistry] = None
 
 def _log_guideline_missing(locale: str, category: str):
     payload = {
@@ -30,7 +20,7 @@ def _log_guideline_missing(locale: str, category: str):
         "error": None,
         "guideline": {"locale": locale, "name": f"{category}.txt"},
     }
-    _append_error_jsonl(payload)
+    append_error_jsonl(payload)
 
 def load_guideline(locale: str, category: str) -> str:
     """
@@ -44,22 +34,22 @@ def load_guideline(locale: str, category: str) -> str:
     with open(file_path, "r", encoding="utf-8") as f:
         return f.read()
 
-def get_guideline(locale: str, category: str) -> str:
+def guideline_registry() -> GuidelineRegistry:
     """
-    Cached guideline getter. Logs to error.jsonl when the file is missing.
+    Process-wide registry over GUIDE_BASE_DIR (built on first use; main_batch builds it at startup).
     """
-    key = (locale, category)
-    if key in GUIDE_CACHE:
-        return GUIDE_CACHE[key]
+    global _REGISTRY
+    if _REGISTRY is None:
+        _REGISTRY = GuidelineRegistry(
+            GUIDE_BASE_DIR,
+            expected_categories=CATEGORIES,
+            on_missing=_log_guideline_missing,
+        )
+    return _REGISTRY
 
-    file_path = os.path.join(GUIDE_BASE_DIR, locale, f"{category}.txt")
-    if not os.path.exists(file_path):
-        _log_guideline_missing(locale, category)
-        GUIDE_CACHE[key] = ""
-        return ""
-
-    with open(file_path, "r", encoding="utf-8") as f:
-        content = f.read()
-
-    GUIDE_CACHE[key] = content
-    return content
+def get_guideline(locale: str, category: str) -> str:
+    """
+    Guideline getter backed by the registry (in-memory, reloaded on mtime change).
+    Logs to error.jsonl once when a known category has no file for the locale.
+    """
+    return guideline_registry().get(locale, category)
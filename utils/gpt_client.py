@@ -1,11 +1,27 @@
-# utils/gpt_client.py — async clients with semaphore, timeout, deterministic backoff (no console prints)
+# utils/gpt_client.py — async clients with per-model adaptive pools, timeout, classified jittered retries (no console prints)
 import os
+import re
+import copy
 import json
+import time
+import random
 import asyncio
-from typing import List, Tuple
+from collections import deque
+from contextlib import asynccontextmanager
+from email.utils import parsedate_to_datetime
+from typing import Dict, List, Tuple
 
+import aiohttp
 import openai
 
+from prompt_builder.build_prompt import PROMPT_BUILDER_VERSION
+from utils.response_cache import make_cache_key, cache_get, cache_put
+from utils.file_utils import guideline_registry
+from utils.helper import normalize_gpt_json
+from utils.metrics import record_gpt_call
+from utils.rate_limiter import get_pool, set_max_concurrency, estimate_request_tokens
+from utils.json_stream import IncrementalVerdictReader
+
 openai.api_key = os.getenv("OPENAI_API_KEY")
 
 # ====== async control knobs ======
@@ -15,17 +31,18 @@ openai.api_key = os.getenv("OPENAI_API_KEY")
 
 _ASYNC_TIMEOUT_SEC = 3600        # 사실상 무제한 (1시간)
 _ASYNC_MAX_RETRIES = 10          # 최대 재시도 횟수 확대
-_SEMAPHORE = asyncio.Semaphore(1)  # 동시성 1개 → 가장 안전
+# 동시성은 모델별 adaptive pool이 제어 (utils/rate_limiter.py, configure_model_pool)
 
 def set_async_limits(timeout_sec: int = 45, max_retries: int = 4, concurrency: int | None = None):
     """
-    Configure timeout/retries/concurrency for async chat calls.
+    Configure timeout/retries for async chat calls.
+    concurrency: ceiling on each model pool's adaptive in-flight limit.
     """
-    global _ASYNC_TIMEOUT_SEC, _ASYNC_MAX_RETRIES, _SEMAPHORE
+    global _ASYNC_TIMEOUT_SEC, _ASYNC_MAX_RETRIES
     _ASYNC_TIMEOUT_SEC = timeout_sec
     _ASYNC_MAX_RETRIES = max_retries
     if concurrency is not None:
-        _SEMAPHORE = asyncio.Semaphore(concurrency)
+        set_max_concurrency(concurrency)
 
 def ask_gpt4o(messages: List[dict], model="gpt-4o", temperature=0.0) -> Tuple[str | list, dict]:
     """
@@ -65,34 +82,447 @@ def ask_gpt5(messages: List[dict], model="gpt-5") -> Tuple[str | list, dict]:
     except Exception:
         return "error", {}
 
-async def _chat_acreate_with_retry(model: str, messages: List[dict], *, temperature: float | None = None) -> Tuple[str | list, dict]:
+# ====== retry / hedging knobs ======
+_BACKOFF_BASE_SEC = 0.6
+_BACKOFF_MAX_SEC = 60.0
+# 재시도해도 결과가 같은 오류 (인증/권한/잘못된 요청) → 즉시 실패
+_FATAL_ERRORS = (
+    openai.error.AuthenticationError,
+    openai.error.PermissionError,
+    openai.error.InvalidRequestError,
+    openai.error.InvalidAPIType,
+    openai.error.SignatureVerificationError,
+)
+_RETRYABLE_HTTP_STATUS = {408, 409, 429}
+
+# Hedged request: 느린 꼬리 구간의 gpt-4o 라인 호출에 중복 요청을 하나 더 보내 먼저 온 응답 사용
+_HEDGE_MODELS: frozenset = frozenset()
+_HEDGE_DELAY_SEC: float | None = None    # None → 최근 성공 latency의 quantile
+_HEDGE_QUANTILE = 0.95
+_HEDGE_MIN_SAMPLES = 20
+_HEDGE_MAX_RATIO = 0.1                    # 전체 요청 대비 hedge 비율 상한 (비용 보호)
+_LATENCY_SAMPLES: Dict[str, deque] = {}
+_HEDGE_STATS = {"requests": 0, "launched": 0, "won": 0}
+
+
+def is_retryable_error(exc: BaseException) -> bool:
+    """Retryable: timeouts, 429, 5xx, connection errors, malformed replies. Fatal: auth/permission/bad request."""
+    if isinstance(exc, _FATAL_ERRORS):
+        return False
+    if isinstance(exc, openai.error.OpenAIError):
+        status = getattr(exc, "http_status", None)
+        if status is not None and 400 <= status < 500 and status not in _RETRYABLE_HTTP_STATUS:
+            return False
+    return True
+
+
+def _parse_duration(value: str) -> float | None:
+    """'1.5' / '20ms' / '6m0s' / '1s' → seconds."""
+    value = (value or "").strip()
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    total, matched = 0.0, False
+    for num, unit in re.findall(r"(\d+(?:\.\d+)?)(ms|h|m|s)", value):
+        matched = True
+        total += float(num) * {"ms": 0.001, "s": 1.0, "m": 60.0, "h": 3600.0}[unit]
+    return total if matched else None
+
+
+def retry_after_seconds(exc: BaseException) -> float | None:
+    """Server retry hint from Retry-After / retry-after-ms / x-ratelimit-reset-* headers, if any."""
+    headers = getattr(exc, "headers", None) or {}
+    try:
+        lowered = {str(k).lower(): str(v) for k, v in dict(headers).items()}
+    except (TypeError, ValueError):
+        return None
+    if "retry-after-ms" in lowered:
+        ms = _parse_duration(lowered["retry-after-ms"])
+        if ms is not None:
+            return ms / 1000.0
+    if "retry-after" in lowered:
+        sec = _parse_duration(lowered["retry-after"])
+        if sec is None:
+            try:
+                sec = (parsedate_to_datetime(lowered["retry-after"]).timestamp() - time.time())
+            except (TypeError, ValueError):
+                sec = None
+        if sec is not None:
+            return max(0.0, sec)
+    resets = [_parse_duration(lowered[k]) for k in ("x-ratelimit-reset-requests", "x-ratelimit-reset-tokens") if k in lowered]
+    resets = [r for r in resets if r is not None]
+    return max(resets) if resets else None
+
+
+def _backoff_delay(attempt: int, exc: BaseException) -> float:
+    """Full-jitter exponential backoff; a server retry hint is a lower bound (plus a little jitter)."""
+    delay = random.uniform(0.0, min(_BACKOFF_MAX_SEC, _BACKOFF_BASE_SEC * (2 ** attempt)))
+    hint = retry_after_seconds(exc)
+    if hint is not None:
+        delay = max(delay, min(hint, _BACKOFF_MAX_SEC) + random.uniform(0.0, _BACKOFF_BASE_SEC))
+    return delay
+
+
+def configure_hedging(
+    models=("gpt-4o",),
+    *,
+    enabled: bool = True,
+    delay_sec: float | None = None,
+    quantile: float = 0.95,
+    min_samples: int = 20,
+    max_ratio: float = 0.1,
+) -> None:
+    """
+    Enable hedged requests for `models`: if an attempt has not answered after `delay_sec`
+    (default: the `quantile` of recent successful latencies), a duplicate is sent; the first reply wins
+    and the other is cancelled. At most `max_ratio` of requests are hedged.
+    """
+    global _HEDGE_MODELS, _HEDGE_DELAY_SEC, _HEDGE_QUANTILE, _HEDGE_MIN_SAMPLES, _HEDGE_MAX_RATIO
+    _HEDGE_MODELS = frozenset(models) if enabled else frozenset()
+    _HEDGE_DELAY_SEC = delay_sec
+    _HEDGE_QUANTILE = quantile
+    _HEDGE_MIN_SAMPLES = min_samples
+    _HEDGE_MAX_RATIO = max_ratio
+
+
+def hedge_stats() -> Dict[str, int]:
+    """requests: hedge-eligible attempts, launched: duplicates sent, won: duplicates that answered first."""
+    return dict(_HEDGE_STATS)
+
+
+def _hedge_delay(model: str) -> float | None:
+    if model not in _HEDGE_MODELS:
+        return None
+    if _HEDGE_STATS["launched"] >= _HEDGE_MAX_RATIO * max(1, _HEDGE_STATS["requests"]):
+        return None
+    if _HEDGE_DELAY_SEC is not None:
+        return _HEDGE_DELAY_SEC
+    samples = _LATENCY_SAMPLES.get(model)
+    if not samples or len(samples) < _HEDGE_MIN_SAMPLES:
+        return None
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(_HEDGE_QUANTILE * len(ordered)))]
+
+
+async def _attempt_once(model: str, pool, est_tokens: int, kwargs: dict):
+    async with pool.slot(est_tokens):
+        t0 = time.perf_counter()
+        resp = await asyncio.wait_for(openai.ChatCompletion.acreate(**kwargs), timeout=_ASYNC_TIMEOUT_SEC)
+    _LATENCY_SAMPLES.setdefault(model, deque(maxlen=500)).append(time.perf_counter() - t0)
+    return resp
+
+
+async def _attempt(model: str, pool, est_tokens: int, kwargs: dict):
+    """One attempt, optionally hedged with a delayed duplicate (first successful reply wins)."""
+    if model in _HEDGE_MODELS:
+        _HEDGE_STATS["requests"] += 1
+    delay = _hedge_delay(model)
+    if delay is None:
+        return await _attempt_once(model, pool, est_tokens, kwargs)
+
+    primary = asyncio.ensure_future(_attempt_once(model, pool, est_tokens, kwargs))
+    hedge = None
+    try:
+        done, _ = await asyncio.wait({primary}, timeout=delay)
+        if done:
+            return primary.result()
+        _HEDGE_STATS["launched"] += 1
+        hedge = asyncio.ensure_future(_attempt_once(model, pool, est_tokens, kwargs))
+        pending = {primary, hedge}
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    if task is hedge:
+                        _HEDGE_STATS["won"] += 1
+                    return task.result()
+        # 둘 다 실패 → 원 요청의 오류로 재시도 판단
+        return primary.result()
+    finally:
+        for task in (primary, hedge):
+            if task is not None and not task.done():
+                task.cancel()
+
+
+# Single-flight: 동시에 들어온 동일 (model, messages) 요청은 하나만 보내고 결과를 나눠 받음
+_SINGLE_FLIGHT_ENABLED = True
+_INFLIGHT: Dict[str, asyncio.Future] = {}
+_SINGLE_FLIGHT_STATS = {"leaders": 0, "coalesced": 0}
+
+
+def configure_single_flight(enabled: bool = True) -> None:
+    """Turn in-flight request coalescing on/off (on by default)."""
+    global _SINGLE_FLIGHT_ENABLED
+    _SINGLE_FLIGHT_ENABLED = enabled
+
+
+def single_flight_stats() -> Dict[str, int]:
+    """leaders: requests actually sent, coalesced: calls that awaited an identical in-flight request instead."""
+    return dict(_SINGLE_FLIGHT_STATS)
+
+
+async def _single_flight(key: str, call):
+    """
+    Run call() once per key among concurrent callers; the others await the leader's result.
+    Returns (result, coalesced). If the leader is cancelled, a waiting caller takes over.
+    """
+    if not _SINGLE_FLIGHT_ENABLED:
+        return await call(), False
+    loop = asyncio.get_running_loop()
+    while True:
+        fut = _INFLIGHT.get(key)
+        if fut is None or fut.get_loop() is not loop:
+            break
+        await asyncio.wait({fut})
+        if not fut.cancelled():
+            _SINGLE_FLIGHT_STATS["coalesced"] += 1
+            result = fut.result()
+            # list/dict 응답은 호출자끼리 공유하지 않도록 복사
+            return (result[0] if isinstance(result[0], str) else copy.deepcopy(result[0]), dict(result[1])), True
+
+    fut = loop.create_future()
+    _INFLIGHT[key] = fut
+    _SINGLE_FLIGHT_STATS["leaders"] += 1
+    try:
+        result = await call()
+    except BaseException:
+        fut.cancel()
+        raise
+    finally:
+        if _INFLIGHT.get(key) is fut:
+            del _INFLIGHT[key]
+    fut.set_result(result)
+    return result, False
+
+
+def _cache_version(suffix: str = "") -> str:
+    """Builder version for cache keys: prompt builder version + guideline content hash (edited guidelines ⇒ new keys)."""
+    return f"{PROMPT_BUILDER_VERSION}+guidelines:{guideline_registry().snapshot.content_hash[:16]}{suffix}"
+
+
+def _parse_reply(text: str):
+    """
+    '[...]' replies are decoded into a list ([] if that fails), others are returned as text.
+    Returns (reply, ok): ok is False when the reply does not parse into the JSON the callers expect (not cached).
+    """
+    reply = text.strip()
+    if reply.startswith("["):
+        try:
+            return json.loads(reply), True
+        except json.JSONDecodeError:
+            return [], False
+    return reply, bool(normalize_gpt_json(reply))
+
+
+async def _chat_acreate_with_retry(
+    model: str,
+    messages: List[dict],
+    *,
+    temperature: float | None = None,
+    use_cache: bool = True,
+) -> Tuple[str | list, dict]:
     """
-    Async wrapper with semaphore + timeout + deterministic exponential backoff.
-    On final failure returns ("error", {}).
+    Async wrapper with response cache + single-flight + per-model adaptive pool + timeout + classified retries.
+    Cache hits return immediately without taking a pool slot or touching the network; concurrent identical
+    requests share one in-flight call (recorded as cache hits in utils.metrics).
+    Fatal errors (auth / bad request) fail at once; retryable ones back off with full jitter,
+    honoring the server's Retry-After hint.
+    On final failure returns ("error", {}); errors and replies that do not parse as JSON are never cached.
+    Every call is recorded in utils.metrics (latency, attempts, timeouts, tokens) under the caller's stage.
     """
-    base_backoff = 0.6
+    started = time.perf_counter()
+    cache_key = None
+    if use_cache:
+        cache_key = make_cache_key(model, messages, temperature=temperature, builder_version=_cache_version())
+        cached = await cache_get(cache_key)
+        if cached is not None:
+            record_gpt_call(latency_sec=time.perf_counter() - started, attempts=0, timeouts=0,
+                            usage=cached[1], ok=True, cached=True)
+            return cached
+
+    key = cache_key or make_cache_key(model, messages, temperature=temperature, builder_version=_cache_version())
+    (reply, usage), coalesced = await _single_flight(
+        key, lambda: _chat_acreate_uncached(model, messages, temperature, cache_key, started)
+    )
+    if coalesced:
+        record_gpt_call(latency_sec=time.perf_counter() - started, attempts=0, timeouts=0,
+                        usage=usage, ok=reply != "error", cached=True)
+    return reply, usage
+
+
+async def _chat_acreate_uncached(model: str, messages: List[dict], temperature, cache_key, started: float):
+    timeouts = 0
+    pool = get_pool(model)
+    est_tokens = estimate_request_tokens(model, messages)
+    kwargs = dict(model=model, messages=messages)
+    if temperature is not None:
+        kwargs["temperature"] = temperature
     for attempt in range(_ASYNC_MAX_RETRIES):
         try:
-            async with _SEMAPHORE:
-                kwargs = dict(model=model, messages=messages)
-                if temperature is not None:
-                    kwargs["temperature"] = temperature
-                resp = await asyncio.wait_for(
-                    openai.ChatCompletion.acreate(**kwargs),
-                    timeout=_ASYNC_TIMEOUT_SEC
-                )
-            reply = resp["choices"][0]["message"]["content"].strip()
+            resp = await _attempt(model, pool, est_tokens, kwargs)
             usage = resp.get("usage", {})
-            if reply.startswith("["):
+            pool.reconcile_tokens(est_tokens, usage)
+            reply, parsed = _parse_reply(resp["choices"][0]["message"]["content"])
+            if cache_key is not None and parsed:
+                await cache_put(cache_key, model, reply, usage)
+            record_gpt_call(latency_sec=time.perf_counter() - started, attempts=attempt + 1, timeouts=timeouts,
+                            usage=usage, ok=True)
+            return reply, usage
+        except Exception as e:
+            if isinstance(e, (asyncio.TimeoutError, openai.error.Timeout)):
+                timeouts += 1
+            if is_retryable_error(e) and attempt < _ASYNC_MAX_RETRIES - 1:
+                await asyncio.sleep(_backoff_delay(attempt, e))
+            else:
+                record_gpt_call(latency_sec=time.perf_counter() - started, attempts=attempt + 1, timeouts=timeouts,
+                                usage=None, ok=False)
+                return "error", {}
+
+_STREAM_STATS = {"streams": 0, "early_stops": 0}
+
+
+def stream_stats() -> Dict[str, int]:
+    """streams: streamed calls, early_stops: streams cancelled after a decisive verdict."""
+    return dict(_STREAM_STATS)
+
+
+@asynccontextmanager
+async def _stream_session():
+    """
+    Dedicated aiohttp session for one streamed attempt, installed through openai.aiosession.
+    openai 0.28 wraps the stream in generators whose aclose() never reaches the aiohttp response,
+    so a stream cut short would keep its connection open; here every response is closed explicitly.
+    """
+    responses: list = []
+
+    async def _on_request_end(session, ctx, params) -> None:
+        responses.append(params.response)
+
+    trace = aiohttp.TraceConfig()
+    trace.on_request_end.append(_on_request_end)
+    session = aiohttp.ClientSession(trace_configs=[trace])
+    token = openai.aiosession.set(session)
+    try:
+        yield
+    finally:
+        openai.aiosession.reset(token)
+        for resp in responses:
+            resp.close()
+        await session.close()
+
+
+async def _stream_attempt(pool, est_tokens: int, kwargs: dict, reader: IncrementalVerdictReader, stop_when) -> bool:
+    """
+    One streamed attempt. The timeout is an idle timeout between chunks (partial output = liveness).
+    Returns True if the stream was cancelled early because stop_when(verdicts) became true
+    (the response and its connection are closed before the pool slot is released).
+    """
+    async with pool.slot(est_tokens), _stream_session():
+        stream = await asyncio.wait_for(
+            openai.ChatCompletion.acreate(stream=True, **kwargs), timeout=_ASYNC_TIMEOUT_SEC
+        )
+        try:
+            while True:
+                try:
+                    chunk = await asyncio.wait_for(stream.__anext__(), timeout=_ASYNC_TIMEOUT_SEC)
+                except StopAsyncIteration:
+                    return False
+                choices = chunk.get("choices") or []
+                delta = (choices[0].get("delta") or {}).get("content") if choices else None
+                if delta and reader.feed(delta) and stop_when is not None and stop_when(reader.values):
+                    return True
+        finally:
+            # 조기 종료/오류 시 generator 정리 (연결은 _stream_session이 닫음)
+            aclose = getattr(stream, "aclose", None)
+            if aclose is not None:
                 try:
-                    return json.loads(reply), usage
-                except json.JSONDecodeError:
-                    return [], usage
+                    await aclose()
+                except Exception:
+                    pass
+
+
+async def _chat_astream_with_retry(
+    model: str,
+    messages: List[dict],
+    *,
+    verdict_fields=(),
+    stop_when=None,
+    use_cache: bool = True,
+) -> Tuple[str | list | dict, dict]:
+    """
+    Streaming counterpart of _chat_acreate_with_retry (same cache / pool / classified retries).
+    Top-level verdict fields are read incrementally; once stop_when(verdicts) is true the stream is
+    cancelled and the verdict dict itself is returned as the reply (e.g. {"missing_content": False}).
+    Such a truncated reply is never cached, and callers with a stop_when never share an in-flight call with
+    callers without one, so a caller that wants the full reply never gets a verdict dict (the reverse is fine).
+    The stream API reports no usage, so usage is estimated (usage["estimated"] = True).
+    """
+    started = time.perf_counter()
+    cache_key = None
+    if use_cache:
+        cache_key = make_cache_key(
+            model, messages, builder_version=_cache_version(f"+stream:{','.join(sorted(verdict_fields))}")
+        )
+        cached = await cache_get(cache_key)
+        if cached is not None:
+            record_gpt_call(latency_sec=time.perf_counter() - started, attempts=0, timeouts=0,
+                            usage=cached[1], ok=True, cached=True)
+            return cached
+
+    key = cache_key or make_cache_key(
+        model, messages, builder_version=_cache_version(f"+stream:{','.join(sorted(verdict_fields))}")
+    )
+    if stop_when is not None:
+        key += ":early_stop"
+    (reply, usage), coalesced = await _single_flight(
+        key, lambda: _chat_astream_uncached(model, messages, verdict_fields, stop_when, cache_key, started)
+    )
+    if coalesced:
+        record_gpt_call(latency_sec=time.perf_counter() - started, attempts=0, timeouts=0,
+                        usage=usage, ok=reply != "error", cached=True)
+    return reply, usage
+
+
+async def _chat_astream_uncached(model: str, messages: List[dict], verdict_fields, stop_when, cache_key, started: float):
+    timeouts = 0
+    pool = get_pool(model)
+    est_tokens = estimate_request_tokens(model, messages)
+    kwargs = dict(model=model, messages=messages)
+    for attempt in range(_ASYNC_MAX_RETRIES):
+        reader = IncrementalVerdictReader(verdict_fields)
+        try:
+            _STREAM_STATS["streams"] += 1
+            stopped = await _stream_attempt(pool, est_tokens, kwargs, reader, stop_when)
+            text = reader.text
+            prompt_est = est_tokens - estimate_request_tokens(model, [])
+            usage = {
+                "prompt_tokens": prompt_est,
+                "completion_tokens": len(text) // 3,
+                "total_tokens": prompt_est + len(text) // 3,
+                "estimated": True,
+            }
+            pool.reconcile_tokens(est_tokens, usage)
+            if stopped:
+                _STREAM_STATS["early_stops"] += 1
+                reply, parsed = dict(reader.values), False   # 잘린 응답은 캐시하지 않음
+            else:
+                reply, parsed = _parse_reply(text)
+            if cache_key is not None and parsed:
+                await cache_put(cache_key, model, reply, usage)
+            record_gpt_call(latency_sec=time.perf_counter() - started, attempts=attempt + 1, timeouts=timeouts,
+                            usage=usage, ok=True)
             return reply, usage
-        except Exception:
-            if attempt < _ASYNC_MAX_RETRIES - 1:
-                await asyncio.sleep(base_backoff * (2 ** attempt))
+        except Exception as e:
+            if isinstance(e, (asyncio.TimeoutError, openai.error.Timeout)):
+                timeouts += 1
+            if is_retryable_error(e) and attempt < _ASYNC_MAX_RETRIES - 1:
+                await asyncio.sleep(_backoff_delay(attempt, e))
             else:
+                record_gpt_call(latency_sec=time.perf_counter() - started, attempts=attempt + 1, timeouts=timeouts,
+                                usage=None, ok=False)
                 return "error", {}
 
 async def ask_gpt4o_async(messages: List[dict], model="gpt-4o", timeout: int | None = None, max_retries: int | None = None):
@@ -110,3 +540,21 @@ async def ask_gpt5_async(messages: List[dict], model="gpt-5", timeout: int | Non
     if timeout is not None:
         set_async_limits(timeout_sec=timeout, max_retries=max_retries or _ASYNC_MAX_RETRIES)
     return await _chat_acreate_with_retry(model, messages)
+
+
+async def ask_gpt5_stream_async(
+    messages: List[dict],
+    model="gpt-5",
+    timeout: int | None = None,
+    max_retries: int | None = None,
+    *,
+    verdict_fields=(),
+    stop_when=None,
+):
+    """
+    Streamed GPT-5 call. `timeout` is the max silence between chunks, not the total duration.
+    Returns (reply, usage) like ask_gpt5_async; on early stop the reply is the verdict dict.
+    """
+    if timeout is not None:
+        set_async_limits(timeout_sec=timeout, max_retries=max_retries or _ASYNC_MAX_RETRIES)
+    return await _chat_astream_with_retry(model, messages, verdict_fields=verdict_fields, stop_when=stop_when)
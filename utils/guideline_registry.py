@@ -0,0 +1,179 @@
+# utils/guideline_registry.py — immutable index of docs/<locale>/<category>.txt, reloaded on mtime change
+from __future__ import annotations
+import os
+import re
+import hashlib
+import time
+from threading import Lock
+from types import MappingProxyType
+from typing import Callable, Dict, FrozenSet, Iterable, List, Mapping, Optional, Tuple
+
+
+def parse_listed(text: str, label: str) -> List[str]:
+    """Parse 'Expected currency <label> include: a, b, c' from a guideline text."""
+    m = re.search(rf"Expected currency {label} include:\s*(.+)", text or "")
+    if not m:
+        return []
+    out = []
+    for tok in m.group(1).split(","):
+        tok = tok.strip()
+        if not tok:
+            continue
+        # "TRY(abbreviation: TL)" → TRY, TL
+        paren = re.match(r"(\S+?)\((?:abbreviation:\s*)?([^)]+)\)", tok)
+        if paren:
+            out.extend([paren.group(1), paren.group(2).strip()])
+        else:
+            out.append(tok)
+    return out
+
+
+class GuidelineSnapshot:
+    """One immutable load of the guideline tree (texts, known categories, extracted artifacts)."""
+
+    __slots__ = ("version", "texts", "locales", "categories", "currency_symbols", "currency_codes", "mtimes",
+                 "content_hash")
+
+    def __init__(self, version: int, texts: Dict[Tuple[str, str], str], mtimes: Dict[str, int]):
+        self.version = version
+        self.texts: Mapping[Tuple[str, str], str] = MappingProxyType(texts)
+        self.locales: FrozenSet[str] = frozenset(loc for loc, _ in texts)
+        self.categories: FrozenSet[str] = frozenset(cat for _, cat in texts)
+        symbols, codes = {}, {}
+        for (loc, cat), text in texts.items():
+            if cat == "currency":
+                symbols[loc] = tuple(parse_listed(text, "symbols"))
+                codes[loc] = tuple(parse_listed(text, "codes"))
+        self.currency_symbols: Mapping[str, Tuple[str, ...]] = MappingProxyType(symbols)
+        self.currency_codes: Mapping[str, Tuple[str, ...]] = MappingProxyType(codes)
+        self.mtimes: Mapping[str, int] = MappingProxyType(mtimes)
+        # 내용 기준 hash (mtime만 바뀐 reload는 같은 값) — 응답 캐시 key 등에 사용
+        h = hashlib.sha256()
+        for (loc, cat), text in sorted(texts.items()):
+            h.update(f"{loc}/{cat}\0{text}\0".encode("utf-8"))
+        self.content_hash = h.hexdigest()
+
+
+def _scan(base_dir: str) -> Tuple[Dict[Tuple[str, str], str], Dict[str, int]]:
+    """Read every <locale>/<category>.txt under base_dir; mtimes also cover the directories (add/remove)."""
+    texts: Dict[Tuple[str, str], str] = {}
+    mtimes: Dict[str, int] = {}
+    try:
+        mtimes[base_dir] = os.stat(base_dir).st_mtime_ns
+        locale_dirs = [e for e in os.scandir(base_dir) if e.is_dir()]
+    except OSError:
+        return texts, mtimes
+    for loc in locale_dirs:
+        try:
+            mtimes[loc.path] = loc.stat().st_mtime_ns
+            entries = [e for e in os.scandir(loc.path) if e.is_file() and e.name.endswith(".txt")]
+        except OSError:
+            continue
+        for e in entries:
+            try:
+                mtimes[e.path] = e.stat().st_mtime_ns
+                with open(e.path, "r", encoding="utf-8") as f:
+                    texts[(loc.name, e.name[:-4])] = f.read()
+            except OSError:
+                continue
+    return texts, mtimes
+
+
+def _changed(mtimes: Mapping[str, int]) -> bool:
+    for path, mtime in mtimes.items():
+        try:
+            if os.stat(path).st_mtime_ns != mtime:
+                return True
+        except OSError:
+            return True
+    return False
+
+
+class GuidelineRegistry:
+    """
+    Loads every docs/<locale>/<category>.txt once into an immutable GuidelineSnapshot and serves
+    lookups from memory: registry(locale, category) is a drop-in get_guideline.
+    - unknown categories (e.g. LLM junk like "```json [\"currency\"]```") return "" in O(1),
+      without touching disk and without growing any cache
+    - a known category missing for a locale is reported once per snapshot via on_missing
+    - at most every reload_interval seconds a lookup stats the loaded paths; on any mtime change
+      the tree is re-read and the snapshot swapped atomically (readers never see a half-built index)
+    """
+
+    def __init__(
+        self,
+        base_dir: str,
+        *,
+        expected_categories: Iterable[str] = (),
+        reload_interval: float = 2.0,
+        on_missing: Optional[Callable[[str, str], None]] = None,
+    ):
+        self.base_dir = base_dir
+        self.expected_categories: FrozenSet[str] = frozenset(expected_categories)
+        self.reload_interval = reload_interval
+        self.on_missing = on_missing
+        self._lock = Lock()
+        self._reported: set = set()
+        self._checked_at = 0.0
+        self._snapshot = self._load(0)
+
+    def _load(self, version: int) -> GuidelineSnapshot:
+        texts, mtimes = _scan(self.base_dir)
+        self._checked_at = time.monotonic()
+        return GuidelineSnapshot(version, texts, mtimes)
+
+    def _maybe_reload(self) -> GuidelineSnapshot:
+        snap = self._snapshot
+        if self.reload_interval is None or time.monotonic() - self._checked_at < self.reload_interval:
+            return snap
+        with self._lock:
+            if self._snapshot is not snap or time.monotonic() - self._checked_at < self.reload_interval:
+                return self._snapshot
+            self._checked_at = time.monotonic()
+            if _changed(snap.mtimes):
+                self._snapshot = self._load(snap.version + 1)
+                self._reported = set()
+        return self._snapshot
+
+    def reload(self) -> GuidelineSnapshot:
+        """Force a re-read of the tree (new snapshot even if nothing changed)."""
+        with self._lock:
+            self._snapshot = self._load(self._snapshot.version + 1)
+            self._reported = set()
+        return self._snapshot
+
+    @property
+    def snapshot(self) -> GuidelineSnapshot:
+        return self._maybe_reload()
+
+    @property
+    def version(self) -> int:
+        return self.snapshot.version
+
+    def is_known(self, category: str) -> bool:
+        return category in self.snapshot.categories or category in self.expected_categories
+
+    def get(self, locale: str, category: str) -> str:
+        snap = self._maybe_reload()
+        text = snap.texts.get((locale, category))
+        if text is not None:
+            return text
+        if self.on_missing is not None and (category in snap.categories or category in self.expected_categories):
+            key = (locale, category)
+            if key not in self._reported:
+                self._reported.add(key)
+                self.on_missing(locale, category)
+        return ""
+
+    __call__ = get
+
+    def currency_symbols(self, locale: str) -> Tuple[str, ...]:
+        """Symbols listed in <locale>/currency.txt ('Expected currency symbols include: ...'), () if none."""
+        return self.snapshot.currency_symbols.get(locale, ())
+
+    def currency_codes(self, locale: str) -> Tuple[str, ...]:
+        return self.snapshot.currency_codes.get(locale, ())
+
+    def stats(self) -> Dict[str, int]:
+        snap = self.snapshot
+        return {"version": snap.version, "locales": len(snap.locales), "guidelines": len(snap.texts)}
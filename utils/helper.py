@@ -52,7 +52,122 @@ def normalize_gpt_json_cat(raw):
 
 import re, json
 
+# JSON backend: orjson이 설치돼 있으면 ASCII 응답에 사용 (없으면 표준 json)
+try:
+    import orjson as _orjson
+except ImportError:
+    _orjson = None
+
+_JOIN_ARTIFACT_RE = re.compile(r'\]\s*\.join\(\s*(?:\'|").*?(?:\'|")\s*\)')
+# 문자열 리터럴(닫는 따옴표 없으면 끝까지) 또는 괄호 — 문자열 내부는 C 레벨에서 건너뜀
+_STRUCT_RE = re.compile(r'"[^"\\]*(?:\\.[^"\\]*)*"?|[{}\[\]]', re.S)
+_STR_SPECIAL_RE = re.compile(r'[\\"]')
+_BRACKET_RE = re.compile(r'[{}\[\]]')
+_WS_RE = re.compile(r'[ \t\r\n]*')
+
+
+def _loads(s: str):
+    # 비ASCII 문자열(ko/ar/ru …)이 많은 응답은 표준 json이 더 빠름 → ASCII일 때만 orjson
+    if _orjson is not None and s.isascii():
+        try:
+            return _orjson.loads(s)
+        except _orjson.JSONDecodeError:
+            # NaN/Infinity는 표준 json만 허용 → 그 경우에만 재시도
+            if "NaN" not in s and "Infinity" not in s:
+                raise
+    return json.loads(s)
+
+
+def _fix_bracket_mismatch(text: str):
+    """Close/replace mismatched brackets outside strings. Returns (fixed, changed)."""
+    out = []
+    stack = []
+    pos = 0
+    changed = False
+    for m in _STRUCT_RE.finditer(text):
+        tok = m.group()
+        if tok[0] == '"':
+            continue
+        out.append(text[pos:m.start()])
+        pos = m.end()
+        if tok == '{':
+            stack.append('}')
+            out.append(tok)
+        elif tok == '[':
+            stack.append(']')
+            out.append(tok)
+        elif stack:
+            expected = stack.pop()
+            out.append(expected)
+            changed = changed or tok != expected
+        else:
+            out.append(tok)
+    out.append(text[pos:])
+    if stack:
+        changed = True
+        out.extend(reversed(stack))
+    return "".join(out), changed
+
+
+def _fix_unescaped_quotes(text: str):
+    """
+    Escape '"' inside strings unless it is followed (after whitespace) by , ] } or the end.
+    An object key (a string opened right after '{' or ',' inside an object) also closes at ':';
+    in values and list items ':' does not end the string ("Time": 15:00, "16": 9 …).
+    Returns (fixed, changed).
+    """
+    out = []
+    stack = []      # 문자열 밖에서 열린 괄호
+    prev = ""       # 문자열 밖의 마지막 공백 아닌 문자 (문자열이 끝난 직후면 '"')
+    i, n = 0, len(text)
+    changed = False
+    while i < n:
+        j = text.find('"', i)
+        seg = text[i:j] if j >= 0 else text[i:]
+        for m in _BRACKET_RE.finditer(seg):
+            if m.group() in "{[":
+                stack.append(m.group())
+            elif stack:
+                stack.pop()
+        seg = seg.rstrip(" \t\r\n")
+        if seg:
+            prev = seg[-1]
+        if j < 0:
+            out.append(text[i:])
+            break
+        out.append(text[i:j + 1])
+        closers = ",:]}" if stack and stack[-1] == "{" and prev in "{," else ",]}"
+        i = j + 1
+        while i < n:
+            m = _STR_SPECIAL_RE.search(text, i)
+            if m is None:
+                out.append(text[i:])
+                i = n
+                break
+            k = m.start()
+            out.append(text[i:k])
+            if text[k] == '\\':
+                out.append(text[k:k + 2])
+                i = k + 2
+                continue
+            p = _WS_RE.match(text, k + 1).end()
+            i = k + 1
+            if p >= n or text[p] in closers:
+                out.append('"')
+                break
+            out.append('\\"')
+            changed = True
+        prev = '"'
+    return "".join(out), changed
+
+
 def normalize_gpt_json(raw):
+    """
+    Parse a GPT reply into JSON (dict/list); {} when unrecoverable.
+    Strips ```json fences / surrounding prose, then tries:
+    plain parse → `].join(...)` artifact removal → bracket repair → unescaped-quote repair (+ bracket repair),
+    skipping any repair pass that would not change the text.
+    """
     if isinstance(raw, dict):
         return raw
     if not isinstance(raw, str):
@@ -65,128 +180,33 @@ def normalize_gpt_json(raw):
             s = parts[1] if len(parts) > 1 else ""
     if "{" in s and "}" in s:
         s = s[s.find("{"): s.rfind("}") + 1]
-        
-    s = re.sub(r'\]\s*\.join\(\s*(?:\'|").*?(?:\'|")\s*\)', ']', s)
 
-    # --- 기존 1차 시도 ---
     try:
-        return json.loads(s)
-    
+        return _loads(s)
     except Exception:
         pass
-    
-    def _fix_bracket_mismatch(text: str) -> str:
-        out = []
-        stack = [] 
-        in_string = False
-        escape = False
-
-        for ch in text:
-            if in_string:
-                out.append(ch)
-                if escape:
-                    escape = False
-                else:
-                    if ch == '\\':
-                        escape = True
-                    elif ch == '"':
-                        in_string = False
-                continue
-            if ch == '"':
-                in_string = True
-                out.append(ch)
-                continue
-
-            if ch == '{':
-                stack.append('}')
-                out.append(ch)
-                continue
-
-            if ch == '[':
-                stack.append(']')
-                out.append(ch)
-                continue
-
-            if ch == '}' or ch == ']':
-                if stack:
-                    expected = stack[-1]
-                    if ch == expected:
-                        stack.pop()
-                        out.append(ch)
-                    else:
-                        out.append(expected)
-                        stack.pop()
-                else:
-                    out.append(ch)
-                continue
 
-            out.append(ch)
+    # `[...].join("")` 흔적은 유효한 JSON이 아니므로 첫 parse 실패 후에만 제거
+    if ".join(" in s:
+        s = _JOIN_ARTIFACT_RE.sub(']', s)
+        try:
+            return _loads(s)
+        except Exception:
+            pass
 
-        while stack:
-            out.append(stack.pop())
+    s_fixed_brackets, changed = _fix_bracket_mismatch(s)
+    if changed:
+        try:
+            return _loads(s_fixed_brackets)
+        except Exception:
+            pass
 
-        return "".join(out)
-
-    s_fixed_brackets = _fix_bracket_mismatch(s)
     try:
-        return json.loads(s_fixed_brackets)
-    except Exception:
-        pass
-
-    def _fix_unescaped_quotes(text: str) -> str:
-        out = []
-        in_string = False
-        escape = False
-        i, n = 0, len(text)
-
-        def next_meaningful(idx: int) -> str:
-            j = idx
-            while j < n and text[j] in (" ", "\t", "\r", "\n"):
-                j += 1
-            return text[j] if j < n else ""
-
-        while i < n:
-            ch = text[i]
-            if not in_string:
-                if ch == '"':
-                    in_string = True
-                    escape = False
-                    out.append(ch)
-                else:
-                    out.append(ch)
-                i += 1
-                continue
-
-            if escape:
-                out.append(ch)
-                escape = False
-                i += 1
-                continue
-
-            if ch == '\\':
-                out.append(ch)
-                escape = True
-                i += 1
-                continue
-
-            if ch == '"':
-                nm = next_meaningful(i + 1)
-                if nm in (",", "]", "}", ""):
-                    in_string = False
-                    out.append(ch)
-                else:
-                    out.append('\\"')
-                i += 1
-                continue
-
-            out.append(ch)
-            i += 1
-
-        return "".join(out)
-    try:
-        fixed = _fix_unescaped_quotes(s_fixed_brackets)
-        fixed = _fix_bracket_mismatch(fixed)
-        return json.loads(fixed)
+        fixed, changed = _fix_unescaped_quotes(s_fixed_brackets)
+        if not changed:
+            return {}
+        fixed, _ = _fix_bracket_mismatch(fixed)
+        return _loads(fixed)
     except Exception:
         return {}
 
@@ -198,5 +218,59 @@ def norm(s: str) -> str:
     s = s.replace("\r\n", "\n").replace("\r", "\n").strip()
     return unicodedata.normalize("NFC", s)
 
+# --- emoji: grapheme-cluster aware extractor (compiled once) ---
+# ZWJ sequences, skin-tone modifiers, variation selectors, tag sequences, flags and keycaps form one unit.
+def _build_emoji_re():
+    # 연속 codepoint를 range로 묶어야 sre charset 검사가 빠름
+    cps = sorted(ord(k) for k in emoji.EMOJI_DATA if len(k) == 1)
+    ranges = []
+    for cp in cps:
+        if ranges and cp == ranges[-1][1] + 1:
+            ranges[-1][1] = cp
+        else:
+            ranges.append([cp, cp])
+    base = "[" + "".join(
+        re.escape(chr(lo)) if lo == hi else f"{re.escape(chr(lo))}-{re.escape(chr(hi))}" for lo, hi in ranges
+    ) + "]"
+    unit = base + "[\U0001F3FB-\U0001F3FF]?\uFE0F?(?:[\U000E0020-\U000E007E]+\U000E007F)?"
+    flag = "[\U0001F1E6-\U0001F1FF]{2}"
+    keycap = "[0-9#*]\uFE0F?\u20E3"
+    # 선두 lookahead charset: 이모지가 아닌 위치는 C 레벨 scan으로 바로 건너뜀
+    first = base[:-1] + "\U0001F1E6-\U0001F1FF0-9#*]"
+    return re.compile(f"(?={first})(?:{flag}|{keycap}|{unit}(?:\u200D{unit})*)")
+
+_EMOJI_RE = _build_emoji_re()
+# has_emoji 사전 검사용 (숫자 제외, keycap은 U+20E3, 국기는 regional indicator로 감지)
+_EMOJI_PROBE = frozenset(
+    [k for k in emoji.EMOJI_DATA if len(k) == 1 and not k.isdigit() and k not in "#*"]
+    + [chr(cp) for cp in range(0x1F1E6, 0x1F200)] + ["\u20E3"]
+)
+
+def extract_emojis(text: str) -> list:
+    """Emoji clusters in order as (cluster, start offset)."""
+    return [(m.group(), m.start()) for m in _EMOJI_RE.finditer(text or "")]
+
+def _emoji_slot(text: str, start: int, end: int) -> str:
+    """Coarse position of an emoji within its line: start / end / middle (ignores spaces, punctuation, other emojis)."""
+    def _only_filler(part: str) -> bool:
+        part = _EMOJI_RE.sub("", part)
+        return all(not ch.isalnum() for ch in part)
+    if _only_filler(text[:start]):
+        return "start"
+    if _only_filler(text[end:]):
+        return "end"
+    return "middle"
+
+def emoji_signature(text: str) -> tuple:
+    """Order-preserving (cluster, slot) sequence; equal signatures ⇒ same emojis in the same order and places."""
+    text = text or ""
+    return tuple(
+        (m.group(), _emoji_slot(text, m.start(), m.end()))
+        for m in _EMOJI_RE.finditer(text)
+    )
+
 def has_emoji(text: str) -> bool:
-    return any(ch in emoji.EMOJI_DATA for ch in text or "")
+    text = text or ""
+    if _EMOJI_PROBE.isdisjoint(text):
+        return False
+    return _EMOJI_RE.search(text) is not None
@@ -0,0 +1,102 @@
+# utils/json_stream.py — incremental reader for top-level scalar fields of a streamed JSON reply
+from typing import Any, Dict, Iterable, Optional
+
+_LITERALS = {"true": True, "false": False, "null": None}
+
+
+class IncrementalVerdictReader:
+    """
+    Feed streamed text chunks; top-level scalar fields (true/false/null/number) are surfaced
+    as soon as their value is complete, e.g. {"missing_content": false, ...} → {"missing_content": False}
+    after the first few tokens. Text before the first "{" (```json fences etc.) is ignored,
+    and keys nested inside arrays/objects or occurring inside string values are never matched.
+    """
+
+    def __init__(self, fields: Optional[Iterable[str]] = None):
+        self.fields = set(fields) if fields is not None else None
+        self.values: Dict[str, Any] = {}
+        self.text_parts = []
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._buf = []              # current top-level string (key) or scalar literal
+        self._key: Optional[str] = None
+        self._expect = "key"        # key → colon → value → comma
+        self._scalar = False
+
+    @property
+    def text(self) -> str:
+        return "".join(self.text_parts)
+
+    def feed(self, chunk: str) -> Dict[str, Any]:
+        """Consume a chunk; returns the fields completed by this chunk."""
+        self.text_parts.append(chunk)
+        found: Dict[str, Any] = {}
+        for ch in chunk:
+            self._step(ch, found)
+        return found
+
+    def _finish_scalar(self, found: Dict[str, Any]) -> None:
+        raw = "".join(self._buf).strip()
+        self._buf = []
+        self._scalar = False
+        if raw in _LITERALS:
+            val = _LITERALS[raw]
+        else:
+            try:
+                val = float(raw) if any(c in raw for c in ".eE") else int(raw)
+            except ValueError:
+                return
+        if self._key is not None and (self.fields is None or self._key in self.fields):
+            self.values[self._key] = val
+            found[self._key] = val
+
+    def _step(self, ch: str, found: Dict[str, Any]) -> None:
+        if self._in_string:
+            if self._escape:
+                self._escape = False
+                if self._depth == 1 and self._expect == "key":
+                    self._buf.append(ch)
+            elif ch == "\\":
+                self._escape = True
+            elif ch == '"':
+                self._in_string = False
+                if self._depth == 1 and self._expect == "key":
+                    self._key = "".join(self._buf)
+                    self._buf = []
+                    self._expect = "colon"
+                elif self._depth == 1 and self._expect == "value":
+                    self._expect = "comma"     # string value: not a verdict
+            elif self._depth == 1 and self._expect == "key":
+                self._buf.append(ch)
+            return
+
+        if self._scalar:
+            if ch in ",}" or ch.isspace():
+                self._finish_scalar(found)
+                self._expect = "comma"
+            else:
+                self._buf.append(ch)
+                return
+
+        if ch == '"':
+            self._in_string = True
+            return
+        if ch in "{[":
+            if self._depth == 1 and self._expect == "value":
+                self._expect = "comma"         # nested value: skip as a whole
+            self._depth += 1
+            return
+        if ch in "}]":
+            self._depth = max(0, self._depth - 1)
+            return
+        if self._depth != 1:
+            return
+        if ch == ":" and self._expect == "colon":
+            self._expect = "value"
+        elif ch == "," and self._expect == "comma":
+            self._expect = "key"
+            self._key = None
+        elif self._expect == "value" and not ch.isspace():
+            self._scalar = True
+            self._buf = [ch]
@@ -0,0 +1,244 @@
+# utils/metrics.py — per-stage GPT call metrics (latency / retries / timeouts / tokens), per-file + batch-wide
+import os
+import json
+import math
+import tempfile
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, List, Optional
+
+STAGES = ("category", "format_check", "emoji_check", "missing_check", "addition_check")
+# 배치/결합 변형 stage는 기본 stage로 집계
+_STAGE_ALIASES = {
+    "category_batch": "category",
+    "format_check_batch": "format_check",
+    "format_check_combined": "format_check",
+}
+LATENCY_BUCKETS = (0.5, 1.0, 2.0, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0, 600.0, 1800.0, math.inf)
+
+_CURRENT_STAGE: ContextVar[Optional[str]] = ContextVar("gpt_stage", default=None)
+_CURRENT_FILE: ContextVar[Optional["MetricsCollector"]] = ContextVar("gpt_file_metrics", default=None)
+
+
+def _percentile(sorted_vals: List[float], q: float) -> float:
+    if not sorted_vals:
+        return 0.0
+    k = min(len(sorted_vals) - 1, max(0, math.ceil(q * len(sorted_vals)) - 1))
+    return sorted_vals[k]
+
+
+class _StageMetrics:
+    __slots__ = ("calls", "errors", "cache_hits", "attempts", "timeouts",
+                 "prompt_tokens", "completion_tokens", "latencies", "buckets")
+
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.cache_hits = 0
+        self.attempts = 0
+        self.timeouts = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.latencies: List[float] = []
+        self.buckets = [0] * len(LATENCY_BUCKETS)
+
+    def observe_latency(self, sec: float) -> None:
+        self.latencies.append(sec)
+        for k, le in enumerate(LATENCY_BUCKETS):
+            if sec <= le:
+                self.buckets[k] += 1
+                break
+
+    def summary(self) -> Dict[str, object]:
+        lat = sorted(self.latencies)
+        return {
+            "calls": self.calls,
+            "errors": self.errors,
+            "cache_hits": self.cache_hits,
+            "attempts": self.attempts,
+            "retries": max(0, self.attempts - (self.calls - self.cache_hits)),
+            "timeouts": self.timeouts,
+            "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": self.completion_tokens,
+            "latency_sec": {
+                "sum": round(sum(lat), 3),
+                "p50": round(_percentile(lat, 0.50), 3),
+                "p95": round(_percentile(lat, 0.95), 3),
+                "max": round(lat[-1], 3) if lat else 0.0,
+            },
+        }
+
+
+class MetricsCollector:
+    """
+    Per-stage counters + latency histogram for GPT calls.
+    One collector per file (→ output JSON "metrics") and one batch-wide collector (→ textfile/JSON dump).
+    """
+
+    def __init__(self):
+        self._stages: Dict[str, _StageMetrics] = {}
+
+    def _stage(self, stage: str) -> _StageMetrics:
+        m = self._stages.get(stage)
+        if m is None:
+            m = self._stages[stage] = _StageMetrics()
+        return m
+
+    def record_call(
+        self,
+        stage: str,
+        *,
+        latency_sec: float,
+        attempts: int,
+        timeouts: int,
+        prompt_tokens: int,
+        completion_tokens: int,
+        ok: bool,
+        cached: bool,
+    ) -> None:
+        m = self._stage(stage)
+        m.calls += 1
+        m.errors += 0 if ok else 1
+        m.cache_hits += 1 if cached else 0
+        m.attempts += attempts
+        m.timeouts += timeouts
+        m.prompt_tokens += prompt_tokens
+        m.completion_tokens += completion_tokens
+        m.observe_latency(latency_sec)
+
+    def summary(self) -> Dict[str, Dict[str, object]]:
+        """{stage: {calls, errors, cache_hits, attempts, retries, timeouts, *_tokens, latency_sec{sum,p50,p95,max}}}"""
+        stages = dict(self._stages)  # _stage()가 다른 thread에서 키를 추가해도 안전하도록 snapshot
+        order = list(STAGES) + sorted(s for s in stages if s not in STAGES)
+        return {s: stages[s].summary() for s in order if s in stages}
+
+    def totals(self) -> Dict[str, int]:
+        out = {"calls": 0, "errors": 0, "retries": 0, "timeouts": 0, "prompt_tokens": 0, "completion_tokens": 0}
+        for sm in self.summary().values():
+            for k in out:
+                out[k] += sm[k]
+        return out
+
+    def to_prometheus(self, prefix: str = "nac_gpt") -> str:
+        """Prometheus text exposition format (node_exporter textfile collector)."""
+        counters = [
+            ("calls_total", "GPT calls per stage", "calls"),
+            ("errors_total", "GPT calls that failed after all retries", "errors"),
+            ("cache_hits_total", "GPT calls answered from the response cache", "cache_hits"),
+            ("attempts_total", "API attempts including retries", "attempts"),
+            ("retries_total", "API retries", None),
+            ("timeouts_total", "API attempts that hit the timeout", "timeouts"),
+            ("prompt_tokens_total", "Prompt tokens", "prompt_tokens"),
+            ("completion_tokens_total", "Completion tokens", "completion_tokens"),
+        ]
+        stages = list(self._stages.items())  # snapshot (to_thread에서 호출돼도 dict 크기 변경 오류 없음)
+        lines: List[str] = []
+        for name, help_text, attr in counters:
+            lines.append(f"# HELP {prefix}_{name} {help_text}")
+            lines.append(f"# TYPE {prefix}_{name} counter")
+            for stage, m in stages:
+                val = m.summary()["retries"] if attr is None else getattr(m, attr)
+                lines.append(f'{prefix}_{name}{{stage="{stage}"}} {val}')
+
+        lines.append(f"# HELP {prefix}_latency_seconds Wall time per GPT call (incl. pool wait and retries)")
+        lines.append(f"# TYPE {prefix}_latency_seconds histogram")
+        for stage, m in stages:
+            cum = 0
+            for le, n in zip(LATENCY_BUCKETS, m.buckets):
+                cum += n
+                le_s = "+Inf" if math.isinf(le) else repr(le)
+                lines.append(f'{prefix}_latency_seconds_bucket{{stage="{stage}",le="{le_s}"}} {cum}')
+            lines.append(f'{prefix}_latency_seconds_sum{{stage="{stage}"}} {sum(m.latencies):.6f}')
+            lines.append(f'{prefix}_latency_seconds_count{{stage="{stage}"}} {len(m.latencies)}')
+        return "\n".join(lines) + "\n"
+
+    def to_json(self) -> str:
+        return json.dumps({"stages": self.summary(), "totals": self.totals()}, ensure_ascii=False, indent=2)
+
+    def write_prometheus(self, path: str, extra: str = "") -> None:
+        """extra: additional exposition text appended as-is (e.g. pool gauges)."""
+        write_text_atomic(path, self.to_prometheus() + extra)
+
+    def write_json(self, path: str) -> None:
+        write_text_atomic(path, self.to_json())
+
+
+def write_text_atomic(path: str, text: str) -> None:
+    """
+    Write text to a unique temp file in the same folder, then os.replace it over path, so the textfile
+    collector never reads a half-written file and concurrent writers never share a temp file.
+    """
+    parent = os.path.dirname(path)
+    if parent:
+        os.makedirs(parent, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=parent or ".", prefix=f".{os.path.basename(path)}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.write(text)
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            os.remove(tmp)
+        except OSError:
+            pass
+        raise
+
+
+BATCH_METRICS = MetricsCollector()
+
+
+def batch_metrics() -> MetricsCollector:
+    """Process-wide collector (every GPT call of the batch)."""
+    return BATCH_METRICS
+
+
+def current_file_metrics() -> Optional[MetricsCollector]:
+    return _CURRENT_FILE.get()
+
+
+@contextmanager
+def stage_scope(stage: Optional[str]):
+    """Attribute GPT calls made inside this block to `stage`."""
+    token = _CURRENT_STAGE.set(_STAGE_ALIASES.get(stage, stage) if stage else None)
+    try:
+        yield
+    finally:
+        _CURRENT_STAGE.reset(token)
+
+
+@contextmanager
+def file_scope(collector: MetricsCollector):
+    """Collect GPT calls of one file run (tasks created inside inherit the collector)."""
+    token = _CURRENT_FILE.set(collector)
+    try:
+        yield collector
+    finally:
+        _CURRENT_FILE.reset(token)
+
+
+def record_gpt_call(
+    *,
+    latency_sec: float,
+    attempts: int,
+    timeouts: int,
+    usage: Optional[dict],
+    ok: bool,
+    cached: bool = False,
+) -> None:
+    """Record one logical GPT call under the current stage into the batch and (if any) file collector."""
+    stage = _CURRENT_STAGE.get() or "other"
+    usage = usage or {}
+    kwargs = dict(
+        latency_sec=latency_sec,
+        attempts=attempts,
+        timeouts=timeouts,
+        # 캐시 hit은 토큰을 쓰지 않음
+        prompt_tokens=0 if cached else int(usage.get("prompt_tokens") or 0),
+        completion_tokens=0 if cached else int(usage.get("completion_tokens") or 0),
+        ok=ok,
+        cached=cached,
+    )
+    BATCH_METRICS.record_call(stage, **kwargs)
+    file_collector = _CURRENT_FILE.get()
+    if file_collector is not None:
+        file_collector.record_call(stage, **kwargs)
@@ -0,0 +1,242 @@
+# utils/output_sink.py — result writers for FinalizeAndSaveNode (writer thread, atomic per-file JSON or consolidated JSONL)
+import os
+import gzip
+import json
+import queue
+import atexit
+import threading
+import time
+from abc import ABC, abstractmethod
+from concurrent.futures import Future
+from typing import Any, Dict, Optional
+
+OUTPUT_MODES = ("json", "jsonl")
+
+_STOP = object()
+
+
+class OutputSink(ABC):
+    """
+    Base writer: submit() only enqueues, a single daemon thread serializes and writes,
+    so FinalizeAndSaveNode never does disk I/O (or json.dumps) on the event loop.
+    submit() returns a concurrent Future resolved with where the record ended up
+    (or with the OSError), which the async caller can await via asyncio.wrap_future.
+    """
+
+    mode = ""
+    tick_sec: Optional[float] = None   # 설정 시 queue가 이 시간 동안 비어 있으면 writer thread가 _tick() 호출
+
+    def __init__(self, name: str):
+        self._queue: "queue.Queue" = queue.Queue()
+        self._thread = threading.Thread(target=self._loop, name=name, daemon=True)
+        self._thread.start()
+        self._closed = False
+        atexit.register(self.close)
+
+    def submit(self, output_path: str, record: Dict[str, Any]) -> Future:
+        fut: Future = Future()
+        if self._closed:
+            fut.set_exception(RuntimeError("output sink is closed"))
+            return fut
+        self._queue.put_nowait((output_path, record, fut))
+        return fut
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Block until everything submitted so far is written (and synced). Returns False on timeout."""
+        if not self._thread.is_alive():
+            return True
+        done = threading.Event()
+        self._queue.put_nowait(done)
+        return done.wait(timeout)
+
+    def close(self, timeout: Optional[float] = 30.0) -> None:
+        if self._closed:
+            return
+        self._closed = True
+        if self._thread.is_alive():
+            self._queue.put_nowait(_STOP)
+            self._thread.join(timeout)
+
+    def stats(self) -> Dict[str, Any]:
+        return {"mode": self.mode, "pending": self._queue.qsize()}
+
+    # ---------- writer thread ----------
+    def _loop(self) -> None:
+        while True:
+            try:
+                item = self._queue.get(timeout=self.tick_sec)
+            except queue.Empty:
+                self._tick()
+                continue
+            if item is _STOP:
+                self._sync()
+                return
+            if isinstance(item, threading.Event):
+                self._sync()
+                item.set()
+                continue
+            output_path, record, fut = item
+            try:
+                fut.set_result(self._write(output_path, record))
+            except Exception as e:
+                fut.set_exception(e)
+            if self._queue.empty():
+                self._idle()
+
+    @abstractmethod
+    def _write(self, output_path: str, record: Dict[str, Any]) -> str:
+        """Write one record (writer thread); returns where it ended up."""
+
+    def _idle(self) -> None:
+        """Called when the queue drains."""
+
+    def _tick(self) -> None:
+        """Called after tick_sec without a queued item."""
+
+    def _sync(self) -> None:
+        """Called on flush/close."""
+
+
+class JsonFileSink(OutputSink):
+    """One pretty-printed JSON per file, written to a temp file in the same folder and os.replace'd (never truncated)."""
+
+    mode = "json"
+
+    def __init__(self, indent: Optional[int] = 2):
+        self.indent = indent
+        super().__init__("output-json-writer")
+
+    def _write(self, output_path: str, record: Dict[str, Any]) -> str:
+        parent = os.path.dirname(output_path)
+        if parent:
+            os.makedirs(parent, exist_ok=True)
+        tmp = f"{output_path}.tmp{os.getpid()}"
+        try:
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(record, f, ensure_ascii=False, indent=self.indent)
+                # rename 전에 내용이 디스크에 있어야 crash 후 빈/잘린 결과 파일이 남지 않음
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp, output_path)
+        except BaseException:
+            try:
+                os.remove(tmp)
+            except OSError:
+                pass
+            raise
+        return output_path
+
+
+class JsonlSink(OutputSink):
+    """
+    All results of a batch appended to one JSONL file (gzip members when compress=True), one object per line
+    with "output_key" = "{parent_folder}/{filename}". Flushed when the queue drains; fsync'd at most every
+    fsync_interval_sec, after fsync_interval_sec without new results (also closing the gzip member) and
+    on flush()/close(), so a crash loses at most the last interval of results, never the lines before it.
+    """
+
+    mode = "jsonl"
+
+    def __init__(self, path: str, *, compress: bool = False, fsync_interval_sec: float = 5.0):
+        if compress and not path.endswith(".gz"):
+            path += ".gz"
+        self.path = path
+        self.compress = compress
+        self.fsync_interval_sec = fsync_interval_sec
+        self._f = None
+        self._raw = None
+        self._synced_at = time.monotonic()
+        self._dirty = False
+        self.records = 0
+        self.tick_sec = fsync_interval_sec if fsync_interval_sec > 0 else None   # 0이면 기록마다 sync
+        super().__init__("output-jsonl-writer")
+
+    def _open(self):
+        if self._raw is None:
+            parent = os.path.dirname(self.path)
+            if parent:
+                os.makedirs(parent, exist_ok=True)
+            self._raw = open(self.path, "ab")
+        if self._f is None:
+            # 재시작 시 이어쓰기: gzip은 member를 이어붙여도 하나의 스트림으로 읽힘
+            self._f = gzip.GzipFile(fileobj=self._raw, mode="ab") if self.compress else self._raw
+        return self._f
+
+    def _write(self, output_path: str, record: Dict[str, Any]) -> str:
+        key = os.path.relpath(output_path, os.path.dirname(os.path.dirname(output_path)))
+        line = json.dumps({"output_key": key.replace(os.sep, "/"), **record}, ensure_ascii=False)
+        self._open().write(line.encode("utf-8") + b"\n")
+        self._dirty = True
+        self.records += 1
+        if time.monotonic() - self._synced_at >= self.fsync_interval_sec:
+            self._sync()
+        return self.path
+
+    def _idle(self) -> None:
+        if self._f is not None and not self.compress:
+            self._f.flush()
+
+    def _tick(self) -> None:
+        # 결과가 끊긴 동안에도 마지막 기록이 (gzip이면 닫힌 member로) 디스크에 남도록
+        if self._dirty:
+            self._sync()
+
+    def _sync(self) -> None:
+        if self._raw is None or not self._dirty:
+            self._synced_at = time.monotonic()
+            return
+        try:
+            if self.compress and self._f is not None:
+                # 현재 gzip member를 닫아 디스크상 파일이 항상 완전한 gzip이 되도록 함 (다음 기록 시 새 member)
+                self._f.close()
+                self._f = None
+            self._raw.flush()
+            os.fsync(self._raw.fileno())
+        except OSError:
+            pass
+        self._dirty = False
+        self._synced_at = time.monotonic()
+
+    def close(self, timeout: Optional[float] = 30.0) -> None:
+        super().close(timeout)
+        try:
+            if self.compress and self._f is not None:
+                self._f.close()
+            if self._raw is not None:
+                self._raw.close()
+        except OSError:
+            pass
+        self._f = self._raw = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {**super().stats(), "path": self.path, "records": self.records}
+
+
+_DEFAULT_JSON_SINK: Optional[JsonFileSink] = None
+_DEFAULT_LOCK = threading.Lock()
+
+
+def default_json_sink() -> JsonFileSink:
+    """Process-wide per-file JSON sink (graphs built repeatedly share one writer thread)."""
+    global _DEFAULT_JSON_SINK
+    with _DEFAULT_LOCK:
+        if _DEFAULT_JSON_SINK is None:
+            _DEFAULT_JSON_SINK = JsonFileSink()
+        return _DEFAULT_JSON_SINK
+
+
+def make_output_sink(
+    mode: str,
+    output_dir: str,
+    *,
+    jsonl_path: Optional[str] = None,
+    compress: bool = False,
+    fsync_interval_sec: float = 5.0,
+) -> OutputSink:
+    """mode "json" → the shared JsonFileSink; "jsonl" → a new JsonlSink at jsonl_path (default {output_dir}/results-<timestamp>.jsonl)."""
+    if mode == "json":
+        return default_json_sink()
+    if mode == "jsonl":
+        path = jsonl_path or os.path.join(output_dir, f"results-{time.strftime('%Y%m%d-%H%M%S')}.jsonl")
+        return JsonlSink(path, compress=compress, fsync_interval_sec=fsync_interval_sec)
+    raise ValueError(f"unknown output mode: {mode!r} (expected one of {OUTPUT_MODES})")
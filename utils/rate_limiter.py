@@ -0,0 +1,275 @@
+# utils/rate_limiter.py — per-model adaptive concurrency pools (AIMD) with RPM/TPM budgets
+import time
+import asyncio
+from collections import deque
+from typing import Any, Dict, List, Optional
+
+import openai
+
+# ====== pool defaults (모델별 계정 한도에 맞게 configure_model_pool로 조정) ======
+DEFAULT_INITIAL_CONCURRENCY = 2
+DEFAULT_MIN_CONCURRENCY = 1
+DEFAULT_MAX_CONCURRENCY = 16
+DECREASE_FACTOR = 0.5            # 429/timeout 시 limit 곱셈 감소
+DECREASE_COOLDOWN_SEC = 2.0      # 같은 burst의 연속 실패로 여러 번 줄이지 않도록
+# 응답 토큰 예약량 (실제 usage로 사후 보정)
+COMPLETION_RESERVE_TOKENS = {"gpt-5": 4096}
+DEFAULT_COMPLETION_RESERVE_TOKENS = 512
+
+
+def is_throttle_error(exc: BaseException) -> bool:
+    """429 / timeout signals that should shrink the pool."""
+    if isinstance(exc, (asyncio.TimeoutError, openai.error.RateLimitError, openai.error.Timeout)):
+        return True
+    return getattr(exc, "http_status", None) == 429
+
+
+def estimate_request_tokens(model: str, messages: List[dict]) -> int:
+    """Prompt estimate (~3 chars/token) + completion reserve; reconciled with the actual usage afterwards."""
+    chars = sum(len(m.get("content") or "") for m in messages if isinstance(m.get("content"), str))
+    return chars // 3 + COMPLETION_RESERVE_TOKENS.get(model, DEFAULT_COMPLETION_RESERVE_TOKENS)
+
+
+class _MinuteBudget:
+    """Per-minute budget as a continuously refilling bucket (capacity = per-minute limit)."""
+
+    def __init__(self, per_minute: int):
+        self.capacity = float(per_minute)
+        self.level = float(per_minute)
+        self.updated = time.monotonic()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.capacity / 60.0)
+        self.updated = now
+
+    def wait_time(self, amount: float) -> float:
+        self._refill()
+        amount = min(amount, self.capacity)
+        if self.level >= amount:
+            return 0.0
+        return (amount - self.level) * 60.0 / self.capacity
+
+    def take(self, amount: float) -> None:
+        self._refill()
+        # 실제 usage가 예상보다 크면 음수(부채)까지 허용 → 다음 요청이 그만큼 대기
+        self.level -= amount
+
+
+class ModelPool:
+    """
+    Concurrency gate for one model:
+      - in-flight limit adjusted AIMD-style (+1/limit per success, x DECREASE_FACTOR on 429/timeout)
+      - optional requests-per-minute / tokens-per-minute budgets checked before each request
+    Waiters are plain futures of the running loop, so the pool survives repeated asyncio.run() calls.
+    """
+
+    def __init__(
+        self,
+        model: str,
+        *,
+        initial_concurrency: int = DEFAULT_INITIAL_CONCURRENCY,
+        min_concurrency: int = DEFAULT_MIN_CONCURRENCY,
+        max_concurrency: int = DEFAULT_MAX_CONCURRENCY,
+        rpm: Optional[int] = None,
+        tpm: Optional[int] = None,
+    ):
+        self.model = model
+        self.min_concurrency = max(1, min_concurrency)
+        self.max_concurrency = max(self.min_concurrency, max_concurrency)
+        self.limit = float(min(self.max_concurrency, max(self.min_concurrency, initial_concurrency)))
+        self.rpm = rpm
+        self.tpm = tpm
+        self._requests = _MinuteBudget(rpm) if rpm else None
+        self._tokens = _MinuteBudget(tpm) if tpm else None
+        self.in_flight = 0
+        self._waiters: deque = deque()
+        self._last_decrease = 0.0
+        self.successes = 0
+        self.throttles = 0
+        self.budget_wait_sec = 0.0
+
+    # ---------- concurrency ----------
+    def _wake(self) -> None:
+        free = int(self.limit) - self.in_flight
+        while free > 0 and self._waiters:
+            fut = self._waiters.popleft()
+            if not fut.done():
+                fut.set_result(None)
+                free -= 1
+
+    async def _acquire_slot(self) -> None:
+        while self.in_flight >= int(self.limit):
+            fut = asyncio.get_running_loop().create_future()
+            self._waiters.append(fut)
+            try:
+                await fut
+            except asyncio.CancelledError:
+                if fut.done() and not fut.cancelled():
+                    self._wake()  # 받은 wake-up을 다음 대기자에게 넘김
+                else:
+                    try:
+                        self._waiters.remove(fut)
+                    except ValueError:
+                        pass
+                raise
+        self.in_flight += 1
+
+    def _release_slot(self) -> None:
+        self.in_flight -= 1
+        self._wake()
+
+    # ---------- budgets ----------
+    async def _wait_budget(self, est_tokens: int) -> None:
+        while True:
+            wait = 0.0
+            if self._requests is not None:
+                wait = max(wait, self._requests.wait_time(1))
+            if self._tokens is not None:
+                wait = max(wait, self._tokens.wait_time(est_tokens))
+            if wait <= 0:
+                break
+            self.budget_wait_sec += wait
+            await asyncio.sleep(wait)
+        if self._requests is not None:
+            self._requests.take(1)
+        if self._tokens is not None:
+            self._tokens.take(est_tokens)
+
+    def reconcile_tokens(self, est_tokens: int, usage: Optional[dict]) -> None:
+        """Correct the TPM budget with the actual total_tokens of a finished request."""
+        if self._tokens is None or not usage:
+            return
+        actual = usage.get("total_tokens") or 0
+        if actual:
+            self._tokens.take(actual - est_tokens)
+
+    # ---------- AIMD ----------
+    def on_success(self) -> None:
+        self.successes += 1
+        if self.limit < self.max_concurrency:
+            self.limit = min(float(self.max_concurrency), self.limit + 1.0 / self.limit)
+            self._wake()
+
+    def on_throttle(self) -> None:
+        self.throttles += 1
+        now = time.monotonic()
+        if now - self._last_decrease >= DECREASE_COOLDOWN_SEC:
+            self.limit = max(float(self.min_concurrency), self.limit * DECREASE_FACTOR)
+            self._last_decrease = now
+
+    def slot(self, est_tokens: int) -> "_PoolSlot":
+        """async with pool.slot(est): one request in flight, budget charged, AIMD feedback on exit."""
+        return _PoolSlot(self, est_tokens)
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "limit": int(self.limit),
+            "limit_exact": round(self.limit, 2),
+            "in_flight": self.in_flight,
+            "waiting": sum(1 for f in self._waiters if not f.done()),
+            "min": self.min_concurrency,
+            "max": self.max_concurrency,
+            "rpm": self.rpm,
+            "tpm": self.tpm,
+            "successes": self.successes,
+            "throttles": self.throttles,
+            "budget_wait_sec": round(self.budget_wait_sec, 2),
+        }
+
+
+class _PoolSlot:
+    def __init__(self, pool: ModelPool, est_tokens: int):
+        self.pool = pool
+        self.est_tokens = est_tokens
+
+    async def __aenter__(self) -> "_PoolSlot":
+        await self.pool._acquire_slot()
+        try:
+            await self.pool._wait_budget(self.est_tokens)
+        except BaseException:
+            self.pool._release_slot()
+            raise
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb) -> bool:
+        self.pool._release_slot()
+        if exc is None:
+            self.pool.on_success()
+        elif is_throttle_error(exc):
+            self.pool.on_throttle()
+        return False
+
+
+# ====== registry ======
+_POOL_SETTINGS: Dict[str, Dict[str, Any]] = {}
+_POOLS: Dict[str, ModelPool] = {}
+_MAX_CONCURRENCY_CEILING: Optional[int] = None
+
+
+def configure_model_pool(
+    model: str,
+    *,
+    initial_concurrency: Optional[int] = None,
+    min_concurrency: Optional[int] = None,
+    max_concurrency: Optional[int] = None,
+    rpm: Optional[int] = None,
+    tpm: Optional[int] = None,
+) -> ModelPool:
+    """Set the pool limits/budgets of one model (re-creates its pool; call before the batch starts)."""
+    settings = _POOL_SETTINGS.setdefault(model, {})
+    for key, val in (
+        ("initial_concurrency", initial_concurrency),
+        ("min_concurrency", min_concurrency),
+        ("max_concurrency", max_concurrency),
+        ("rpm", rpm),
+        ("tpm", tpm),
+    ):
+        if val is not None:
+            settings[key] = val
+    _POOLS.pop(model, None)
+    return get_pool(model)
+
+
+def set_max_concurrency(ceiling: Optional[int]) -> None:
+    """Upper bound on every model pool's in-flight limit (None → per-pool max only)."""
+    global _MAX_CONCURRENCY_CEILING
+    _MAX_CONCURRENCY_CEILING = ceiling
+    _POOLS.clear()
+
+
+def get_pool(model: str) -> ModelPool:
+    pool = _POOLS.get(model)
+    if pool is None:
+        settings = dict(_POOL_SETTINGS.get(model, {}))
+        if _MAX_CONCURRENCY_CEILING is not None:
+            settings["max_concurrency"] = min(
+                settings.get("max_concurrency", DEFAULT_MAX_CONCURRENCY), _MAX_CONCURRENCY_CEILING
+            )
+        pool = ModelPool(model, **settings)
+        _POOLS[model] = pool
+    return pool
+
+
+def pool_snapshot() -> Dict[str, Dict[str, Any]]:
+    """Current limit / in-flight / AIMD counters of every model pool."""
+    return {model: pool.snapshot() for model, pool in _POOLS.items()}
+
+
+def pools_to_prometheus(prefix: str = "nac_gpt_pool") -> str:
+    gauges = [
+        ("concurrency_limit", "Current AIMD in-flight limit", "limit_exact"),
+        ("in_flight", "Requests currently in flight", "in_flight"),
+        ("waiting", "Requests waiting for a slot", "waiting"),
+        ("throttles_total", "429/timeout signals seen", "throttles"),
+        ("budget_wait_seconds_total", "Time spent waiting for RPM/TPM budget", "budget_wait_sec"),
+    ]
+    snap = pool_snapshot()
+    lines: List[str] = []
+    for name, help_text, key in gauges:
+        kind = "counter" if name.endswith("_total") else "gauge"
+        lines.append(f"# HELP {prefix}_{name} {help_text}")
+        lines.append(f"# TYPE {prefix}_{name} {kind}")
+        for model, s in snap.items():
+            lines.append(f'{prefix}_{name}{{model="{model}"}} {s[key]}')
+    return "\n".join(lines) + "\n"
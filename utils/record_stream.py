@@ -0,0 +1,64 @@
+# utils/record_stream.py — lazy reader for JSONL / NDJSON inputs (one document per line)
+import os
+import re
+import json
+import hashlib
+from typing import Any, Dict, Iterator, Optional
+
+RECORD_STREAM_SUFFIXES = (".jsonl", ".ndjson")
+# 레코드 id 로 쓸 필드 (없으면 파일 내 줄 번호)
+ID_FIELDS = ("id", "record_id", "doc_id")
+
+_UNSAFE_ID = re.compile(r"[^\w.\-]+")
+
+
+def is_record_stream(path: str) -> bool:
+    return path.lower().endswith(RECORD_STREAM_SUFFIXES)
+
+
+def stream_name(path: str) -> str:
+    """Output folder of a stream's records: the input file name without extension."""
+    return os.path.splitext(os.path.basename(path))[0] or "unknown"
+
+
+def record_id_for(data: Any, line_no: int, id_field: Optional[str] = None) -> str:
+    """Filesystem-safe record id: data[id_field] (or the first of ID_FIELDS present), else the line number."""
+    value = None
+    if isinstance(data, dict):
+        for field in ((id_field,) if id_field else ID_FIELDS):
+            if data.get(field) not in (None, ""):
+                value = data[field]
+                break
+    rid = _UNSAFE_ID.sub("_", str(value)).strip("._") if value is not None else ""
+    return rid or f"L{line_no}"
+
+
+def iter_records(path: str, id_field: Optional[str] = None) -> Iterator[Dict[str, Any]]:
+    """
+    Yield one record per non-empty line, reading and parsing only when the caller pulls the next one
+    (memory stays bounded by what the caller keeps in flight).
+      {"record_id", "line_no", "data", "sha256"}  for a JSON object line
+      {"record_id", "line_no", "error"}           for a line that is not a JSON object
+    sha256 is over the raw line bytes (resume / skip key of that record).
+    """
+    with open(path, "rb") as f:
+        for line_no, raw in enumerate(f, start=1):
+            raw = raw.strip()
+            if line_no == 1 and raw.startswith(b"\xef\xbb\xbf"):
+                raw = raw[3:]
+            if not raw:
+                continue
+            try:
+                data = json.loads(raw.decode("utf-8"))
+            except (UnicodeDecodeError, ValueError) as e:
+                yield {"record_id": f"L{line_no}", "line_no": line_no, "error": f"{type(e).__name__}: {e}"}
+                continue
+            if not isinstance(data, dict):
+                yield {"record_id": f"L{line_no}", "line_no": line_no, "error": "record is not a JSON object"}
+                continue
+            yield {
+                "record_id": record_id_for(data, line_no, id_field),
+                "line_no": line_no,
+                "data": data,
+                "sha256": hashlib.sha256(raw).hexdigest(),
+            }
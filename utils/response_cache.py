@@ -0,0 +1,197 @@
+# utils/response_cache.py — persistent content-addressed GPT response cache (SQLite, size/age eviction)
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import asyncio
+import unicodedata
+from threading import Lock
+from typing import Any, Dict, List, Optional, Tuple
+
+# ====== cache knobs ======
+CACHE_PATH = os.getenv("GPT_CACHE_PATH") or os.path.join(os.getcwd(), ".gpt_cache.sqlite3")
+CACHE_MAX_BYTES = 512 * 1024 * 1024     # 전체 응답 크기 상한 (LRU 순으로 정리)
+CACHE_MAX_AGE_SEC = 30 * 24 * 3600      # 30일 지난 응답은 폐기
+CACHE_ENABLED = os.getenv("GPT_CACHE_ENABLE", "").strip().lower() in ("1", "true", "yes")  # opt-in (configure_cache로 켜기)
+_EVICT_EVERY_PUTS = 200                 # put N회마다 eviction 1회
+
+_LOCK = Lock()
+_CONN: Optional[sqlite3.Connection] = None
+_PUTS_SINCE_EVICT = 0
+_STATS = {"hits": 0, "misses": 0, "writes": 0, "evictions": 0, "bypassed": 0}
+
+
+def configure_cache(
+    *,
+    path: Optional[str] = None,
+    max_bytes: Optional[int] = None,
+    max_age_sec: Optional[int] = None,
+    enabled: Optional[bool] = None,
+) -> None:
+    """
+    Configure cache location/eviction limits or turn the cache on/off (bypass switch).
+    """
+    global CACHE_PATH, CACHE_MAX_BYTES, CACHE_MAX_AGE_SEC, CACHE_ENABLED, _CONN
+    with _LOCK:
+        if path is not None and path != CACHE_PATH:
+            if _CONN is not None:
+                _CONN.close()
+                _CONN = None
+            CACHE_PATH = path
+        if max_bytes is not None:
+            CACHE_MAX_BYTES = max_bytes
+        if max_age_sec is not None:
+            CACHE_MAX_AGE_SEC = max_age_sec
+        if enabled is not None:
+            CACHE_ENABLED = enabled
+
+
+def cache_stats() -> Dict[str, int]:
+    """Return a snapshot of hit/miss/write/eviction counters."""
+    with _LOCK:
+        return dict(_STATS)
+
+
+def _normalize_messages(messages: List[dict]) -> List[dict]:
+    out = []
+    for m in messages:
+        content = m.get("content", "")
+        if isinstance(content, str):
+            content = content.replace("\r\n", "\n").replace("\r", "\n").strip()
+            content = unicodedata.normalize("NFC", content)
+        out.append({"role": m.get("role", ""), "content": content})
+    return out
+
+
+def make_cache_key(
+    model: str,
+    messages: List[dict],
+    *,
+    temperature: Optional[float] = None,
+    builder_version: str = "",
+) -> str:
+    """Content-addressed key: sha256 over model, normalized messages, temperature and prompt builder version."""
+    blob = json.dumps(
+        {
+            "model": model,
+            "temperature": temperature,
+            "builder_version": builder_version,
+            "messages": _normalize_messages(messages),
+        },
+        ensure_ascii=False,
+        sort_keys=True,
+        separators=(",", ":"),
+    )
+    return hashlib.sha256(blob.encode("utf-8")).hexdigest()
+
+
+def _conn() -> sqlite3.Connection:
+    global _CONN
+    if _CONN is None:
+        parent = os.path.dirname(CACHE_PATH)
+        if parent:
+            os.makedirs(parent, exist_ok=True)
+        _CONN = sqlite3.connect(CACHE_PATH, check_same_thread=False)
+        _CONN.execute("PRAGMA journal_mode=WAL")
+        _CONN.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            " key TEXT PRIMARY KEY,"
+            " model TEXT,"
+            " value TEXT NOT NULL,"
+            " size INTEGER NOT NULL,"
+            " created_at REAL NOT NULL,"
+            " accessed_at REAL NOT NULL)"
+        )
+        _CONN.execute("CREATE INDEX IF NOT EXISTS idx_responses_accessed ON responses(accessed_at)")
+        _CONN.commit()
+    return _CONN
+
+
+def _get_sync(key: str) -> Optional[Tuple[Any, dict]]:
+    now = time.time()
+    with _LOCK:
+        conn = _conn()
+        row = conn.execute("SELECT value, created_at FROM responses WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            _STATS["misses"] += 1
+            return None
+        value, created_at = row
+        if now - created_at > CACHE_MAX_AGE_SEC:
+            conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+            conn.commit()
+            _STATS["misses"] += 1
+            _STATS["evictions"] += 1
+            return None
+        conn.execute("UPDATE responses SET accessed_at = ? WHERE key = ?", (now, key))
+        conn.commit()
+        _STATS["hits"] += 1
+    data = json.loads(value)
+    return data["reply"], data.get("usage", {})
+
+
+def _evict_locked(conn: sqlite3.Connection) -> None:
+    cutoff = time.time() - CACHE_MAX_AGE_SEC
+    cur = conn.execute("DELETE FROM responses WHERE created_at < ?", (cutoff,))
+    _STATS["evictions"] += max(cur.rowcount, 0)
+
+    total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+    if total > CACHE_MAX_BYTES:
+        excess = total - CACHE_MAX_BYTES
+        victims, freed = [], 0
+        for key, size in conn.execute("SELECT key, size FROM responses ORDER BY accessed_at ASC"):
+            victims.append((key,))
+            freed += size
+            if freed >= excess:
+                break
+        conn.executemany("DELETE FROM responses WHERE key = ?", victims)
+        _STATS["evictions"] += len(victims)
+    conn.commit()
+
+
+def _put_sync(key: str, model: str, reply: Any, usage: dict) -> None:
+    global _PUTS_SINCE_EVICT
+    value = json.dumps({"reply": reply, "usage": dict(usage or {})}, ensure_ascii=False)
+    now = time.time()
+    with _LOCK:
+        conn = _conn()
+        conn.execute(
+            "INSERT OR REPLACE INTO responses(key, model, value, size, created_at, accessed_at) VALUES (?, ?, ?, ?, ?, ?)",
+            (key, model, value, len(value.encode("utf-8")), now, now),
+        )
+        conn.commit()
+        _STATS["writes"] += 1
+        _PUTS_SINCE_EVICT += 1
+        if _PUTS_SINCE_EVICT >= _EVICT_EVERY_PUTS:
+            _PUTS_SINCE_EVICT = 0
+            _evict_locked(conn)
+
+
+async def cache_get(key: str) -> Optional[Tuple[Any, dict]]:
+    """
+    Look up a cached (reply, usage). Returns None on miss, when disabled, or on any cache I/O error.
+    """
+    if not CACHE_ENABLED:
+        with _LOCK:
+            _STATS["bypassed"] += 1
+        return None
+    try:
+        return await asyncio.to_thread(_get_sync, key)
+    except Exception:
+        return None
+
+
+async def cache_put(key: str, model: str, reply: Any, usage: dict) -> None:
+    """Store a successful reply. Cache failures never propagate to the caller."""
+    if not CACHE_ENABLED:
+        return
+    try:
+        await asyncio.to_thread(_put_sync, key, model, reply, usage)
+    except Exception:
+        pass
+
+
+def evict_now() -> None:
+    """Run age/size eviction immediately (e.g. at the end of a batch)."""
+    with _LOCK:
+        _evict_locked(_conn())
@@ -0,0 +1,209 @@
+# utils/stage_store.py — stage-level results keyed by input fingerprint (incremental re-runs across batches)
+import os
+import json
+import time
+import inspect
+import sqlite3
+import hashlib
+import asyncio
+from functools import lru_cache
+from threading import Lock
+from typing import Any, Dict, Optional
+
+
+@lru_cache(maxsize=None)
+def source_fingerprint(*objs) -> str:
+    """sha256 over the source code of prompt builders / modules (edits to a builder change it)."""
+    h = hashlib.sha256()
+    for obj in objs:
+        try:
+            h.update(inspect.getsource(obj).encode("utf-8"))
+        except (OSError, TypeError):
+            h.update(repr(obj).encode("utf-8"))
+        h.update(b"\0")
+    return h.hexdigest()
+
+
+def fingerprint(*parts: Any) -> str:
+    """sha256 of JSON-serializable stage inputs (builder source hash, guideline text, model, upstream output, ...)."""
+    raw = json.dumps(parts, ensure_ascii=False, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class StageStore:
+    """
+    Persistent per-stage results: one row per (scope, stage, unit) holding the fingerprint of the
+    stage inputs and the stage output. scope = file identity (parent_folder/filename), unit = line index
+    or "doc". A re-run reuses a stage output only when the freshly computed fingerprint is identical,
+    so editing one guideline / prompt builder recomputes just the stages (and lines) that depend on it.
+    Unlike the checkpoint store, rows are kept after the output JSON is written.
+    I/O failures never break a run; they only cost a recomputation.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._stats: Dict[str, Dict[str, int]] = {}
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            parent = os.path.dirname(self.path)
+            if parent:
+                os.makedirs(parent, exist_ok=True)
+            conn = sqlite3.connect(self.path, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS stage_results ("
+                " scope TEXT NOT NULL,"
+                " stage TEXT NOT NULL,"
+                " unit TEXT NOT NULL,"
+                " fingerprint TEXT NOT NULL,"
+                " result TEXT NOT NULL,"
+                " updated_at REAL NOT NULL,"
+                " PRIMARY KEY (scope, stage, unit))"
+            )
+            conn.commit()
+            self._conn = conn
+        return self._conn
+
+    def _count(self, stage: str, key: str) -> None:
+        counters = self._stats.setdefault(stage, {"reused": 0, "recomputed": 0})
+        counters[key] += 1
+
+    # ---------- sync ----------
+    def get(self, scope: str, stage: str, unit: str, fp: str) -> Optional[Dict[str, Any]]:
+        """Stored output if its fingerprint equals fp, else None."""
+        with self._lock:
+            row = self._connect().execute(
+                "SELECT fingerprint, result FROM stage_results WHERE scope = ? AND stage = ? AND unit = ?",
+                (scope, stage, unit),
+            ).fetchone()
+        if row is None or row[0] != fp:
+            return None
+        return json.loads(row[1])
+
+    def put(self, scope: str, stage: str, unit: str, fp: str, result: Dict[str, Any]) -> None:
+        value = json.dumps(result, ensure_ascii=False)
+        with self._lock:
+            conn = self._connect()
+            conn.execute(
+                "INSERT OR REPLACE INTO stage_results(scope, stage, unit, fingerprint, result, updated_at)"
+                " VALUES (?, ?, ?, ?, ?, ?)",
+                (scope, stage, unit, fp, value, time.time()),
+            )
+            conn.commit()
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        """{stage: {"reused": n, "recomputed": n}} for this process."""
+        return {stage: dict(c) for stage, c in self._stats.items()}
+
+    def close(self) -> None:
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    # ---------- async (sqlite I/O off the event loop) ----------
+    async def aget(self, scope: str, stage: str, unit: str, fp: str) -> Optional[Dict[str, Any]]:
+        try:
+            hit = await asyncio.to_thread(self.get, scope, stage, unit, fp)
+        except Exception:
+            hit = None
+        self._count(stage, "reused" if hit is not None else "recomputed")
+        return hit
+
+    async def aput(self, scope: str, stage: str, unit: str, fp: str, result: Dict[str, Any]) -> None:
+        try:
+            await asyncio.to_thread(self.put, scope, stage, unit, fp, result)
+        except Exception:
+            pass
+
+
+_STORES: Dict[str, StageStore] = {}
+
+
+def get_stage_store(path: str) -> StageStore:
+    """One shared store per SQLite path (graphs built repeatedly reuse the connection and counters)."""
+    key = os.path.abspath(path)
+    store = _STORES.get(key)
+    if store is None:
+        store = _STORES[key] = StageStore(path)
+    return store
+
+
+def stage_store_stats() -> Dict[str, Dict[str, int]]:
+    """{stage: {"reused": n, "recomputed": n}} summed over every open store."""
+    out: Dict[str, Dict[str, int]] = {}
+    for store in _STORES.values():
+        for stage, c in store.stats().items():
+            agg = out.setdefault(stage, {"reused": 0, "recomputed": 0})
+            agg["reused"] += c["reused"]
+            agg["recomputed"] += c["recomputed"]
+    return out
+
+
+def stage_scope_key(state: Dict[str, Any]) -> Optional[str]:
+    """File identity shared by FileState and LineState (same key as the output JSON path)."""
+    doc = state.get("doc")  # LineState: shared LineDoc
+    if doc is not None:
+        folder, filename = doc.parent_folder, doc.filename
+    else:
+        folder, filename = state.get("parent_folder"), state.get("filename")
+    if not filename:
+        return None
+    return f"{folder or 'unknown'}/{filename}"
+
+
+class IncrementalNode:
+    """
+    Wrap a stage node that exposes STAGE, OUTPUT_KEYS and fingerprint(state) (optionally restore(state, saved)):
+    if the stored fingerprint for this file/unit matches, the stored outputs are returned as the node's
+    update and the node is skipped; otherwise the node runs and its outputs are stored.
+    Works with nodes returning the full state as well as nodes returning only the keys they change.
+    """
+
+    def __init__(self, node, store: StageStore):
+        self.node = node
+        self.store = store
+
+    def _restore(self, state: Dict[str, Any], saved: Dict[str, Any]) -> Dict[str, Any]:
+        restore = getattr(self.node, "restore", None)
+        if restore is not None:
+            return restore(state, saved)
+        return dict(saved)
+
+    async def lookup(self, state: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Update carrying the stored outputs if the fingerprint is unchanged, else None (not counted in stats)."""
+        scope = stage_scope_key(state)
+        if scope is None:
+            return None
+        unit = str(state["i"]) if "i" in state else "doc"
+        try:
+            saved = await asyncio.to_thread(self.store.get, scope, self.node.STAGE, unit, self.node.fingerprint(state))
+        except Exception:
+            return None
+        return self._restore(state, saved) if saved is not None else None
+
+    async def __call__(self, state: Dict[str, Any]) -> Dict[str, Any]:
+        scope = stage_scope_key(state)
+        if scope is None:
+            return await self._run(state)
+        stage = self.node.STAGE
+        unit = str(state["i"]) if "i" in state else "doc"
+        fp = self.node.fingerprint(state)
+        saved = await self.store.aget(scope, stage, unit, fp)
+        if saved is not None:
+            return self._restore(state, saved)
+        out = await self._run(state)
+        # partial update는 바뀌지 않은 출력 키를 생략하므로 입력 state 값으로 채워 저장
+        saved = {k: out[k] if k in out else state[k] for k in self.node.OUTPUT_KEYS if k in out or k in state}
+        await self.store.aput(scope, stage, unit, fp, saved)
+        return out
+
+    async def _run(self, state: Dict[str, Any]) -> Dict[str, Any]:
+        out = self.node(state)
+        if asyncio.iscoroutine(out):
+            out = await out
+        return out